@@ -0,0 +1,469 @@
+import hmac
+import ipaddress
+import itertools
+import json
+import os
+import re
+import socket
+import struct
+import threading
+import time
+
+from modules.engine import CommandEngine, EngineListener
+from modules.classifier import ResponseClassifier, load_rules
+from modules.linkTest import open_link
+from modules.report import RunStatistics
+from modules.runStorage import atomic_path, new_run_id
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_AGENT_PORT = 47810
+
+# Length of the JSON message that follows
+MESSAGE_HEADER = struct.Struct("<I")
+
+# Larger lengths are refused before anything is allocated
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+# Shared secret of agents and coordinators when --token is not given
+TOKEN_ENV = "ROBOT_AGENT_TOKEN"
+
+# pyserial URL schemes a job may name besides local serial devices. Others,
+# such as socket:// or spy://, reach the network or the file system and must
+# be enabled with --allow-scheme.
+DEFAULT_ALLOWED_SCHEMES = ("sim",)
+
+# Row layout of a "results" batch
+RESULT_FIELDS = ["cycle", "step", "command", "status", "response", "timestamp", "latency"]
+
+
+def send_message(sock, message, lock=None):
+    """Send one length-prefixed JSON message"""
+    data = json.dumps(message, separators=(",", ":")).encode()
+    if lock is None:
+        sock.sendall(MESSAGE_HEADER.pack(len(data)) + data)
+    else:
+        with lock:
+            sock.sendall(MESSAGE_HEADER.pack(len(data)) + data)
+
+
+def read_message(sock, max_size=MAX_MESSAGE_SIZE):
+    """Read one message; raises ConnectionError when the peer has gone
+
+    A header announcing more than max_size bytes raises ValueError.
+    """
+    def read_exact(size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Connection closed")
+            data += chunk
+        return data
+
+    (length,) = MESSAGE_HEADER.unpack(read_exact(MESSAGE_HEADER.size))
+    if length > max_size:
+        raise ValueError(f"Message of {length} bytes exceeds the {max_size} byte limit")
+    return json.loads(read_exact(length))
+
+
+def parse_address(text, default_port=DEFAULT_AGENT_PORT):
+    """Turn "host" or "host:port" into a (host, port) tuple"""
+    host, _, port = text.rpartition(":") if ":" in text else (text, "", "")
+    return host or "127.0.0.1", int(port) if port else default_port
+
+
+def allowed_port(port, schemes=DEFAULT_ALLOWED_SCHEMES):
+    """True for a local serial device, or a URL with one of the allowed schemes"""
+    if not isinstance(port, str):
+        return False
+    scheme, separator, _ = port.partition("://")
+    if separator:
+        return scheme.lower() in schemes
+    if re.fullmatch(r"(?i)(\\\\\.\\)?COM\d+", port):
+        return True
+    return os.path.realpath(port).startswith("/dev/")
+
+
+def is_loopback(host):
+    """True for addresses only this host can reach"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class ResultStreamer(EngineListener):
+    """Forwards an engine's results to the coordinator in batches
+
+    Rows are sent as lists in RESULT_FIELDS order, batch_size at a time or
+    whatever collected within flush_interval, so a fast run costs one
+    message per few hundred steps. Only SYS and ERR messages are
+    forwarded; the coordinator has no use for the TX/RX echo.
+    """
+
+    def __init__(self, send, job_id, batch_size=200, flush_interval=0.5):
+        self.send = send
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows = []
+        self.last_flush = time.monotonic()
+
+    def on_message(self, text, direction):
+        if direction in ("SYS", "ERR"):
+            self.send({"type": "log", "job_id": self.job_id, "direction": direction, "text": text})
+
+    def on_result(self, cycle, step, command, status, response, timestamp, latency):
+        self.rows.append([cycle, step, command, status, response, timestamp, latency])
+        if len(self.rows) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            rows, self.rows = self.rows, []
+            self.send({"type": "results", "job_id": self.job_id, "rows": rows})
+        self.last_flush = time.monotonic()
+
+
+class TestAgent:
+    """Runs jobs from a coordinator on this host's ports
+
+    Each coordinator connection carries one job: a "job" message with the
+    commands, port and cycles, answered by "started", batched "results",
+    "log" and a final "done" with the run's statistics. A "stop" message
+    halts the job. The run's own directory and capture stay on this host.
+
+    Agents listen on localhost by default. With a token, a job is only
+    accepted if it carries the same token, which is what makes listening
+    on other interfaces safe. The token travels in plaintext, so use it on
+    a trusted network or through a tunnel. Jobs may only name local serial
+    devices and URLs of allowed_schemes.
+    """
+
+    def __init__(self, address=("127.0.0.1", DEFAULT_AGENT_PORT), results_dir=None, name=None, metrics=None,
+                 token=None, allowed_schemes=DEFAULT_ALLOWED_SCHEMES):
+        self.address = address
+        self.token = token
+        self.allowed_schemes = tuple(scheme.lower() for scheme in allowed_schemes)
+        self.metrics = metrics  # EngineMetrics shared by every job, if served
+        self.results_dir = results_dir or os.path.join(PROJECT_DIR, "results")
+        self.name = name or socket.gethostname()
+        self.rules_file = os.path.join(PROJECT_DIR, "classifier_rules.json")
+        self.server = None
+        self.busy_ports = set()
+        self.lock = threading.Lock()
+
+    def listen(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(self.address)
+        self.server.listen()
+        self.address = self.server.getsockname()
+        return self.address
+
+    def start(self):
+        """Listen and serve from a background thread; returns the bound address"""
+        address = self.listen()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return address
+
+    def serve_forever(self):
+        if self.server is None:
+            self.listen()
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return  # Closed by shutdown()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.handle, args=(sock,), daemon=True).start()
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.close()
+
+    def handle(self, sock):
+        """Run one job for a coordinator connection"""
+        send_lock = threading.Lock()
+
+        def send(message):
+            try:
+                send_message(sock, message, send_lock)
+            except OSError:
+                pass  # Coordinator went away; the run still completes locally
+
+        engine = None
+        try:
+            job = read_message(sock)
+            if job.get("type") != "job":
+                send({"type": "error", "text": "Expected a job"})
+                return
+            if self.token and not hmac.compare_digest(str(job.get("token", "")).encode(), self.token.encode()):
+                send({"type": "done", "job_id": job.get("job_id"), "outcome": "error", "error": "Invalid token"})
+                return
+            job_id = job["job_id"]
+            port = job["port"]
+            if not allowed_port(port, self.allowed_schemes):
+                send({"type": "done", "job_id": job_id, "outcome": "error",
+                      "error": f"{port} is not a port {self.name} allows"})
+                return
+            with self.lock:
+                if port in self.busy_ports:
+                    send({"type": "done", "job_id": job_id, "outcome": "error",
+                          "error": f"{port} is busy on {self.name}"})
+                    return
+                self.busy_ports.add(port)
+            try:
+                streamer = ResultStreamer(send, job_id, job.get("batch_size", 200))
+                engine = CommandEngine(streamer, results_dir=self.results_dir)
+                engine.port = port
+                engine.metrics = self.metrics
+                engine.serial_conn = open_link(port, job.get("baudrate", 115200), timeout=1)
+                if self.metrics:
+                    self.metrics.connected(port)
+                if "response_timeout" in job:
+                    engine.response_timeout = job["response_timeout"]
+
+                # Stop requests arrive while the engine runs
+                threading.Thread(target=self._watch_stop, args=(sock, engine), daemon=True).start()
+
+                commands = list(enumerate(job["commands"], 1))
+                classifier = ResponseClassifier(load_rules(self.rules_file))
+                if not engine.begin_run(job["cycles"], classifier=classifier):
+                    send({"type": "done", "job_id": job_id, "outcome": "error", "error": "Cannot create run"})
+                    return
+                send({"type": "started", "job_id": job_id, "agent": self.name, "run_id": engine.run_id,
+                      "port": port, "cycles": job["cycles"]})
+                outcome = engine.execute(commands, job["cycles"])
+                streamer.flush()
+                send({"type": "done", "job_id": job_id, "outcome": outcome, "stats": engine.run_stats.to_dict()})
+            except Exception as e:
+                send({"type": "done", "job_id": job_id, "outcome": "error", "error": str(e)})
+            finally:
+                if engine is not None and engine.serial_conn is not None:
+                    engine.serial_conn.close()
+                with self.lock:
+                    self.busy_ports.discard(port)
+        except (OSError, ConnectionError, ValueError, KeyError):
+            pass
+        finally:
+            sock.close()
+
+    def _watch_stop(self, sock, engine):
+        try:
+            while True:
+                if read_message(sock).get("type") == "stop":
+                    engine.stop()
+        except (OSError, ConnectionError, ValueError):
+            pass
+
+
+class Job:
+    """A job as tracked by the coordinator"""
+
+    def __init__(self, job_id, agent, spec):
+        self.job_id = job_id
+        self.agent = agent
+        self.spec = spec
+        self.agent_name = None
+        self.run_id = None
+        self.outcome = None
+        self.error = None
+        self.rows = 0
+        self.stats = None
+        self.sock = None
+        self.thread = None
+
+
+class Coordinator:
+    """Sends jobs to agents and collects every result in one database
+
+    Each job's rows go into results_db under the agent's run ID, with the
+    port recorded as "<agent>/<port>", and the per-job statistics are
+    merged into one campaign summary.
+    """
+
+    def __init__(self, results_db=None, log=None, token=None):
+        self.results_db = results_db
+        self.log = log or (lambda message: None)
+        self.token = token  # Sent with every job to agents that require one
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.statistics = RunStatistics(new_run_id(), "campaign")
+        self.lock = threading.Lock()
+
+    def submit(self, agent, commands, port, cycles, **options):
+        """Start a job on the agent at (host, port) and return it"""
+        job = Job(next(self.job_ids), agent, dict(options, commands=list(commands), port=port, cycles=cycles))
+        self.jobs[job.job_id] = job
+        job.thread = threading.Thread(target=self._run, args=(job,), daemon=True)
+        job.thread.start()
+        return job
+
+    def _run(self, job):
+        try:
+            job.sock = socket.create_connection(job.agent, timeout=10)
+            job.sock.settimeout(None)
+            job.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            message = dict(job.spec, type="job", job_id=job.job_id)
+            if self.token:
+                message["token"] = self.token
+            send_message(job.sock, message)
+            while job.outcome is None:
+                self._handle(job, read_message(job.sock))
+        except (OSError, ConnectionError, ValueError) as e:
+            if job.outcome is None:
+                job.outcome = "error"
+                job.error = f"Lost agent {job.agent[0]}:{job.agent[1]}: {e}"
+                self.log(f"Job {job.job_id}: {job.error}")
+                if self.results_db and job.run_id:
+                    self.results_db.end_run(job.run_id, "error")
+        finally:
+            if job.sock is not None:
+                job.sock.close()
+
+    def _handle(self, job, message):
+        kind = message.get("type")
+        if kind == "started":
+            job.agent_name = message["agent"]
+            job.run_id = message["run_id"]
+            self.log(f"Job {job.job_id}: run {job.run_id} on {job.agent_name} {message['port']}")
+            if self.results_db:
+                self.results_db.begin_run(job.run_id, self._port_label(job), message["cycles"])
+        elif kind == "results":
+            job.rows += len(message["rows"])
+            if self.results_db:
+                port = self._port_label(job)
+                for cycle, step, command, status, response, timestamp, latency in message["rows"]:
+                    self.results_db.log(job.run_id, port, cycle, step, command, status, response,
+                                        timestamp=timestamp, latency=latency)
+        elif kind == "log":
+            self.log(f"Job {job.job_id} [{message['direction']}]: {message['text']}")
+        elif kind == "done":
+            job.error = message.get("error")
+            if message.get("stats"):
+                job.stats = RunStatistics.from_dict(message["stats"])
+                with self.lock:
+                    self.statistics.merge(job.stats)
+            if self.results_db and job.run_id:
+                self.results_db.end_run(job.run_id, message["outcome"])
+            job.outcome = message["outcome"]
+            self.log(f"Job {job.job_id}: {job.outcome}" + (f" ({job.error})" if job.error else ""))
+
+    def _port_label(self, job):
+        return f"{job.agent_name or job.agent[0]}/{job.spec['port']}"
+
+    def stop(self, job=None):
+        """Stop one job, or all of them"""
+        for target in ([job] if job else list(self.jobs.values())):
+            if target.sock is not None and target.outcome is None:
+                try:
+                    send_message(target.sock, {"type": "stop"})
+                except OSError:
+                    pass
+
+    def wait(self, timeout=None):
+        """Wait for every job to finish; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for job in list(self.jobs.values()):
+            job.thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+            if job.thread.is_alive():
+                return False
+        self.statistics.finish("completed" if all(job.outcome == "completed" for job in self.jobs.values())
+                               else "failed")
+        return True
+
+
+def start_local_agents(count, results_dir=None, token=None, allowed_schemes=DEFAULT_ALLOWED_SCHEMES):
+    """Start count agents on localhost ports, standing in for fixture hosts"""
+    agents = []
+    for index in range(count):
+        agent = TestAgent(("127.0.0.1", 0), results_dir=results_dir, name=f"local{index + 1}", token=token,
+                          allowed_schemes=allowed_schemes)
+        agents.append(agent.start())
+    return agents
+
+
+def main():
+    """Run an agent, or run a campaign of jobs across agents"""
+    import argparse
+
+    from modules.metrics import EngineMetrics, MetricsServer
+    from modules.resultsDb import ResultsDatabase
+
+    parser = argparse.ArgumentParser(description="Distributed robot test agents")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    serve = subparsers.add_parser("serve", help="Accept jobs from a coordinator")
+    serve.add_argument("--listen", default=f"127.0.0.1:{DEFAULT_AGENT_PORT}",
+                       help="host:port to listen on; other than localhost needs a token")
+    serve.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                       help=f"Shared secret jobs must carry (default: ${TOKEN_ENV})")
+    serve.add_argument("--results-dir", help="Where runs are stored on this host")
+    serve.add_argument("--metrics", type=int, metavar="PORT", help="Serve Prometheus metrics on localhost:PORT")
+    serve.add_argument("--allow-scheme", action="append", default=[], metavar="SCHEME",
+                       help="Also accept jobs on pyserial URLs of this scheme, e.g. loop or broker")
+
+    run = subparsers.add_parser("run", help="Run a campaign file across agents")
+    run.add_argument("campaign", help='JSON: {"jobs": [{"agent": "host:port", "port": ..., "commands": [...], '
+                                      '"cycles": N}, ...]}')
+    run.add_argument("--db", default=os.path.join(PROJECT_DIR, "results.db"), help="Results database")
+    run.add_argument("--local", type=int, default=0,
+                     help="Start this many agents on localhost and give them the jobs without an agent")
+    run.add_argument("--report", help="Write the merged campaign report to this HTML file")
+    run.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                     help=f"Shared secret of the agents (default: ${TOKEN_ENV})")
+    run.add_argument("--allow-scheme", action="append", default=[], metavar="SCHEME",
+                     help="Let the --local agents also accept pyserial URLs of this scheme")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        metrics = None
+        if args.metrics:
+            metrics = EngineMetrics()
+            host, port = MetricsServer(metrics.registry, port=args.metrics).start()
+            print(f"Metrics at http://{host}:{port}/metrics")
+        address = parse_address(args.listen)
+        if not args.token and not is_loopback(address[0]):
+            parser.error(f"listening on {address[0]} lets any host run jobs; set --token or ${TOKEN_ENV}")
+        agent = TestAgent(address, results_dir=args.results_dir, metrics=metrics, token=args.token,
+                          allowed_schemes=DEFAULT_ALLOWED_SCHEMES + tuple(args.allow_scheme))
+        print(f"Agent {agent.name} listening on {agent.listen()}")
+        agent.serve_forever()
+        return
+
+    with open(args.campaign, encoding="utf-8") as f:
+        campaign = json.load(f)
+    if not args.local and any("agent" not in spec for spec in campaign["jobs"]):
+        parser.error('jobs without an "agent" need --local N to start agents for them')
+    local = (start_local_agents(args.local, token=args.token,
+                                allowed_schemes=DEFAULT_ALLOWED_SCHEMES + tuple(args.allow_scheme))
+             if args.local else [])
+    db = ResultsDatabase(args.db)
+    db.start()
+    coordinator = Coordinator(db, log=print, token=args.token)
+    for index, spec in enumerate(campaign["jobs"]):
+        spec = dict(spec)
+        agent = parse_address(spec.pop("agent")) if "agent" in spec else local[index % len(local)]
+        coordinator.submit(agent, spec.pop("commands"), spec.pop("port"), spec.pop("cycles"), **spec)
+    try:
+        coordinator.wait()
+    except KeyboardInterrupt:
+        coordinator.stop()
+        coordinator.wait(10)
+    db.close()
+
+    rows = sum(job.rows for job in coordinator.jobs.values())
+    print(f"Campaign {coordinator.statistics.outcome}: {coordinator.statistics.describe()} "
+          f"({rows} rows collected in {args.db})")
+    if args.report:
+        with atomic_path(args.report) as temp:
+            coordinator.statistics.write_html(temp)
+        print(f"Report saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
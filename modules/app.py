@@ -8,6 +8,7 @@ import sys
 from modules.serialFrame import SerialConnectionFrame
 from modules.commandFrame import CommandControlFrame
 from modules.monitorFrame import SerialMonitorFrame
+from modules.chartFrame import ChartFrame
 from modules.logics import SerialLogic
 
 class RobotTestApp:
@@ -45,4 +46,13 @@ class RobotTestApp:
         self.monitorFrame = SerialMonitorFrame(self.mainframe)
         self.monitorFrame.pack(fill=BOTH, expand=YES, padx=5, pady=5)
 
-        self.logic = SerialLogic(self.serialFrame, self.commandFrame, self.monitorFrame)
\ No newline at end of file
+        self.chartFrame = ChartFrame(self.mainframe)
+        self.chartFrame.pack(fill=BOTH, expand=YES, padx=5, pady=5)
+
+        self.logic = SerialLogic(self.serialFrame, self.commandFrame, self.monitorFrame, self.chartFrame)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        """Close the port and flush the outputs before the window goes away"""
+        self.logic.shutdown()
+        self.root.destroy()
@@ -0,0 +1,205 @@
+import csv
+import json
+import math
+
+from modules.report import LatencySketch
+
+# Per-command latency baselines, kept across runs in the results database
+# (table "baselines", one JSON row per port and command). A run is checked
+# against the baselines as they were when it started and, when it ends, its
+# passing latencies are folded into them - except for commands that drifted,
+# so a regression is reported again next run instead of becoming the norm.
+# `python -m modules.baseline results.db --reset` clears them after an
+# intended change.
+
+
+class CommandBaseline:
+    """EWMA mean and variance plus a quantile sketch of one command's latency"""
+
+    def __init__(self, alpha=0.02):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.variance = 0.0
+        self.count = 0
+        self.sketch = LatencySketch()
+
+    def add(self, latency):
+        self.count += 1
+        self.sketch.add(latency)
+        if self.count == 1:
+            self.mean = latency
+            return
+        diff = latency - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.variance = (1 - self.alpha) * (self.variance + diff * increment)
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        return {"alpha": self.alpha, "mean": self.mean, "variance": self.variance, "count": self.count,
+                "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        baseline = cls(data["alpha"])
+        baseline.mean = data["mean"]
+        baseline.variance = data["variance"]
+        baseline.count = data["count"]
+        baseline.sketch = LatencySketch.from_dict(data["sketch"])
+        return baseline
+
+
+class Anomaly:
+    def __init__(self, kind, command, latency, reference, cycle=None, step=None):
+        self.kind = kind  # "slow" (one step) or "drift" (the command's recent mean)
+        self.command = command
+        self.latency = latency
+        self.reference = reference  # Threshold the latency was compared with
+        self.cycle = cycle
+        self.step = step
+
+    def describe(self):
+        if self.kind == "slow":
+            return (f"Slow step: {self.command} took {self.latency * 1000:.1f} ms, "
+                    f"baseline p99 limit {self.reference * 1000:.1f} ms")
+        return (f"Latency drift: {self.command} averages {self.latency * 1000:.1f} ms, "
+                f"baseline drift limit {self.reference * 1000:.1f} ms")
+
+
+class CommandWatch:
+    """Thresholds frozen from a baseline and the run's own running state"""
+
+    def __init__(self, baseline, slow_margin, drift_ratio, run_alpha):
+        self.slow_limit = baseline.sketch.quantile(0.99) * (1 + slow_margin)
+        self.reference_mean = baseline.mean  # The baseline keeps learning during the run
+        self.drift_limit = baseline.mean * (1 + drift_ratio)
+        self.run_alpha = run_alpha
+        self.run_mean = None
+        self.samples = 0
+        self.drifting = False
+        self.drifted = False  # Drifted at any point of the run
+
+
+class AnomalyDetector:
+    """Flags steps that are slow or drifting compared to the stored baselines
+
+    A step is slow when its latency exceeds the baseline's p99 by more than
+    slow_margin. A command drifts when an EWMA of its latencies in this run
+    (weight run_alpha, judged after warmup samples) exceeds the baseline
+    EWMA mean by more than drift_ratio; that is reported once each time it
+    starts. Commands need min_samples baseline samples before they are
+    judged. Thresholds are computed when the detector is created, so
+    check() is O(1) per step.
+    """
+
+    def __init__(self, baselines=None, slow_margin=0.2, drift_ratio=0.25, run_alpha=0.1, warmup=10,
+                 min_samples=30, max_records=10000):
+        self.baselines = dict(baselines or {})
+        self.slow_margin = slow_margin
+        self.drift_ratio = drift_ratio
+        self.run_alpha = run_alpha
+        self.warmup = warmup
+        self.min_samples = min_samples
+        self.max_records = max_records
+        self.watches = {command: CommandWatch(baseline, slow_margin, drift_ratio, run_alpha)
+                        for command, baseline in self.baselines.items() if baseline.count >= min_samples}
+        self.records = []  # The first max_records anomalies, for anomalies.csv
+        self.slow_steps = 0
+        self.drifts = 0
+
+    def check(self, command, latency, cycle=None, step=None):
+        """Learn a passing step's latency and return the anomalies it shows"""
+        baseline = self.baselines.get(command)
+        if baseline is None:
+            baseline = self.baselines[command] = CommandBaseline()
+        baseline.add(latency)
+
+        watch = self.watches.get(command)
+        if watch is None:
+            return []
+        anomalies = []
+        if latency > watch.slow_limit:
+            self.slow_steps += 1
+            anomalies.append(Anomaly("slow", command, latency, watch.slow_limit, cycle, step))
+
+        watch.samples += 1
+        if watch.run_mean is None:
+            watch.run_mean = latency
+        else:
+            watch.run_mean += watch.run_alpha * (latency - watch.run_mean)
+        if watch.samples >= self.warmup:
+            drifting = watch.run_mean > watch.drift_limit
+            if drifting and not watch.drifting:
+                self.drifts += 1
+                watch.drifted = True
+                anomalies.append(Anomaly("drift", command, watch.run_mean, watch.drift_limit, cycle, step))
+            watch.drifting = drifting
+
+        for anomaly in anomalies:
+            if len(self.records) < self.max_records:
+                self.records.append(anomaly)
+        return anomalies
+
+    def updated(self):
+        """Baselines to store after the run, leaving out commands that drifted"""
+        return {command: baseline for command, baseline in self.baselines.items()
+                if not (command in self.watches and self.watches[command].drifted)}
+
+    def describe(self):
+        judged = len(self.watches)
+        if not self.slow_steps and not self.drifts:
+            return f"Latency anomalies: none ({judged} commands with baselines)"
+        drifted = [f"{command} ({(watch.run_mean / watch.reference_mean - 1) * 100:+.0f}%)"
+                   for command, watch in self.watches.items() if watch.drifted]
+        text = f"Latency anomalies: {self.slow_steps} slow steps"
+        if drifted:
+            text += "; drifting: " + ", ".join(drifted) + " (baselines kept)"
+        return text
+
+    def save_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["CYCLE", "STEP", "COMMAND", "KIND", "LATENCY_MS", "LIMIT_MS"])
+            for anomaly in self.records:
+                writer.writerow([anomaly.cycle, anomaly.step, anomaly.command, anomaly.kind,
+                                 f"{anomaly.latency * 1000:.3f}", f"{anomaly.reference * 1000:.3f}"])
+
+
+def load_baselines(results_db, port):
+    """CommandBaselines of a port from the results database"""
+    return {command: CommandBaseline.from_dict(data) for command, data in results_db.load_baselines(port).items()}
+
+
+def save_baselines(results_db, port, baselines):
+    """Queue the baselines of a port for the results database writer"""
+    results_db.save_baselines(port, {command: baseline.to_dict() for command, baseline in baselines.items()})
+
+
+def main():
+    """List or reset the latency baselines of a results database"""
+    import argparse
+    from modules.resultsDb import ResultsDatabase
+
+    parser = argparse.ArgumentParser(description="Per-command latency baselines")
+    parser.add_argument("database", help="Path to the results database")
+    parser.add_argument("--port", help="Only this port")
+    parser.add_argument("--command", help="Only this command")
+    parser.add_argument("--reset", action="store_true", help="Delete the selected baselines")
+    args = parser.parse_args()
+
+    db = ResultsDatabase(args.database)
+    if args.reset:
+        print(f"Deleted {db.delete_baselines(args.port, args.command)} baselines")
+        return
+    for port, command, data in db.baselines(args.port, args.command):
+        baseline = CommandBaseline.from_dict(json.loads(data))
+        p50, p99 = (baseline.sketch.quantile(q) * 1000 for q in (0.5, 0.99))
+        print(f"{port}  {command}  n={baseline.count}  mean={baseline.mean * 1000:.1f} ms  "
+              f"sd={baseline.stdev * 1000:.1f} ms  p50={p50:.1f} ms  p99={p99:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
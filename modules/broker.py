@@ -0,0 +1,483 @@
+import json
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+
+import serial
+
+# kind, priority, port name length, payload length; followed by the name and the payload
+FRAME = struct.Struct("<BBHI")
+
+# Client requests
+OPEN = 1  # Open (or join) a port and subscribe to its traffic; payload: JSON settings
+CLOSE = 2  # Unsubscribe; the port is closed when its last client leaves
+SEND = 3  # Write payload to the port
+ACQUIRE = 4  # Take exclusive write access at the frame's priority
+RELEASE = 5
+LIST = 6  # List the broker's ports
+
+# Broker messages
+RX = 16  # Bytes read from the port, sent to every subscriber
+TX = 17  # Bytes another client wrote, so observers see both directions
+OK = 18
+ERROR = 19  # payload: message
+REVOKED = 20  # Exclusive access was taken by a higher-priority client
+
+EMERGENCY_PRIORITY = 0  # Sends at this priority (HALT) bypass an exclusive lease
+DEFAULT_PRIORITY = 5
+
+if hasattr(socket, "AF_UNIX"):
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), "robot_port_broker.sock")
+else:
+    DEFAULT_ADDRESS = ("127.0.0.1", 47800)  # No Unix-domain sockets on this platform
+
+
+def pack_frame(kind, port="", payload=b"", priority=0):
+    """Return the header (with the port name) and the payload as separate buffers"""
+    name = port.encode()
+    return FRAME.pack(kind, priority, len(name), len(payload)) + name, payload
+
+
+def _recv_exact(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("Connection closed")
+        received += count
+    return data
+
+
+def read_frame(sock):
+    """Read one frame; returns (kind, priority, port, payload)"""
+    kind, priority, name_length, payload_length = FRAME.unpack(_recv_exact(sock, FRAME.size))
+    port = bytes(_recv_exact(sock, name_length)).decode() if name_length else ""
+    payload = bytes(_recv_exact(sock, payload_length)) if payload_length else b""
+    return kind, priority, port, payload
+
+
+def _listen(address):
+    if isinstance(address, str):
+        if os.path.exists(address):
+            _remove_stale_socket(address)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(address)
+    server.listen()
+    return server
+
+
+def _remove_stale_socket(path):
+    """Remove the socket file of a broker that did not shut down cleanly
+
+    Raises OSError if a broker is still listening there, so a second
+    broker never takes the address over from a live one.
+    """
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.settimeout(1)
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.remove(path)  # Nobody listening
+        return
+    finally:
+        probe.close()
+    raise OSError(f"A broker is already listening on {path}")
+
+
+def connect(address, timeout=None):
+    """Open a client connection to the broker"""
+    sock = socket.socket(socket.AF_UNIX if isinstance(address, str) else socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(address)
+    sock.settimeout(None)
+    if sock.family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+class BrokerConnection:
+    """A client as seen by the broker
+
+    Outgoing frames go through a bounded queue drained by a writer thread,
+    so a slow client never holds up the port reader; a client that falls
+    max_pending frames behind is disconnected.
+    """
+
+    def __init__(self, broker, sock, max_pending=10000):
+        self.broker = broker
+        self.sock = sock
+        self.outgoing = queue.Queue(max_pending)
+        self.ports = set()
+        self.closed = False
+
+    def start(self):
+        threading.Thread(target=self._reader, daemon=True).start()
+        threading.Thread(target=self._writer, daemon=True).start()
+
+    def send(self, frame):
+        """Queue a (header, payload) pair; the same buffers may go to many clients"""
+        try:
+            self.outgoing.put_nowait(frame)
+        except queue.Full:
+            self.close()
+
+    def reply(self, kind, port="", payload=b""):
+        self.send(pack_frame(kind, port, payload))
+
+    def _writer(self):
+        scatter = hasattr(self.sock, "sendmsg")
+        try:
+            while True:
+                frame = self.outgoing.get()
+                if frame is None:
+                    return
+                header, payload = frame
+                if scatter and payload:
+                    sent = self.sock.sendmsg(frame)
+                    if sent < len(header) + len(payload):
+                        self.sock.sendall((header + payload)[sent:])
+                else:
+                    self.sock.sendall(header + payload)
+        except OSError:
+            self.close()
+
+    def _reader(self):
+        try:
+            while True:
+                self.broker.handle(self, *read_frame(self.sock))
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.broker.disconnect(self)
+        try:
+            self.outgoing.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class BrokeredPort:
+    """A serial port owned by the broker and shared by its subscribers"""
+
+    def __init__(self, name, settings):
+        self.name = name
+        self.conn = serial.serial_for_url(name, baudrate=settings.get("baudrate", 115200), timeout=1)
+        self.subscribers = set()
+        self.write_lock = threading.Lock()
+        self.owner = None
+        self.owner_priority = None
+        self.running = True
+        self.rx_bytes = 0
+        self.tx_bytes = 0
+        self.thread = threading.Thread(target=self._reader, daemon=True)
+        self.thread.start()
+
+    def _reader(self):
+        while self.running:
+            try:
+                data = self.conn.read(1)
+                if data and self.conn.in_waiting:
+                    data += self.conn.read(self.conn.in_waiting)
+            except (OSError, serial.SerialException, TypeError):
+                if self.running:
+                    self.fan_out(pack_frame(ERROR, self.name, b"Port read failed"))
+                return
+            if data:
+                self.rx_bytes += len(data)
+                self.fan_out(pack_frame(RX, self.name, data))
+
+    def fan_out(self, frame, skip=None):
+        """Queue one frame to every subscriber; the buffers are shared, not copied"""
+        for client in list(self.subscribers):
+            if client is not skip:
+                client.send(frame)
+
+    def write(self, client, data, priority):
+        if (self.owner is not None and self.owner is not client
+                and priority != EMERGENCY_PRIORITY):
+            return False
+        with self.write_lock:
+            self.conn.write(data)
+            self.conn.flush()
+        self.tx_bytes += len(data)
+        self.fan_out(pack_frame(TX, self.name, data), skip=client)
+        return True
+
+    def acquire(self, client, priority):
+        if self.owner is None or self.owner is client or priority < self.owner_priority:
+            if self.owner is not None and self.owner is not client:
+                self.owner.reply(REVOKED, self.name)
+            self.owner = client
+            self.owner_priority = priority
+            return True
+        return False
+
+    def release(self, client):
+        if self.owner is client:
+            self.owner = None
+            self.owner_priority = None
+
+    def close(self):
+        self.running = False
+        if hasattr(self.conn, "cancel_read"):
+            self.conn.cancel_read()
+        # The reader itself gets here when a subscriber it fans out to is dropped
+        if self.thread is not threading.current_thread():
+            self.thread.join(1)
+        self.conn.close()
+
+
+class PortBroker:
+    """Owns serial ports and shares them with local clients
+
+    Every subscriber of a port gets all RX bytes and the TX written by the
+    other clients, so a GUI, a headless run and a logger can watch the same
+    device while the device link carries one stream. Writes are arbitrated
+    by an exclusive lease: a client that acquires a port at a priority
+    (lower value wins) is the only writer until it releases it or a
+    higher-priority client takes over; sends at EMERGENCY_PRIORITY (HALT)
+    always go through.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS):
+        self.address = address
+        self.ports = {}
+        self.clients = set()
+        self.lock = threading.Lock()
+        self.server = None
+
+    def serve_forever(self):
+        self.server = _listen(self.address)
+        try:
+            self._accept(self.server)
+        finally:
+            self.shutdown()
+
+    def start(self):
+        """Serve from a background thread and return once listening"""
+        self.server = _listen(self.address)
+        thread = threading.Thread(target=self._accept, args=(self.server,), daemon=True)
+        thread.start()
+        return thread
+
+    def _accept(self, server):
+        while True:
+            try:
+                sock, _ = server.accept()
+            except OSError:
+                return  # Closed by shutdown()
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = BrokerConnection(self, sock)
+            with self.lock:
+                self.clients.add(client)
+            client.start()
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
+        for client in list(self.clients):
+            client.close()
+        with self.lock:
+            for port in self.ports.values():
+                port.close()
+            self.ports.clear()
+
+    def handle(self, client, kind, priority, name, payload):
+        try:
+            if kind == OPEN:
+                with self.lock:
+                    port = self.ports.get(name)
+                    if port is None:
+                        port = self.ports[name] = BrokeredPort(name, json.loads(payload or b"{}"))
+                    port.subscribers.add(client)
+                client.ports.add(name)
+                client.reply(OK, name)
+            elif kind == CLOSE:
+                self._leave(client, name)
+                client.reply(OK, name)
+            elif kind == SEND:
+                port = self.ports.get(name)
+                if port is None or client not in port.subscribers:
+                    client.reply(ERROR, name, b"Port not open")
+                elif not port.write(client, payload, priority):
+                    client.reply(ERROR, name, b"Port is held by a higher-priority client")
+                else:
+                    client.reply(OK, name)
+            elif kind == ACQUIRE:
+                port = self.ports.get(name)
+                if port is not None and port.acquire(client, priority):
+                    client.reply(OK, name)
+                else:
+                    client.reply(ERROR, name, b"Port is held by a higher-priority client")
+            elif kind == RELEASE:
+                port = self.ports.get(name)
+                if port is not None:
+                    port.release(client)
+                client.reply(OK, name)
+            elif kind == LIST:
+                client.reply(LIST, payload=json.dumps(self.describe()).encode())
+            else:
+                client.reply(ERROR, name, f"Unknown request {kind}".encode())
+        except Exception as e:
+            client.reply(ERROR, name, str(e).encode())
+
+    def describe(self):
+        """Open ports with their subscribers and owner, plus the host's other serial ports"""
+        import serial.tools.list_ports
+
+        with self.lock:
+            ports = {name: {"open": True, "clients": len(port.subscribers), "exclusive": port.owner is not None,
+                            "rx_bytes": port.rx_bytes, "tx_bytes": port.tx_bytes}
+                     for name, port in self.ports.items()}
+        for info in serial.tools.list_ports.comports():
+            ports.setdefault(info.device, {"open": False, "clients": 0, "exclusive": False})
+        return ports
+
+    def _leave(self, client, name):
+        client.ports.discard(name)
+        with self.lock:
+            port = self.ports.get(name)
+            if port is None:
+                return
+            port.subscribers.discard(client)
+            port.release(client)
+            if not port.subscribers:
+                del self.ports[name]
+                port.close()
+
+    def disconnect(self, client):
+        for name in list(client.ports):
+            self._leave(client, name)
+        with self.lock:
+            self.clients.discard(client)
+
+
+class BrokerClient:
+    """Client side of the broker protocol
+
+    Requests are answered in order, so they are sent one at a time. RX/TX
+    traffic and REVOKED notices arrive in between and are passed to
+    on_frame(kind, port, payload) from the client's reader thread.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, on_frame=None, timeout=5):
+        self.sock = connect(address, timeout)
+        self.on_frame = on_frame
+        self.timeout = timeout
+        self.replies = queue.Queue()
+        self.request_lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self._reader, daemon=True)
+        self.thread.start()
+
+    def _reader(self):
+        try:
+            while True:
+                kind, priority, port, payload = read_frame(self.sock)
+                if kind in (OK, ERROR, LIST):
+                    self.replies.put((kind, port, payload))
+                elif self.on_frame:
+                    self.on_frame(kind, port, payload)
+        except (OSError, ConnectionError):
+            self.closed = True
+            self.replies.put((ERROR, "", b"Broker connection closed"))
+            if self.on_frame:
+                self.on_frame(ERROR, "", b"Broker connection closed")
+
+    def request(self, kind, port="", payload=b"", priority=0):
+        """Send a request and return the reply payload; raises on ERROR"""
+        with self.request_lock:
+            header, payload = pack_frame(kind, port, payload, priority)
+            self.sock.sendall(header + payload)
+            try:
+                reply, _, data = self.replies.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError("No reply from the port broker")
+        if reply == ERROR:
+            raise serial.SerialException(data.decode(errors="replace"))
+        return data
+
+    def open(self, port, baudrate=115200):
+        self.request(OPEN, port, json.dumps({"baudrate": baudrate}).encode())
+
+    def close_port(self, port):
+        self.request(CLOSE, port)
+
+    def send(self, port, data, priority=DEFAULT_PRIORITY):
+        self.request(SEND, port, bytes(data), priority)
+
+    def acquire(self, port, priority=DEFAULT_PRIORITY):
+        self.request(ACQUIRE, port, priority=priority)
+
+    def release(self, port):
+        self.request(RELEASE, port)
+
+    def list_ports(self):
+        return json.loads(self.request(LIST))
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+
+def broker_ports(address=DEFAULT_ADDRESS, timeout=0.5):
+    """Return the broker's port list, or {} if no broker is running"""
+    try:
+        client = BrokerClient(address, timeout=timeout)
+    except OSError:
+        return {}
+    try:
+        return client.list_ports()
+    except (OSError, serial.SerialException):
+        return {}
+    finally:
+        client.close()
+
+
+def main():
+    """Run the port broker in the foreground"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Share serial ports between local clients")
+    parser.add_argument("--socket", help=f"Unix socket path (default: {DEFAULT_ADDRESS})")
+    parser.add_argument("--tcp", type=int, help="Listen on this localhost TCP port instead of a Unix socket")
+    args = parser.parse_args()
+
+    address = ("127.0.0.1", args.tcp) if args.tcp else (args.socket or DEFAULT_ADDRESS)
+    broker = PortBroker(address)
+    print(f"Port broker listening on {address}")
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
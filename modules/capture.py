@@ -0,0 +1,229 @@
+import bisect
+import itertools
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"RTCAP01\n"
+
+# Magic, wall clock (ns since epoch) and perf_counter_ns() taken at the same moment
+FILE_HEADER = struct.Struct("<8sqq")
+
+# perf_counter_ns, direction, cycle, step, payload length
+RECORD_HEADER = struct.Struct("<qBIHI")
+
+# perf_counter_ns, cycle, file offset of the record
+INDEX_ENTRY = struct.Struct("<qIQ")
+
+TX = 0
+RX = 1
+DIRECTIONS = {TX: "TX", RX: "RX"}
+
+
+class CaptureWriter:
+    """Append-only binary log of every TX/RX chunk
+
+    Each record is a fixed 19-byte header plus the raw bytes. A sparse
+    index (<file>.idx) gets an entry every index_interval bytes and at the
+    first record of every cycle, so a reader can jump to any time or
+    cycle without scanning the whole log. Writes are buffered and flushed
+    at least every flush_interval seconds of traffic; the engine also
+    flushes at every cycle boundary.
+    """
+
+    def __init__(self, path, index_interval=64 * 1024, buffer_size=1024 * 1024, flush_interval=1.0):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.index_interval = index_interval
+        self.lock = threading.Lock()
+        self.file = open(path, "wb", buffering=buffer_size)
+        self.index_file = open(self.index_path, "wb")
+        self.file.write(FILE_HEADER.pack(MAGIC, time.time_ns(), time.perf_counter_ns()))
+        self.offset = FILE_HEADER.size
+        self.last_indexed = None
+        self.last_cycle = None
+        self.flush_interval_ns = int(flush_interval * 1e9)
+        self.last_flush_ns = time.perf_counter_ns()
+
+    def record(self, direction, data, cycle=0, step=0):
+        """Append one chunk; safe to call from any thread"""
+        timestamp = time.perf_counter_ns()
+        with self.lock:
+            if self.file is None:
+                return
+            if (self.last_indexed is None or cycle != self.last_cycle
+                    or self.offset - self.last_indexed >= self.index_interval):
+                self.index_file.write(INDEX_ENTRY.pack(timestamp, cycle, self.offset))
+                self.last_indexed = self.offset
+                self.last_cycle = cycle
+            self.file.write(RECORD_HEADER.pack(timestamp, direction, cycle, step & 0xFFFF, len(data)))
+            self.file.write(data)
+            self.offset += RECORD_HEADER.size + len(data)
+            if timestamp - self.last_flush_ns >= self.flush_interval_ns:
+                self._flush(timestamp)
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self._flush(time.perf_counter_ns())
+
+    def _flush(self, now_ns):
+        self.file.flush()
+        self.index_file.flush()
+        self.last_flush_ns = now_ns
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.index_file.close()
+                self.file = None
+                self.index_file = None
+
+
+class CaptureRecord:
+    """One captured chunk; payload is a zero-copy view into the mapped file"""
+
+    __slots__ = ("offset", "timestamp_ns", "direction", "cycle", "step", "payload")
+
+    def __init__(self, offset, timestamp_ns, direction, cycle, step, payload):
+        self.offset = offset
+        self.timestamp_ns = timestamp_ns
+        self.direction = direction
+        self.cycle = cycle
+        self.step = step
+        self.payload = payload
+
+
+class CaptureReader:
+    """Memory-mapped reader for capture files of any size
+
+    Only the pages actually visited are read from disk, so opening a
+    multi-GB capture and seeking into it is instant.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        if self.size < FILE_HEADER.size:
+            raise ValueError(f"{path} is not a capture file")
+        magic, self.start_wall_ns, self.start_perf_ns = FILE_HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        self.index_times, self.index_cycles, self.index_offsets = self._load_index(path + ".idx")
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            try:
+                self.data.close()
+            except BufferError:
+                pass  # Record payloads still reference the map, it is unmapped when they go
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _load_index(self, index_path):
+        times, cycles, offsets = [], [], []
+        try:
+            with open(index_path, "rb") as f:
+                raw = f.read()
+        except OSError:
+            raw = b""
+        usable = len(raw) - len(raw) % INDEX_ENTRY.size
+        for timestamp, cycle, offset in INDEX_ENTRY.iter_unpack(raw[:usable]):
+            if offset < self.size:
+                times.append(timestamp)
+                cycles.append(cycle)
+                offsets.append(offset)
+        if not offsets:
+            offsets = [FILE_HEADER.size]
+            times = [self.start_perf_ns]
+            cycles = [0]
+        return times, cycles, offsets
+
+    def records(self, offset=None):
+        """Yield records from offset (default: the first record) to the end
+
+        A record truncated by a crash ends the iteration.
+        """
+        data = self.data
+        offset = FILE_HEADER.size if offset is None else offset
+        view = memoryview(data)
+        while offset + RECORD_HEADER.size <= self.size:
+            timestamp, direction, cycle, step, length = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            if start + length > self.size:
+                return
+            yield CaptureRecord(offset, timestamp, direction, cycle, step, view[start:start + length])
+            offset = start + length
+
+    def seconds(self, record):
+        """Seconds since the capture started"""
+        return (record.timestamp_ns - self.start_perf_ns) / 1e9
+
+    def wall_time(self, record):
+        """Epoch seconds of a record"""
+        return (self.start_wall_ns + record.timestamp_ns - self.start_perf_ns) / 1e9
+
+    def seek_time(self, seconds):
+        """Return records from the first one at or after seconds since the start"""
+        target = self.start_perf_ns + int(seconds * 1e9)
+        position = max(0, bisect.bisect_right(self.index_times, target) - 1)
+        return itertools.dropwhile(lambda record: record.timestamp_ns < target,
+                                   self.records(self.index_offsets[position]))
+
+    def seek_cycle(self, cycle):
+        """Return records from the first one of the given cycle
+
+        The index has an entry at the start of every cycle, so this jumps
+        straight to it. Cycles restart at 1 with each run, so the first run
+        in the capture that reached the cycle is used.
+        """
+        try:
+            position = self.index_cycles.index(cycle)
+        except ValueError:
+            return iter(())
+        return self.records(self.index_offsets[position])
+
+
+def format_record(reader, record):
+    """Format a record like a monitor line"""
+    text = bytes(record.payload).decode("utf-8", errors="replace").rstrip("\r\n")
+    return (f"{reader.seconds(record):12.6f}s  cycle {record.cycle:<6d} step {record.step:<4d} "
+            f"{DIRECTIONS.get(record.direction, '??')}: {text}")
+
+
+def main():
+    """Print records of a capture file, optionally starting at a time or cycle"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="View a raw serial capture")
+    parser.add_argument("capture", help="Path to a .cap file")
+    parser.add_argument("--time", type=float, help="Start at this many seconds into the capture")
+    parser.add_argument("--cycle", type=int, help="Start at this cycle")
+    parser.add_argument("--count", type=int, default=50, help="Number of records to print (0 for all)")
+    args = parser.parse_args()
+
+    with CaptureReader(args.capture) as reader:
+        if args.cycle is not None:
+            records = reader.seek_cycle(args.cycle)
+        elif args.time is not None:
+            records = reader.seek_time(args.time)
+        else:
+            records = reader.records()
+        if args.count:
+            records = itertools.islice(records, args.count)
+        for record in records:
+            print(format_record(reader, record))
+
+
+if __name__ == "__main__":
+    main()
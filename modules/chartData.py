@@ -0,0 +1,186 @@
+import bisect
+import math
+import threading
+from array import array
+
+
+class Level:
+    """Summaries of consecutive blocks of size points"""
+
+    def __init__(self, size):
+        self.size = size
+        self.x_first = array("d")
+        self.x_last = array("d")
+        self.y_min = array("d")
+        self.y_max = array("d")
+        self.y_sum = array("d")
+        self.count = array("I")
+
+    def __len__(self):
+        return len(self.x_first)
+
+    def add(self, block, x, y):
+        if block == len(self.x_first):
+            self.x_first.append(x)
+            self.x_last.append(x)
+            self.y_min.append(y)
+            self.y_max.append(y)
+            self.y_sum.append(y)
+            self.count.append(1)
+        else:
+            self.x_last[block] = x
+            if y < self.y_min[block]:
+                self.y_min[block] = y
+            if y > self.y_max[block]:
+                self.y_max[block] = y
+            self.y_sum[block] += y
+            self.count[block] += 1
+
+
+class Series:
+    """Append-only (x, y) series with min/max/mean pyramids for drawing
+
+    Level k summarises blocks of base * factor**k points and is updated
+    on every append, so picking the level whose blocks number about
+    twice the pixel width makes a redraw cost O(width) however many
+    points the series holds. x must not decrease (cycle numbers do not).
+    """
+
+    def __init__(self, base=16, factor=4):
+        self.base = base
+        self.factor = factor
+        self.xs = array("d")
+        self.ys = array("d")
+        self.levels = []
+
+    def __len__(self):
+        return len(self.xs)
+
+    def append(self, x, y):
+        index = len(self.xs)
+        self.xs.append(x)
+        self.ys.append(y)
+        for level in self.levels:
+            level.add(index // level.size, x, y)
+        size = self.base * self.factor ** len(self.levels)
+        if index + 1 >= size * 2:
+            self.levels.append(self._build(size))
+
+    def _build(self, size):
+        """Summarise the points so far at a new, coarser level"""
+        level = Level(size)
+        finer = self.levels[-1] if self.levels else None
+        if finer is None:
+            for index, (x, y) in enumerate(zip(self.xs, self.ys)):
+                level.add(index // size, x, y)
+            return level
+        ratio = size // finer.size
+        for block in range(len(finer)):
+            target = block // ratio
+            if target == len(level):
+                level.x_first.append(finer.x_first[block])
+                level.x_last.append(finer.x_last[block])
+                level.y_min.append(finer.y_min[block])
+                level.y_max.append(finer.y_max[block])
+                level.y_sum.append(finer.y_sum[block])
+                level.count.append(finer.count[block])
+            else:
+                level.x_last[target] = finer.x_last[block]
+                level.y_min[target] = min(level.y_min[target], finer.y_min[block])
+                level.y_max[target] = max(level.y_max[target], finer.y_max[block])
+                level.y_sum[target] += finer.y_sum[block]
+                level.count[target] += finer.count[block]
+        return level
+
+    def x_range(self):
+        return (self.xs[0], self.xs[-1]) if self.xs else None
+
+    def summary(self, x0, x1, limit):
+        """(x, y_min, y_max, y_mean) items in [x0, x1] from the finest level with at most limit items"""
+        start, stop = bisect.bisect_left(self.xs, x0), bisect.bisect_right(self.xs, x1)
+        if stop - start <= limit:
+            return [(self.xs[i], self.ys[i], self.ys[i], self.ys[i]) for i in range(start, stop)]
+        for level in self.levels:
+            start = bisect.bisect_left(level.x_last, x0)
+            stop = bisect.bisect_right(level.x_first, x1)
+            if stop - start <= limit or level is self.levels[-1]:
+                return [((level.x_first[i] + level.x_last[i]) / 2, level.y_min[i], level.y_max[i],
+                         level.y_sum[i] / level.count[i]) for i in range(start, stop)]
+        return []
+
+    def min_max(self, x0, x1, width):
+        """Per pixel column: (column, y_min, y_max) over [x0, x1]"""
+        columns = {}
+        span = (x1 - x0) or 1.0
+        for x, low, high, _ in self.summary(x0, x1, 2 * width):
+            column = min(width - 1, max(0, int((x - x0) / span * (width - 1))))
+            current = columns.get(column)
+            if current is None:
+                columns[column] = [low, high]
+            else:
+                current[0] = min(current[0], low)
+                current[1] = max(current[1], high)
+        return [(column, low, high) for column, (low, high) in sorted(columns.items())]
+
+    def lttb(self, x0, x1, width):
+        """About width (x, y) points chosen by Largest-Triangle-Three-Buckets over block means"""
+        points = [(x, mean) for x, _, _, mean in self.summary(x0, x1, 4 * width)]
+        return lttb(points, width)
+
+
+def lttb(points, threshold):
+    """Downsample (x, y) points to threshold points keeping the visual shape"""
+    count = len(points)
+    if threshold >= count or threshold < 3:
+        return list(points)
+    sampled = [points[0]]
+    every = (count - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        start = int((i + 1) * every) + 1
+        stop = min(int((i + 2) * every) + 1, count)
+        next_bucket = points[start:stop] or [points[-1]]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        # Point of this bucket forming the largest triangle with the previous pick
+        ax, ay = points[a]
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, start):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+class ChartData:
+    """Named series fed from the executor thread and drawn by the chart panel"""
+
+    def __init__(self):
+        self.series = {}
+        self.version = 0  # Bumped on every change, so the panel redraws only when needed
+        self.lock = threading.Lock()
+
+    def add(self, name, x, y):
+        if y is None or math.isnan(y):
+            return
+        with self.lock:
+            series = self.series.get(name)
+            if series is None:
+                series = self.series[name] = Series()
+            series.append(x, y)
+            self.version += 1
+
+    def names(self):
+        with self.lock:
+            return sorted(self.series)
+
+    def clear(self):
+        with self.lock:
+            self.series = {}
+            self.version += 1
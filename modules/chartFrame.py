@@ -0,0 +1,103 @@
+import tkinter as tk
+from tkinter import ttk
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+class ChartFrame(ttk.LabelFrame):
+    def __init__(self, parent):
+        super().__init__(parent, text="Charts", padding="10")
+
+        # Series selection
+        self.topContainer = ttk.Frame(self)
+        self.topContainer.pack(fill=X)
+
+        self.seriesLabel = ttk.Label(self.topContainer, text="Series:")
+        self.seriesLabel.pack(side=LEFT, padx=(0, 5))
+
+        self.seriesVar = tk.StringVar()
+        self.seriesCombo = ttk.Combobox(self.topContainer, textvariable=self.seriesVar,
+                                        state="readonly", width=40)
+        self.seriesCombo.pack(side=LEFT)
+
+        self.countVar = tk.StringVar()
+        self.countLabel = ttk.Label(self.topContainer, textvariable=self.countVar)
+        self.countLabel.pack(side=LEFT, padx=10)
+
+        # Plot area
+        self.chartCanvas = tk.Canvas(self, height=180, background="white", highlightthickness=0)
+        self.chartCanvas.pack(fill=BOTH, expand=YES, pady=(5, 0))
+
+        # Margins around the plot, in pixels
+        self.left = 60
+        self.right = 10
+        self.top = 10
+        self.bottom = 20
+
+    def plotWidth(self):
+        """Width of the plot area in pixels"""
+        return max(2, self.chartCanvas.winfo_width() - self.left - self.right)
+
+    def setSeries(self, names):
+        """Offer these series, keeping the selection if it still exists"""
+        self.seriesCombo['values'] = names
+        if self.seriesVar.get() not in names:
+            self.seriesVar.set(names[0] if names else "")
+
+    def drawEnvelope(self, columns, x0, x1, unit=""):
+        """Draw (column, low, high) per pixel column as one min/max envelope line"""
+        if not columns:
+            self.drawEmpty()
+            return
+        low = min(column[1] for column in columns)
+        high = max(column[2] for column in columns)
+        scale_y = self._axes(x0, x1, low, high, unit)
+        coords = []
+        for column, y_low, y_high in columns:
+            x = self.left + column
+            coords += [x, scale_y(y_low), x, scale_y(y_high)]
+        self._line(coords, "#d9534f")
+
+    def drawLine(self, points, x0, x1, unit=""):
+        """Draw (x, y) points as a line"""
+        if not points:
+            self.drawEmpty()
+            return
+        low = min(point[1] for point in points)
+        high = max(point[1] for point in points)
+        scale_y = self._axes(x0, x1, low, high, unit)
+        span = (x1 - x0) or 1.0
+        width = self.plotWidth()
+        coords = []
+        for x, y in points:
+            coords += [self.left + (x - x0) / span * (width - 1), scale_y(y)]
+        self._line(coords, "#0275d8")
+
+    def drawEmpty(self):
+        self.chartCanvas.delete("all")
+        self.chartCanvas.create_text(self.chartCanvas.winfo_width() // 2, self.chartCanvas.winfo_height() // 2,
+                                     text="No data", fill="gray")
+
+    def _line(self, coords, color):
+        if len(coords) == 2:
+            coords = coords * 2  # A single point still needs two
+        self.chartCanvas.create_line(*coords, fill=color)
+
+    def _axes(self, x0, x1, low, high, unit):
+        """Clear the canvas, draw the axes and return the y scaling function"""
+        canvas = self.chartCanvas
+        canvas.delete("all")
+        height = canvas.winfo_height()
+        bottom = height - self.bottom
+        if high == low:
+            high, low = high + 1, low - 1
+
+        def scale_y(y):
+            return bottom - (y - low) / (high - low) * (bottom - self.top)
+
+        right = self.left + self.plotWidth()
+        canvas.create_line(self.left, self.top, self.left, bottom, right, bottom, fill="gray")
+        canvas.create_text(self.left - 5, self.top, text=f"{high:.4g}{unit}", anchor="ne", fill="gray")
+        canvas.create_text(self.left - 5, bottom, text=f"{low:.4g}{unit}", anchor="se", fill="gray")
+        canvas.create_text(self.left, bottom + 2, text=f"cycle {x0:g}", anchor="nw", fill="gray")
+        canvas.create_text(right, bottom + 2, text=f"cycle {x1:g}", anchor="ne", fill="gray")
+        return scale_y
@@ -0,0 +1,307 @@
+import json
+import os
+import re
+import time
+
+
+class Rule:
+    """Maps a response token or regex to a status
+
+    Args:
+        status (str): Status reported when the rule matches, e.g. "SUCCESS"
+        pattern (str): Literal token, or a regex when regex is True
+        priority (int): Lower values win when several rules match
+        color (str): Row color in the command table ("green", "yellow", "red")
+        regex (bool): Treat pattern as a regular expression with capture groups
+        stop (bool): Stop the run when this rule matches
+        terminal (bool): A match marks the response as complete
+    """
+
+    def __init__(self, status, pattern, priority=0, color="yellow", regex=False, stop=False, terminal=True):
+        self.status = status
+        self.pattern = pattern
+        self.priority = priority
+        self.color = color
+        self.regex = regex
+        self.stop = stop
+        self.terminal = terminal
+
+
+class Classification:
+    """Result of classifying one response"""
+
+    def __init__(self, status, color, rule=None, captures=None):
+        self.status = status
+        self.color = color
+        self.rule = rule
+        self.captures = captures or {}
+
+    @property
+    def stop(self):
+        return bool(self.rule and self.rule.stop)
+
+
+def default_rules():
+    """The token rules the executor has always used"""
+    return [
+        Rule("ERROR", "_ERR", priority=0, color="red", stop=True),
+        Rule("SUCCESS", "_RDY", priority=10, color="green"),
+        Rule("SUCCESS", "_REP", priority=10, color="green"),
+    ]
+
+
+def load_rules(path):
+    """Load rules from a JSON list, falling back to the defaults"""
+    if not os.path.exists(path):
+        return default_rules()
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return [Rule(entry["status"], entry["pattern"],
+                 priority=entry.get("priority", 0),
+                 color=entry.get("color", "yellow"),
+                 regex=entry.get("regex", False),
+                 stop=entry.get("stop", False),
+                 terminal=entry.get("terminal", True)) for entry in entries]
+
+
+def _trie_pattern(words):
+    """Build a regex matching any of the literal byte strings
+
+    Alternatives share their common prefixes, so the regex engine does a
+    bounded amount of work per input byte however many literals there are.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for byte in word:
+            node = node.setdefault(byte, {})
+        node[None] = True
+
+    def build(node):
+        branches = [re.escape(bytes([byte])) + build(child)
+                    for byte, child in sorted((k, v) for k, v in node.items() if k is not None)]
+        if not branches:
+            return b""
+        if len(branches) == 1 and None not in node:
+            return branches[0]
+        body = b"(?:" + b"|".join(branches) + b")"
+        return body + b"?" if None in node else body
+
+    return build(trie)
+
+
+def _literal_prefix(pattern):
+    """Bytes every match of a regex starts with, b"" when unsure"""
+    if b"|" in pattern:
+        return b""
+    prefix = bytearray()
+    i = 0
+    while i < len(pattern):
+        char = pattern[i:i + 1]
+        if char == b"\\":
+            escaped = pattern[i + 1:i + 2]
+            if not escaped or escaped.isalnum():
+                break  # A class such as \d, or a backreference
+            literal, i = escaped, i + 2
+        elif char in b".^$*+?{}[]()":
+            break
+        else:
+            literal, i = char, i + 1
+        if pattern[i:i + 1] in (b"*", b"+", b"?", b"{"):
+            break  # The quantifier applies to this byte
+        prefix += literal
+    return bytes(prefix)
+
+
+# Escapes, character classes and capturing group openings of a regex
+_GROUP_TOKENS = re.compile(rb"\\.|\[\^?\]?(?:\\.|[^\]\\])*\]|\((?!\?)|\(\?P<\w+>")
+
+
+def _strip_groups(pattern):
+    """Make the capturing groups of a regex non-capturing"""
+    return _GROUP_TOKENS.sub(lambda token: b"(?:" if token.group(0).startswith(b"(") else token.group(0), pattern)
+
+
+class _RuleSet:
+    """Finds the most important of a set of rules in a response
+
+    Literal rules and the literal prefixes of regex rules are merged into
+    one prefix trie wrapped in a lookahead, so one scan finds the longest
+    entry starting at every position and the shorter entries there are its
+    prefixes; matches may overlap. A regex rule is only tried where its
+    prefix occurs. Regex rules without a literal prefix are combined, in
+    priority order, into one alternation whose branches end in a named
+    empty group telling which rule matched. Rules that cannot be combined
+    (backreferences, inline flags) are searched one by one. Only rules
+    without a literal prefix add to the cost per response, so patterns
+    should start with a literal where they can.
+    """
+
+    def __init__(self, rules):
+        self.prefixes = {}  # literal or regex prefix -> [(rule, regex or None)] by priority
+        unprefixed = []
+        for rule in rules:
+            token = rule.pattern.encode()
+            if not rule.regex:
+                self.prefixes.setdefault(token, []).append((rule, None))
+                continue
+            regex = re.compile(token)
+            prefix = _literal_prefix(token)
+            if prefix:
+                self.prefixes.setdefault(prefix, []).append((rule, regex))
+            else:
+                unprefixed.append((rule, regex))
+        for candidates in self.prefixes.values():
+            candidates.sort(key=lambda item: item[0].priority)
+        self.prefix_scan = (re.compile(b"(?=(" + _trie_pattern(self.prefixes) + b"))")
+                            if self.prefixes else None)
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.prefixes})
+
+        unprefixed.sort(key=lambda item: item[0].priority)
+        branches = []
+        self.branch_rules = {}  # Name of the group ending a branch -> (rule, regex)
+        self.separate = []
+        for rule, regex in unprefixed:
+            name = f"_r{len(branches)}"
+            branch = b"(?:" + _strip_groups(regex.pattern) + b")(?P<" + name.encode() + b">)"
+            try:
+                re.compile(branch)
+            except re.error:
+                self.separate.append((rule, regex))
+                continue
+            branches.append(branch)
+            self.branch_rules[name] = (rule, regex)
+        self.regex_scan = re.compile(b"|".join(branches)) if branches else None
+        self.regex_priority = min((rule.priority for rule, _ in unprefixed), default=0)
+        self.best_priority = min((rule.priority for rule in rules), default=0)
+
+    def search(self, response, first=False):
+        """(rule, position, match) of the most important rule, or of the first found
+
+        match is None for literal rules; (None, None, None) when no rule matches.
+        """
+        best, best_position, best_match = None, None, None
+        if self.prefix_scan is not None:
+            for found in self.prefix_scan.finditer(response):
+                position, longest = found.start(), found.group(1)
+                for length in self.prefix_lengths:
+                    if length > len(longest):
+                        break
+                    for rule, regex in self.prefixes.get(longest[:length], ()):
+                        if best is not None and rule.priority >= best.priority:
+                            break
+                        match = regex.match(response, position) if regex is not None else None
+                        if regex is None or match is not None:
+                            best, best_position, best_match = rule, position, match
+                            break
+                if best is not None and first:
+                    return best, best_position, best_match
+                if best is not None and best.priority <= self.best_priority:
+                    break  # Only a combined regex matching earlier can still win
+
+        position = 0
+        while self.regex_scan is not None and position <= len(response):
+            if best is not None and (self.regex_priority > best.priority or
+                                     self.regex_priority == best.priority and position >= best_position):
+                break
+            found = self.regex_scan.search(response, position)
+            if found is None:
+                break
+            rule, regex = self.branch_rules[found.lastgroup]
+            start = found.start()
+            if (best is None or rule.priority < best.priority
+                    or rule.priority == best.priority and start < best_position):
+                best, best_position, best_match = rule, start, regex.match(response, start)
+                if first:
+                    return best, best_position, best_match
+            position = start + 1
+
+        for rule, regex in self.separate:
+            if best is not None and (first or rule.priority > best.priority):
+                break
+            match = regex.search(response)
+            if match is not None and (best is None or rule.priority < best.priority or match.start() < best_position):
+                best, best_position, best_match = rule, match.start(), match
+        return best, best_position, best_match
+
+
+class ResponseClassifier:
+    """Classifies raw response bytes with precompiled patterns
+
+    All rules are matched by one _RuleSet, so the cost per response stays
+    roughly flat as rules are added. The matching rule with the lowest
+    priority value wins; on equal priority the earlier match in the
+    response wins.
+    """
+
+    def __init__(self, rules=None, fallback_status="UNKNOWN", fallback_color="yellow"):
+        self.rules = rules if rules is not None else default_rules()
+        self.fallback_status = fallback_status
+        self.fallback_color = fallback_color
+        # Statuses of rules shown green count as passing (latency baselines learn only from those)
+        self.pass_statuses = frozenset(rule.status for rule in self.rules if rule.color == "green")
+        self.fail_statuses = frozenset(rule.status for rule in self.rules if rule.color == "red")
+        self.matcher = _RuleSet(self.rules)
+        self.terminal = _RuleSet([rule for rule in self.rules if rule.terminal])
+
+    def is_complete(self, response):
+        """Return True once the response contains a terminal token"""
+        return self.terminal.search(response, first=True)[0] is not None
+
+    def classify(self, response):
+        """Classify raw response bytes"""
+        best, _, match = self.matcher.search(response)
+        if best is None:
+            return Classification(self.fallback_status, self.fallback_color)
+        return Classification(best.status, best.color, best, self._captures(match))
+
+    def _captures(self, match):
+        """Collect the capture groups of a regex rule as decoded strings
+
+        Named groups are keyed by name, unnamed ones by position (from 1).
+        """
+        if match is None:
+            return {}
+        names = {index: name for name, index in match.re.groupindex.items()}
+        captures = {}
+        for position in range(1, match.re.groups + 1):
+            value = match.group(position)
+            if value is not None:
+                value = value.decode("utf-8", errors="replace")
+            captures[names.get(position, position)] = value
+        return captures
+
+
+def benchmark(rule_counts=(1, 10, 100, 1000), iterations=20000):
+    """Time classification as the number of rules grows
+
+    Half of the added rules are literals, half regexes with captures. Each
+    count is timed on a response that matches a default rule and on one
+    that matches nothing. Returns (rule count, microseconds per matching
+    response, microseconds per unmatched response); the cost should stay
+    roughly flat.
+    """
+    matching = b"MOVE_ABS X=120.5 Y=-33.0 POS=10234 TEMP=41.2 MOVE_ABS_RDY\r\n"
+    unmatched = b"MOVE_ABS X=120.5 Y=-33.0 POS=10234 TEMP=41.2 MOVE_ABS_BUSY\r\n"
+    results = []
+    for count in rule_counts:
+        rules = default_rules()
+        for i in range(count):
+            if i % 2:
+                rules.append(Rule("FAULT", rf"AXIS{i:04d} FAULT=(?P<code>\d+)", priority=5, regex=True))
+            else:
+                rules.append(Rule("SUCCESS", f"CMD{i:04d}_OK", priority=20))
+        classifier = ResponseClassifier(rules)
+        timings = []
+        for response in (matching, unmatched):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                classifier.classify(response)
+            timings.append((time.perf_counter() - start) / iterations * 1e6)
+        results.append((len(rules), *timings))
+    return results
+
+
+if __name__ == "__main__":
+    for count, matched, unmatched in benchmark():
+        print(f"{count:5d} rules: {matched:.2f} us per matching response, {unmatched:.2f} us per unmatched one")
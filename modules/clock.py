@@ -0,0 +1,75 @@
+import heapq
+import threading
+import time
+
+
+class SystemClock:
+    """Real time, the default clock of the engine"""
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def perf_counter(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout):
+        """Wait for event or timeout; returns True if the event is set"""
+        return event.wait(timeout)
+
+    def wake_at(self, when):
+        """Hint that something happens at monotonic time when (ignored in real time)"""
+
+
+class VirtualClock:
+    """Simulated time that only moves when someone sleeps or waits on it
+
+    A sleep or wait advances time instantly, but never past the earliest
+    wake_at() hint, so a simulated device's response becomes visible at
+    exactly its scheduled moment. A multi-day run against a simulator
+    completes as fast as the engine can execute its steps.
+    """
+
+    def __init__(self, start=None):
+        self.epoch = time.time() if start is None else start
+        self.now = 0.0
+        self.wakeups = []
+        self.lock = threading.Lock()
+
+    def time(self):
+        return self.epoch + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def wait(self, event, timeout):
+        if event.is_set():
+            return True
+        self.advance(timeout)
+        return event.is_set()
+
+    def wake_at(self, when):
+        with self.lock:
+            if when > self.now:
+                heapq.heappush(self.wakeups, when)
+
+    def advance(self, seconds):
+        """Move time forward by seconds, stopping early at a wake_at() hint"""
+        with self.lock:
+            target = self.now + max(0.0, seconds)
+            while self.wakeups and self.wakeups[0] <= self.now:
+                heapq.heappop(self.wakeups)
+            if self.wakeups and self.wakeups[0] < target:
+                target = heapq.heappop(self.wakeups)
+            self.now = target
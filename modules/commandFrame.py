@@ -14,6 +14,7 @@ class CommandControlFrame(ttk.LabelFrame):
         self.add_icon = self._load_icon(os.path.join(icon_path, "add.png"))
         self.delete_icon = self._load_icon(os.path.join(icon_path, "delete.png"))
         self.update_icon = self._load_icon(os.path.join(icon_path, "update.png"))
+        self.inject_icon = self._load_icon(os.path.join(icon_path, "play.png"))
         
         # Top container for entries
         self.topContainer = ttk.Frame(self)
@@ -35,6 +36,14 @@ class CommandControlFrame(ttk.LabelFrame):
         self.cycleEntry = ttk.Entry(self.topContainer, textvariable=self.cycleVar, width=10)
         self.cycleEntry.pack(side=LEFT)
         
+        # Telemetry polls, e.g. "TEMP?:5, POS?:1" (command:seconds)
+        self.pollLabel = ttk.Label(self.topContainer, text="Telemetry:")
+        self.pollLabel.pack(side=LEFT, padx=(10, 5))
+        
+        self.pollVar = tk.StringVar()
+        self.pollEntry = ttk.Entry(self.topContainer, textvariable=self.pollVar, width=30)
+        self.pollEntry.pack(side=LEFT)
+        
         # Command table frame
         self.tableFrame = ttk.Frame(self)
         self.tableFrame.pack(fill=BOTH, expand=YES, padx=5, pady=5)
@@ -83,6 +92,11 @@ class CommandControlFrame(ttk.LabelFrame):
         self.updateBtn = ttk.Button(self.btnFrame, text="Update", image=self.update_icon, compound=TOP, command=self.updateCommand)
         self.updateBtn.pack(side=LEFT, padx=5)
         
+        # Sends the entered command between steps of a running cycle
+        self.injectBtn = ttk.Button(self.btnFrame, text="Inject", image=self.inject_icon, compound=TOP,
+                                    state="disabled")
+        self.injectBtn.pack(side=LEFT, padx=5)
+        
         # Control panel
         self.controlFrame = ttk.Frame(self)
         self.controlFrame.pack(fill=X, padx=5, pady=5)
@@ -107,6 +121,22 @@ class CommandControlFrame(ttk.LabelFrame):
         self.cycleProgress = ttk.Label(self.cycleProgressFrame, textvariable=self.cycleProgressVar)
         self.cycleProgress.pack(side=LEFT, padx=5)
         
+        # Profiling of the next run
+        self.profileFrame = ttk.Frame(self.controlFrame)
+        self.profileFrame.pack(side=LEFT, padx=20)
+        
+        self.profileLabel = ttk.Label(self.profileFrame, text="PROFILE:")
+        self.profileLabel.pack(side=LEFT)
+        
+        self.profileVar = tk.StringVar(value="off")
+        self.profileCombo = ttk.Combobox(self.profileFrame, textvariable=self.profileVar,
+                                         values=["off", "sample", "cprofile"], state="readonly", width=9)
+        self.profileCombo.pack(side=LEFT, padx=5)
+        
+        self.memoryProfileVar = tk.BooleanVar(value=False)
+        self.memoryProfileCheck = ttk.Checkbutton(self.profileFrame, text="Memory", variable=self.memoryProfileVar)
+        self.memoryProfileCheck.pack(side=LEFT)
+        
         # Elapsed time
         self.timeFrame = ttk.Frame(self.controlFrame)
         self.timeFrame.pack(side=RIGHT, padx=5)
@@ -0,0 +1,419 @@
+import collections
+import csv
+import json
+import queue
+import threading
+
+from modules.classifier import ResponseClassifier
+from modules.clock import SystemClock
+from modules.engine import CommandEngine, EngineListener
+from modules.linkTest import open_link
+from modules.report import RunStatistics, Welford
+from modules.runStorage import RunDirectory, atomic_path, new_run_id
+
+# A coordinated script drives several robots as one test:
+#
+#     {"robots": {"A": "COM3", "B": "COM4"},
+#      "cycles": 10,
+#      "steps": [
+#          {"robot": "A", "command": "MOVE 0"},
+#          {"robot": "B", "command": "MOVE 0"},
+#          {"barrier": "homed"},
+#          {"id": "a_pick", "robot": "A", "command": "MOVE 1"},
+#          {"robot": "B", "command": "MOVE 2", "after": ["a_pick"]},
+#          {"barrier": "placed", "robots": ["A", "B"]}]}
+#
+# Each robot runs its own steps in order. "after" makes a step wait for steps
+# of other robots, and a barrier holds the listed robots (default: all) until
+# every one of them has reached it. Steps that do not depend on each other run
+# in parallel.
+
+
+class Node:
+    """A step or a barrier in the dependency graph"""
+
+    def __init__(self, key, robot=None, command=None, index=0, robots=None):
+        self.key = key
+        self.robot = robot  # None for a barrier
+        self.command = command
+        self.index = index  # Step number within the robot's own sequence
+        self.robots = robots or []  # Barrier participants
+        self.arrivals = {}  # Barrier: robot -> node it waits on (None: cycle start)
+        self.previous = None  # Step: the same robot's preceding node
+        self.after = []
+        self.deps = set()
+        self.dependents = []
+
+    @property
+    def is_barrier(self):
+        return self.robot is None
+
+    def requires(self, node):
+        if node is not None and node is not self and node not in self.deps:
+            self.deps.add(node)
+            node.dependents.append(self)
+
+
+class CoordinatedScript:
+    """Robots, cycles and the dependency graph of a coordinated script"""
+
+    def __init__(self, robots, nodes, cycles=1):
+        self.robots = robots  # name -> port
+        self.nodes = nodes
+        self.cycles = cycles
+
+    def step_count(self):
+        return sum(1 for node in self.nodes if not node.is_barrier)
+
+
+def parse_script(data):
+    """Build a CoordinatedScript from its JSON form, raising ValueError on mistakes"""
+    robots = dict(data.get("robots") or {})
+    if not robots:
+        raise ValueError("script has no robots")
+    nodes, by_key = [], {}
+    last = dict.fromkeys(robots)
+    counts = collections.Counter()
+
+    for position, entry in enumerate(data.get("steps") or [], 1):
+        if "barrier" in entry:
+            names = entry.get("robots") or list(robots)
+            for name in names:
+                if name not in robots:
+                    raise ValueError(f"barrier {entry['barrier']!r}: unknown robot {name!r}")
+            node = Node(entry["barrier"], robots=names)
+            for name in names:
+                node.arrivals[name] = last[name]
+                node.requires(last[name])
+                last[name] = node
+        else:
+            name = entry.get("robot")
+            if name not in robots:
+                raise ValueError(f"step {position}: unknown robot {name!r}")
+            if not entry.get("command"):
+                raise ValueError(f"step {position}: no command")
+            counts[name] += 1
+            node = Node(entry.get("id") or f"{name}.{counts[name]}", name, entry["command"], counts[name])
+            node.after = list(entry.get("after") or [])
+            node.previous = last[name]
+            node.requires(last[name])
+            last[name] = node
+        if node.key in by_key:
+            raise ValueError(f"duplicate step id {node.key!r}")
+        by_key[node.key] = node
+        nodes.append(node)
+
+    for node in nodes:
+        for key in node.after:
+            if key not in by_key:
+                raise ValueError(f"step {node.key!r} waits for unknown step {key!r}")
+            node.requires(by_key[key])
+
+    # Every node must become ready at some point (no dependency cycles)
+    remaining = {node: len(node.deps) for node in nodes}
+    ready = [node for node in nodes if not node.deps]
+    seen = 0
+    while ready:
+        node = ready.pop()
+        seen += 1
+        for dependent in node.dependents:
+            remaining[dependent] -= 1
+            if not remaining[dependent]:
+                ready.append(dependent)
+    if seen != len(nodes):
+        stuck = [node.key for node in nodes if remaining[node]]
+        raise ValueError(f"dependency cycle between: {', '.join(stuck)}")
+
+    return CoordinatedScript(robots, nodes, int(data.get("cycles", 1)))
+
+
+def load_script(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_script(json.load(f))
+
+
+class WaitStatistics:
+    """How long each robot waited at each barrier or dependency, and who it waited for"""
+
+    def __init__(self):
+        self.waits = collections.defaultdict(Welford)  # (point, robot) -> wait seconds
+        self.holders = collections.defaultdict(collections.Counter)  # point -> robot -> times it was last
+        self.rows = []  # (cycle, point, robot, wait, holder)
+
+    def add(self, cycle, point, robot, wait, holder):
+        self.waits[point, robot].add(wait)
+        self.rows.append((cycle, point, robot, wait, holder))
+
+    def held(self, point, robot):
+        self.holders[point][robot] += 1
+
+    def describe(self):
+        """One line per barrier or dependency, slowest first"""
+        lines = []
+        points = sorted(self.holders, key=lambda point: -sum(
+            self.waits[key].mean * self.waits[key].count for key in self.waits if key[0] == point))
+        for point in points:
+            holder, count = self.holders[point].most_common(1)[0]
+            waits = ", ".join(f"{robot} {stats.mean:.3f}/{stats.max:.3f} s"
+                              for (name, robot), stats in sorted(self.waits.items()) if name == point)
+            total = sum(self.holders[point].values())
+            lines.append(f"{point}: held up by {holder} in {count}/{total}; mean/max wait {waits}")
+        return lines
+
+    def save_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Cycle", "Point", "Robot", "Wait (s)", "Waited for"])
+            for cycle, point, robot, wait, holder in self.rows:
+                writer.writerow([cycle, point, robot, f"{wait:.6f}", holder])
+
+
+class RobotListener(EngineListener):
+    """Forwards one robot's messages and results to the coordinated run's listener"""
+
+    def __init__(self, listener, name):
+        self.listener = listener
+        self.name = name
+
+    def on_message(self, text, direction):
+        self.listener.on_message(f"[{self.name}] {text}", direction)
+
+    def on_step(self, key, status, color, response=None):
+        self.listener.on_step(key, status, color, response)
+
+    def on_result(self, cycle, step, command, status, response, timestamp, latency):
+        self.listener.on_result(cycle, step, command, status, response, timestamp, latency)
+
+
+class CoordinatedRun:
+    """Runs a coordinated script, one engine and worker thread per robot
+
+    A dispatcher keeps the count of unfinished dependencies of every node
+    and hands a step to its robot's worker as soon as that count reaches
+    zero; barriers complete as soon as they are released. Each cycle runs
+    the whole graph. When a step fails, nothing new is dispatched, the
+    steps in flight finish, and the run ends "stopped".
+    """
+
+    def __init__(self, script, results_dir, results_db=None, listener=None, rules=None, baudrate=115200,
+                 clock=None):
+        self.script = script
+        self.results_dir = results_dir
+        self.results_db = results_db
+        self.listener = listener or EngineListener()
+        self.rules = rules
+        self.baudrate = baudrate
+        self.clock = clock or SystemClock()
+        self.run_id = new_run_id()
+        self.engines = {}
+        self.workers = {}
+        self.done = queue.Queue()
+        self.waits = WaitStatistics()
+        self.statistics = RunStatistics(self.run_id, "+".join(script.robots))
+        self.run_dir = None
+        self.should_stop = False
+
+    def run(self):
+        """Run every cycle and return the outcome"""
+        script = self.script
+        self.listener.on_message(f"Coordinated run {self.run_id}: {len(script.robots)} robots, "
+                                 f"{script.step_count()} steps, {script.cycles} cycles", "SYS")
+        if self.results_db:
+            self.results_db.begin_run(self.run_id, self.statistics.port, script.cycles)
+        outcome = "error"
+        try:
+            if self.open_robots():
+                outcome = "completed"
+                for cycle in range(1, script.cycles + 1):
+                    self.listener.on_cycle(cycle, script.cycles)
+                    if self.should_stop or not self.run_cycle(cycle):
+                        outcome = "stopped"
+                        break
+        finally:
+            for worker in self.workers.values():
+                worker.put(None)
+            for name, engine in self.engines.items():
+                engine.close_timeseries()
+                engine.finish_run(outcome)
+                engine.serial_conn.close()
+                if engine.run_stats is not None:
+                    self.statistics.merge(engine.run_stats)
+
+        self.statistics.finish(outcome)
+        if self.results_db:
+            self.results_db.end_run(self.run_id, outcome)
+        self.write_outputs()
+        self.listener.on_run_finished(outcome)
+        return outcome
+
+    def open_robots(self):
+        for name, port in self.script.robots.items():
+            engine = CommandEngine(RobotListener(self.listener, name), results_dir=self.results_dir,
+                                   results_db=self.results_db, clock=self.clock)
+            engine.port = port
+            try:
+                engine.serial_conn = open_link(port, self.baudrate, timeout=1)
+            except Exception as e:
+                self.listener.on_message(f"[{name}] Cannot open {port}: {str(e)}", "ERR")
+                return False
+            # Robots may share a port name (sim:// URLs), so their directories are named after the robot
+            if not engine.begin_run(self.script.cycles, classifier=ResponseClassifier(self.rules),
+                                    run_id=self.run_id, label=name):
+                engine.serial_conn.close()
+                return False
+            self.engines[name] = engine  # Only engines with a run to finish
+            worker = self.workers[name] = queue.Queue()
+            threading.Thread(target=self._work, args=(engine, worker), daemon=True).start()
+        return True
+
+    def _work(self, engine, jobs):
+        """Worker thread of one robot: run its steps as they are dispatched"""
+        while True:
+            node = jobs.get()
+            if node is None:
+                return
+            try:
+                ok = engine.run_step(node.key, node.command, node.index)
+            except Exception as e:
+                engine.message(f"Execution error: {str(e)}", "ERR")
+                ok = False
+            self.done.put((node, ok, self.clock.perf_counter()))
+
+    def run_cycle(self, cycle):
+        """Run the graph once; False if a step failed or the run was stopped"""
+        start = self.clock.perf_counter()
+        for engine in self.engines.values():
+            engine.current_cycle = cycle
+        remaining = {node: len(node.deps) for node in self.script.nodes}
+        finished = {}  # node -> time it completed
+        in_flight = 0
+        ok = True
+
+        def release(node):
+            nonlocal in_flight
+            if node.is_barrier:
+                self.record_barrier(cycle, node, start, finished)
+                complete(node, self.clock.perf_counter())
+            else:
+                self.record_dependency(cycle, node, start, finished)
+                in_flight += 1
+                self.workers[node.robot].put(node)
+
+        def complete(node, when):
+            finished[node] = when
+            for dependent in node.dependents:
+                remaining[dependent] -= 1
+                if not remaining[dependent] and ok and not self.should_stop:
+                    release(dependent)
+
+        for node in self.script.nodes:
+            if not node.deps:
+                release(node)
+        while in_flight:
+            node, step_ok, when = self.done.get()
+            in_flight -= 1
+            ok = ok and step_ok
+            complete(node, when)
+        return ok and not self.should_stop and len(finished) == len(self.script.nodes)
+
+    def record_barrier(self, cycle, node, start, finished):
+        """Log how long each robot waited at a barrier and who arrived last"""
+        arrivals = {robot: finished[dep] if dep is not None else start for robot, dep in node.arrivals.items()}
+        released = max(arrivals.values())
+        holder = max(arrivals, key=arrivals.get)
+        self.waits.held(node.key, holder)
+        for robot, arrived in arrivals.items():
+            self.waits.add(cycle, node.key, robot, released - arrived, holder)
+        waits = ", ".join(f"{robot} {released - arrived:.3f} s" for robot, arrived in arrivals.items())
+        self.listener.on_message(f"Barrier {node.key} released by {holder} (waited: {waits})", "SYS")
+
+    def record_dependency(self, cycle, node, start, finished):
+        """Log how long a step waited on other robots once its own robot was free"""
+        if not node.after:
+            return
+        ready = finished[node.previous] if node.previous is not None else start
+        holder = max(node.deps, key=lambda dep: finished[dep])
+        wait = max(0.0, finished[holder] - ready)
+        point = f"{node.key} after {', '.join(node.after)}"
+        holder_name = holder.robot or holder.key
+        self.waits.held(point, holder_name)
+        self.waits.add(cycle, point, node.robot, wait, holder_name)
+        if wait > 0:
+            self.listener.on_message(f"[{node.robot}] {node.key} waited {wait:.3f} s for {holder.key}", "SYS")
+
+    def stop(self):
+        """Stop every robot (sends HALT)"""
+        self.should_stop = True
+        for engine in list(self.engines.values()):
+            engine.stop()
+
+    def write_outputs(self):
+        try:
+            self.run_dir = RunDirectory(self.results_dir, self.run_id, "coordinated")
+            with atomic_path(self.run_dir.file("report.html")) as temp:
+                self.statistics.write_html(temp)
+            with atomic_path(self.run_dir.file("waits.csv")) as temp:
+                self.waits.save_csv(temp)
+            self.listener.on_message(f"Report and wait times saved to {self.run_dir.path}", "SYS")
+        except Exception as e:
+            self.listener.on_message(f"Report error: {str(e)}", "ERR")
+
+
+def main():
+    """Run a coordinated multi-robot script"""
+    import argparse
+    import tempfile
+
+    from modules.classifier import load_rules
+    from modules.engine import PrintListener
+    from modules.resultsDb import ResultsDatabase
+
+    parser = argparse.ArgumentParser(description="Run a script that coordinates several robots")
+    parser.add_argument("script", help="Coordinated script (JSON)")
+    parser.add_argument("--robot", action="append", default=[], metavar="NAME=PORT",
+                        help="Override a robot's port, e.g. A=sim://a")
+    parser.add_argument("--cycles", type=int, help="Override the script's cycle count")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--rules", help="Classifier rules file")
+    parser.add_argument("--db", help="Results database (default: none)")
+    parser.add_argument("--results-dir", help="Where runs are stored (default: a temporary directory)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        script = load_script(args.script)
+    except ValueError as e:
+        parser.error(str(e))
+    for override in args.robot:
+        name, _, port = override.partition("=")
+        if name not in script.robots:
+            parser.error(f"unknown robot: {name}")
+        script.robots[name] = port
+    if args.cycles:
+        script.cycles = args.cycles
+
+    db = None
+    if args.db:
+        db = ResultsDatabase(args.db)
+        db.start()
+    run = CoordinatedRun(script, args.results_dir or tempfile.mkdtemp(prefix="coordinated_"), db,
+                         PrintListener() if args.verbose else EngineListener(),
+                         rules=load_rules(args.rules) if args.rules else None, baudrate=args.baud)
+    try:
+        outcome = run.run()
+    except KeyboardInterrupt:
+        run.stop()
+        raise
+    finally:
+        if db:
+            db.close()
+
+    print(f"Run {run.run_id} {outcome}: {run.statistics.describe()}")
+    for line in run.waits.describe():
+        print(line)
+    if run.run_dir:
+        print(f"Outputs in {run.run_dir.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,589 @@
+import datetime
+import itertools
+import queue
+import threading
+
+from modules.clock import SystemClock
+from modules.report import RunStatistics, ENGINE_FAIL_STATUSES
+from modules.baseline import AnomalyDetector, load_baselines, save_baselines
+from modules.excelExport import ExcelExporter
+from modules.runStorage import RunDirectory, atomic_path, new_run_id
+from modules.capture import TX, RX
+from modules.classifier import ResponseClassifier
+from modules.timeseries import TimeSeriesStore, default_extractors
+from modules.telemetry import TelemetryPoller
+
+
+class EngineListener:
+    """Receives progress from a CommandEngine; every method is optional
+
+    The GUI forwards these to its frames, headless tools ignore them or
+    print them.
+    """
+
+    def on_message(self, text, direction):
+        pass
+
+    def on_cycle(self, cycle, cycles):
+        pass
+
+    def on_step(self, key, status, color, response=None):
+        pass
+
+    def on_result(self, cycle, step, command, status, response, timestamp, latency):
+        pass
+
+    def on_value(self, cycle, command, field, value):
+        """A number parsed from a response or read by a telemetry poll"""
+        pass
+
+    def on_run_finished(self, outcome):
+        pass
+
+
+class PrintListener(EngineListener):
+    """Prints monitor messages to stdout"""
+
+    def on_message(self, text, direction):
+        print(f"{direction}: {text}")
+
+
+class CommandEngine:
+    """Executes a command script against a serial-like connection
+
+    Holds everything a run needs (classifier, telemetry, results
+    database, statistics, Excel export, capture) but no UI, so it can be
+    driven by the GUI, a replayed capture or a command line tool. The
+    connection only needs write/read/in_waiting/flush and, optionally,
+    reset_output_buffer and cancel_read/cancel_write.
+
+    All timing goes through clock, so a VirtualClock and a simulated
+    device run timeouts and multi-day scripts in seconds.
+    """
+
+    def __init__(self, listener=None, results_dir="results", results_db=None, clock=None):
+        self.listener = listener or EngineListener()
+        self.clock = clock or SystemClock()
+        self.results_dir = results_dir
+        self.results_db = results_db
+        self.serial_conn = None
+        self.port = None
+        self.capture = None  # CaptureWriter of the connection, if any
+        self.metrics = None  # EngineMetrics served to dashboards, if any
+        self.profiler = None  # RunProfiler for the next runs, if any
+        self.detect_anomalies = True  # Compare latencies with the baselines in the results database
+        self.anomalies = None  # AnomalyDetector of the current run
+
+        # Execution state
+        self.is_running = False
+        self.should_stop = False
+        self.stop_event = threading.Event()  # Wakes the executor as soon as a stop is requested
+        self.write_lock = threading.Lock()  # Serialises writes from the executor and the stop path
+        self.flush_before_halt = True  # Discard queued output so HALT goes out first
+        self.last_stop_latency = None  # Seconds from stop request to HALT on the wire
+        self.command_queue = queue.PriorityQueue()  # Injected (priority, seq, command) entries
+        self.command_seq = itertools.count()  # Keeps equal priorities in FIFO order
+        self.response_timeout = 30
+        self.blocking_reads = True  # Block in the driver instead of polling real ports
+        self.read_slice = 0.2  # Longest blocking read, so a missed cancel_read() costs at most this
+        self.poll_interval = 0.1  # Polling period of connections that cannot block
+        self.late_reply_until = None  # A command timed out; until then its reply may still arrive
+        self.current_cycle = 0
+        self.current_step = 0
+        self.total_cycles = 0
+
+        # Per-run outputs
+        self.run_id = None
+        self.joined_run = False
+        self.run_dir = None
+        self.results_file = None
+        self.exporter = None
+        self.max_file_rows = 500000  # Start a new results file after this many rows
+        self.max_file_bytes = 100 * 1024 * 1024  # ... or this much estimated sheet data
+        self.run_stats = None
+        self.telemetry = None
+        self.timeseries = None
+        self.classifier = ResponseClassifier()
+
+    def message(self, text, direction="SYS"):
+        self.listener.on_message(text, direction)
+
+    def begin_run(self, cycles, polls=None, extractors=None, classifier=None, run_id=None, label=None):
+        """Create the run directory and outputs; returns False if that fails
+
+        Passing run_id joins a run registered by someone else (a sharded
+        run), so the results database entry is left to them; label then
+        names this engine's directory in place of the port. Refused while
+        the previous run's executor has not finished.
+        """
+        if self.is_running:
+            self.message("The previous run is still finishing", "ERR")
+            return False
+        self.joined_run = run_id is not None
+        self.run_id = run_id or new_run_id()
+        try:
+            self.run_dir = RunDirectory(self.results_dir, self.run_id, label or self.port)
+        except OSError as e:
+            self.message(f"Cannot create run directory: {str(e)}", "ERR")
+            return False
+        self.message(f"Run {self.run_id} saving to {self.run_dir.path}")
+
+        self.telemetry = (TelemetryPoller(polls, clock=self.clock.monotonic,
+                                          spill_path=self.run_dir.file("telemetry.spill"))
+                          if polls else None)
+        self.classifier = classifier or ResponseClassifier()
+        self.timeseries = TimeSeriesStore(self.run_dir.file("timeseries"),
+                                          default_extractors() if extractors is None else extractors,
+                                          clock=self.clock.time)
+
+        self.is_running = True
+        self.should_stop = False
+        self.stop_event.clear()
+        self.clear_injected_commands()
+        self.current_cycle = 0
+        self.current_step = 0
+        self.total_cycles = cycles
+
+        # Register the run in the results database
+        if self.results_db and not self.joined_run:
+            self.results_db.begin_run(self.run_id, self.port, cycles, started=self.clock.time())
+        self.run_stats = RunStatistics(self.run_id, self.port, clock=self.clock.time,
+                                       pass_statuses=self.classifier.pass_statuses,
+                                       fail_statuses=self.classifier.fail_statuses | set(ENGINE_FAIL_STATUSES))
+        self.load_baselines()
+        self.results_file = self.run_dir.file("results.xlsx")
+        self.exporter = ExcelExporter(self.results_file, max_file_rows=self.max_file_rows,
+                                      max_file_bytes=self.max_file_bytes)
+        return True
+
+    def stop(self):
+        """Stop the run, sending HALT if the connection is open
+
+        The run is over once finish_run() has called on_run_finished();
+        only that clears is_running.
+        """
+        if self.serial_conn is not None and getattr(self.serial_conn, "is_open", True):
+            try:
+                self.last_stop_latency = self.emergency_stop()
+                self.message(f"Sending: HALT ({self.last_stop_latency * 1000:.2f} ms after stop request)", "TX")
+            except Exception as e:
+                self.message(f"HALT error: {str(e)}", "ERR")
+        else:
+            self.should_stop = True
+            self.stop_event.set()
+
+    def emergency_stop(self):
+        """Put HALT on the wire ahead of anything the executor is doing
+
+        Returns the time in seconds between the stop request and HALT being
+        flushed to the port.
+        """
+        start = self.clock.perf_counter()
+
+        # Cancel first so a blocked read or poll in the executor returns now
+        self.should_stop = True
+        self.stop_event.set()
+        if hasattr(self.serial_conn, "cancel_read"):
+            self.serial_conn.cancel_read()
+
+        # Preempt a write in progress instead of waiting for it to drain
+        if not self.write_lock.acquire(blocking=False):
+            if hasattr(self.serial_conn, "cancel_write"):
+                self.serial_conn.cancel_write()
+            self.write_lock.acquire()
+
+        try:
+            if self.flush_before_halt and hasattr(self.serial_conn, "reset_output_buffer"):
+                self.serial_conn.reset_output_buffer()
+            self.serial_conn.write(b"HALT\n")
+            self.serial_conn.flush()
+            self.capture_chunk(TX, b"HALT\n")
+        finally:
+            self.write_lock.release()
+
+        return self.clock.perf_counter() - start
+
+    def capture_chunk(self, direction, data):
+        """Record a TX/RX chunk with the current cycle and step"""
+        capture = self.capture
+        if capture:
+            capture.record(direction, data, self.current_cycle, self.current_step)
+        metrics = self.metrics
+        if metrics:
+            metrics.transferred(self.port, "tx" if direction == TX else "rx", len(data))
+
+    def write_serial(self, data):
+        """Write to the port unless a stop is in progress"""
+        with self.write_lock:
+            if self.stop_event.is_set():
+                return False
+            if self.late_reply_until is not None:
+                self.discard_late_input()
+            self.serial_conn.write(data)
+            self.capture_chunk(TX, data)
+            if self.metrics:
+                self.metrics.command_sent(self.port)
+            return True
+
+    def expect_late_reply(self):
+        """A poll or injected command timed out; watch for its reply for another response_timeout"""
+        self.late_reply_until = self.clock.monotonic() + self.response_timeout
+
+    def discard_late_input(self):
+        """Drop what arrived after a timeout so the next command does not take it as its reply"""
+        waiting = self.serial_conn.in_waiting
+        if waiting:
+            self.late_reply_until = None
+            data = self.serial_conn.read(waiting)
+            self.capture_chunk(RX, data)
+            self.message(f"Discarded late reply: {data.decode('utf-8', errors='replace').strip()}", "ERR")
+        elif self.clock.monotonic() >= self.late_reply_until:
+            self.late_reply_until = None  # Never came
+
+    def execute(self, commands, cycles):
+        """Execute (key, command) pairs for the specified number of cycles
+
+        cycles may also be an iterable of cycle numbers, pulled one at a
+        time, e.g. from a shard scheduler. Returns the outcome:
+        "completed", "stopped" or "error".
+        """
+        if isinstance(cycles, int):
+            cycle_numbers = range(1, cycles + 1)
+        else:
+            cycle_numbers, cycles = cycles, self.total_cycles
+        self.start_profiler()
+        try:
+            for cycle in cycle_numbers:
+                if self.should_stop:
+                    break
+
+                self.current_cycle = cycle
+                self.listener.on_cycle(cycle, cycles)
+                if self.capture:
+                    self.capture.flush()  # Readers of a live capture see every finished cycle
+                if self.metrics:
+                    self.metrics.cycle.set(cycle, port=self.port)
+
+                for i, (key, command) in enumerate(commands):
+                    if self.should_stop:
+                        break
+                    self.current_step = i + 1
+
+                    # Injected commands and due telemetry polls run at the boundary between scripted steps
+                    self.run_injected_commands()
+                    self.run_due_polls()
+                    if self.should_stop:
+                        break
+
+                    if not self.run_step(key, command, i + 1):
+                        break
+
+            # Run anything injected during the last step
+            if not self.should_stop:
+                self.run_injected_commands()
+
+            if self.telemetry and self.telemetry.buffer.count:
+                self.save_telemetry()
+            self.close_timeseries()
+
+            if not self.should_stop:
+                self.message("All commands executed successfully")
+            outcome = "stopped" if self.should_stop else "completed"
+        except Exception as e:
+            self.message(f"Execution error: {str(e)}", "ERR")
+            outcome = "error"
+
+        try:
+            self.finish_run(outcome)
+        except Exception as e:
+            self.message(f"Finish error: {str(e)}", "ERR")
+        return outcome
+
+    def run_step(self, key, command, step):
+        """Send one command, wait for and classify its response
+
+        Returns False when the run must stop (timeout, HALT, a stop rule or
+        a stop request).
+        """
+        self.listener.on_step(key, "WAITING", "yellow")
+
+        # Send command
+        step_start = self.clock.perf_counter()
+        if not self.write_serial(f"{command}\n".encode()):
+            return False
+        self.message(f"Sending: {command}", "TX")
+
+        # Wait for response with timeout
+        response = self.wait_for_response(self.response_timeout)
+        latency = self.clock.perf_counter() - step_start
+
+        if response == "TIMEOUT":
+            self.listener.on_step(key, "TIMEOUT", "red", "No response received (timeout)")
+            self.log_result(command, "TIMEOUT", "No response received (timeout)", step=step)
+            self.should_stop = True
+            return False
+        elif response == "HALT":
+            # Stop execution if "HALT" command received
+            self.listener.on_step(key, "HALT", "red", "STOP execution")
+            self.should_stop = True
+            return False
+
+        # Process response
+        response_str = response.decode('utf-8', errors='replace').strip()
+        self.message(f"Received: {response_str}", "RX")
+        for field, value in self.timeseries.record(command, response_str):
+            self.listener.on_value(self.current_cycle, command, field, value)
+
+        # Check for specific responses
+        result = self.classifier.classify(response)
+        self.listener.on_step(key, result.status, result.color, response_str)
+        self.log_result(command, result.status, response_str, step=step, latency=latency, color=result.color)
+        if result.stop:
+            self.should_stop = True
+            return False
+        return True
+
+    def finish_run(self, outcome):
+        """Close the run's outputs and tell the listener
+
+        The run ends even when closing an output fails, so a new one can start.
+        """
+        try:
+            if self.results_db and not self.joined_run:
+                self.results_db.end_run(self.run_id, outcome, finished=self.clock.time())
+            self.run_stats.finish(outcome)
+            self.close_excel_file()
+            if self.capture:
+                self.capture.flush()
+            self.write_report()
+            self.save_baselines()
+            self.save_profile()
+        finally:
+            self.current_cycle = self.current_step = 0  # Later traffic is outside the run
+            self.is_running = False
+            self.listener.on_run_finished(outcome)
+
+    def load_baselines(self):
+        """Set up the run's latency anomaly detector from the stored baselines"""
+        self.anomalies = None
+        if self.results_db and self.detect_anomalies:
+            try:
+                self.anomalies = AnomalyDetector(load_baselines(self.results_db, self.port))
+            except Exception as e:
+                self.message(f"Baseline load error: {str(e)}", "ERR")
+
+    def check_latency(self, command, step, latency):
+        """Report a passing step that is slow or drifting compared to its baseline"""
+        for anomaly in self.anomalies.check(command, latency, cycle=self.current_cycle, step=step):
+            self.message(anomaly.describe(), "WARN")
+            if self.metrics:
+                self.metrics.anomaly(self.port, anomaly.kind)
+
+    def save_baselines(self):
+        """Fold the run's latencies into the stored baselines and save its anomalies"""
+        if not self.anomalies:
+            return
+        try:
+            self.message(self.anomalies.describe())
+            if self.anomalies.records:
+                anomalies_file = self.run_dir.file("anomalies.csv")
+                with atomic_path(anomalies_file) as temp:
+                    self.anomalies.save_csv(temp)
+            save_baselines(self.results_db, self.port, self.anomalies.updated())
+        except Exception as e:
+            self.message(f"Baseline save error: {str(e)}", "ERR")
+
+    def start_profiler(self):
+        """Start profiling on the executor thread if a profiler is set"""
+        if self.profiler:
+            try:
+                self.profiler.start()
+            except Exception as e:
+                self.message(f"Profiler error: {str(e)}", "ERR")
+
+    def save_profile(self):
+        """Stop the profiler and write its files into the run directory"""
+        if self.profiler:
+            try:
+                self.profiler.stop()
+                saved = self.profiler.save(self.run_dir)
+                if saved:
+                    self.message(f"Profile saved to {self.run_dir.path}: {', '.join(sorted(set(saved)))}")
+            except Exception as e:
+                self.message(f"Profiler error: {str(e)}", "ERR")
+
+    def inject_command(self, command, priority=0):
+        """Queue an ad-hoc command for the next step boundary of the running cycle
+
+        Lower priority values run first; equal priorities run in FIFO order.
+        """
+        self.command_queue.put((priority, next(self.command_seq), command))
+
+    def run_injected_commands(self):
+        """Send all queued injected commands without affecting the scripted run
+
+        Errors and timeouts are reported but do not stop the run.
+        """
+        while not self.should_stop:
+            try:
+                priority, seq, command = self.command_queue.get_nowait()
+            except queue.Empty:
+                return
+
+            if not self.write_serial(f"{command}\n".encode()):
+                return
+            self.message(f"Sending: {command}", "INJ")
+
+            response = self.wait_for_response(self.response_timeout)
+            if response == "HALT":
+                return
+            if response == "TIMEOUT":
+                self.message(f"No response to {command} (timeout)", "INJ")
+                self.log_result(f"[INJ] {command}", "TIMEOUT", "No response received (timeout)")
+                self.expect_late_reply()
+                continue
+
+            response_str = response.decode('utf-8', errors='replace').strip()
+            self.message(f"Received: {response_str}", "INJ")
+            result = self.classifier.classify(response)
+            self.log_result(f"[INJ] {command}", result.status, response_str, color=result.color)
+
+    def run_due_polls(self):
+        """Send the telemetry polls that are due and record their values"""
+        if not self.telemetry:
+            return
+        for query in self.telemetry.due_queries():
+            if self.should_stop or not self.write_serial(f"{query.command}\n".encode()):
+                return
+            response = self.wait_for_response(self.response_timeout)
+            if response == "HALT":
+                return
+            if response == "TIMEOUT":
+                self.message(f"No response to poll {query.command} (timeout)", "ERR")
+                self.expect_late_reply()
+                continue
+            response_str = response.decode('utf-8', errors='replace').strip()
+            value = self.telemetry.record(query, response_str)
+            self.listener.on_value(self.current_cycle, query.command, "poll", value)
+            for field, extracted in self.timeseries.record(query.command, response_str):
+                self.listener.on_value(self.current_cycle, query.command, field, extracted)
+            self.message(f"{query.command} = {value}", "POLL")
+
+    def clear_injected_commands(self):
+        """Drop injected commands that did not get a chance to run"""
+        while True:
+            try:
+                self.command_queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def wait_for_response(self, timeout):
+        """Wait for a response from the serial device with timeout
+
+        A real port is read blocking in slices of read_slice seconds, so
+        the executor sleeps in the driver until a byte arrives, the slice
+        ends or emergency_stop() cancels the read. The port timeout is set
+        once per wait and restored afterwards. Connections without
+        cancel_read (simulated, replayed) are polled through the clock.
+        """
+        deadline = self.clock.monotonic() + timeout
+        blocking = self.blocking_reads and hasattr(self.serial_conn, "cancel_read")
+        response = b""
+
+        if blocking:
+            # cancel_read() is not sticky on Windows; a cancel that lands before read() costs one slice
+            saved_timeout = self.serial_conn.timeout
+            self.serial_conn.timeout = min(self.read_slice, timeout)
+        try:
+            while True:
+                if self.stop_event.is_set():
+                    return "HALT"
+                remaining = deadline - self.clock.monotonic()
+                if remaining <= 0:
+                    return "TIMEOUT"
+
+                if self.serial_conn.in_waiting > 0:
+                    new_data = self.serial_conn.read(self.serial_conn.in_waiting)
+                elif blocking:
+                    new_data = self.serial_conn.read(1)
+                    if new_data and self.serial_conn.in_waiting:
+                        new_data += self.serial_conn.read(self.serial_conn.in_waiting)
+                else:
+                    # Small delay to prevent hogging CPU, cut short by a stop request
+                    if self.clock.wait(self.stop_event, min(self.poll_interval, remaining)):
+                        return "HALT"
+                    continue
+
+                if new_data:
+                    self.capture_chunk(RX, new_data)
+                    response += new_data
+                if self.stop_event.is_set():
+                    return "HALT"
+
+                # Check if we have a complete response
+                if new_data and self.classifier.is_complete(response):
+                    return response
+        finally:
+            if blocking:
+                self.serial_conn.timeout = saved_timeout
+
+    def save_telemetry(self):
+        """Save the telemetry samples of the run"""
+        try:
+            telemetry_file = self.run_dir.file("telemetry.csv")
+            buffer = self.telemetry.buffer
+            with atomic_path(telemetry_file) as temp:
+                self.telemetry.save_csv(temp)
+            self.message(f"Saved {buffer.count - buffer.dropped} telemetry samples to {telemetry_file}")
+            if buffer.dropped:
+                reason = f" (spill error: {str(buffer.spill_error)})" if buffer.spill_error else ""
+                self.message(f"{buffer.dropped} oldest telemetry samples were overwritten{reason}", "ERR")
+            buffer.clear()  # Removes the spill files
+        except Exception as e:
+            self.message(f"Telemetry save error: {str(e)}", "ERR")
+
+    def close_timeseries(self):
+        """Flush the parsed numeric values of the run to disk"""
+        try:
+            self.timeseries.close()
+        except Exception as e:
+            self.message(f"Time series save error: {str(e)}", "ERR")
+
+    def write_report(self):
+        """Write the HTML run report (the summary sheet goes into the results workbook)"""
+        try:
+            self.message(f"Run summary: {self.run_stats.describe()}")
+            report_file = self.run_dir.file("report.html")
+            with atomic_path(report_file) as temp:
+                self.run_stats.write_html(temp)
+            self.message(f"Report saved to {report_file}")
+        except Exception as e:
+            self.message(f"Report error: {str(e)}", "ERR")
+
+    def log_result(self, command, status, response, step=None, latency=None, color=None):
+        """Log the command result to the results database and the Excel file"""
+        self.run_stats.record(command, status, latency)
+        if self.anomalies and latency is not None and status in self.classifier.pass_statuses:
+            self.check_latency(command, step, latency)
+        now = self.clock.time()
+        self.listener.on_result(self.current_cycle, step, command, status, response, now, latency)
+        if self.metrics:
+            self.metrics.response(self.port, status, latency)
+        if self.results_db:
+            self.results_db.log(self.run_id, self.port, self.current_cycle, step, command, status, response,
+                                timestamp=now, latency=latency)
+
+        try:
+            timestamp = datetime.datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+            self.exporter.append_result(command, status, response, timestamp,
+                                        cycle=self.current_cycle, step=step, latency=latency, color=color)
+        except Exception as e:
+            self.message(f"Excel logging error: {str(e)}", "ERR")
+
+    def close_excel_file(self):
+        """Add the summary sheet and save the run's Excel file(s)"""
+        try:
+            paths = self.exporter.close(self.run_stats)
+            self.message(f"Saved {self.exporter.rows} results to {', '.join(paths)}")
+        except Exception as e:
+            self.message(f"Excel save error: {str(e)}", "ERR")
@@ -0,0 +1,236 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+
+# Structured log of everything the monitor shows, one JSON object per line:
+#
+#     {"t": 81234567890123, "dir": "TX", "port": "COM3", "cycle": 4, "step": 2, "text": "Sending: MOVE 1"}
+#
+# "t" is time.monotonic_ns(). Each file starts with a "LOG" record holding the
+# wall-clock time of one monotonic reading, so read_events() can add a "wall"
+# time to every event. events.jsonl rotates to events.1.jsonl, events.2.jsonl, ...
+# Each app instance logs to its own directory, results/events/<session ID>/.
+
+
+class EventLogWriter:
+    """Buffered background writer of rotating JSONL files
+
+    write() only puts the record on a queue. The writer thread encodes
+    whatever has queued up, writes it in one call and flushes at most every
+    flush_interval, so the executor and the UI never wait for the disk.
+    If the file cannot be written or reopened, the events are counted in
+    dropped, on_error(text) is told once, and the writer tries again with
+    the next batch.
+    """
+
+    def __init__(self, directory, name="events", max_bytes=16 * 1024 * 1024, backups=10, flush_interval=0.5,
+                 on_error=None):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        self.file = None
+        self.size = 0  # Characters in the current file
+        self.holds_events = False  # Anything besides the header in the current file
+        self.dropped = 0
+        self.on_error = on_error
+        self.failing = False  # Reported the current write failure already
+        self.thread = None
+
+    def path(self, index=0):
+        suffix = f".{index}" if index else ""
+        return os.path.join(self.directory, f"{self.name}{suffix}.jsonl")
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._open()
+        self.thread = threading.Thread(target=self._writer, name="event-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, record):
+        self.queue.put(record)
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _open(self):
+        self.file = open(self.path(), "a", encoding="utf-8")
+        self.size = self.file.tell()
+        self.holds_events = self.size > 0
+        header = {"t": time.monotonic_ns(), "dir": "LOG", "wall": time.time(), "pid": os.getpid()}
+        self._write_lines(json.dumps(header, separators=(",", ":")) + "\n")
+
+    def _write_lines(self, text):
+        self.file.write(text)
+        self.size += len(text)
+
+    def _write_batch(self, lines):
+        """Write encoded lines, rotating before the file would exceed max_bytes"""
+        chunk, size = [], self.size
+        for line in lines:
+            if size + len(line) > self.max_bytes and (chunk or self.holds_events):
+                self._write_lines("".join(chunk))
+                chunk = []
+                self._rotate()
+                size = self.size
+            chunk.append(line)
+            size += len(line)
+            self.holds_events = True
+        self._write_lines("".join(chunk))
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None  # Reopened with the next batch if the rotation fails
+        for index in range(self.backups, 0, -1):
+            source = self.path(index - 1)
+            if os.path.exists(source):
+                os.replace(source, self.path(index))
+        self._open()
+
+    def _writer(self):
+        last_flush = time.monotonic()
+        running = True
+        while running:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = ()
+            lines = []
+            while True:
+                if record is None:
+                    running = False
+                elif record:
+                    lines.append(json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str) + "\n")
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                if self.file is None:
+                    self._open()
+                if lines:
+                    self._write_batch(lines)
+                now = time.monotonic()
+                if not running or now - last_flush >= self.flush_interval:
+                    self.file.flush()
+                    last_flush = now
+                self.failing = False
+            except Exception as e:
+                # Disk full, removed or not writable; keep the writer and the app running
+                self.dropped += len(lines)
+                if not self.failing and self.on_error:
+                    self.on_error(f"Event log error: {str(e)}")
+                self.failing = True
+        if self.file is not None:
+            self.file.close()
+
+
+class EventBus:
+    """Turns monitor and system messages into events for the log and the renderers
+
+    Renderers are called with each event dict on the emitting thread; the
+    text monitor is one of them.
+    """
+
+    def __init__(self, writer=None):
+        self.writer = writer
+        self.renderers = []
+        self.anchor_ns = time.monotonic_ns()
+        self.anchor_wall = time.time()
+
+    def add_renderer(self, renderer):
+        self.renderers.append(renderer)
+
+    def emit(self, text, direction="SYS", port=None, cycle=None, step=None):
+        event = {"t": time.monotonic_ns(), "dir": direction}
+        if port:
+            event["port"] = port
+        if cycle:
+            event["cycle"] = cycle
+            event["step"] = step
+        event["text"] = text
+        if self.writer:
+            self.writer.write(event)
+        for renderer in self.renderers:
+            renderer(event)
+        return event
+
+    def wall_time(self, event):
+        """Wall-clock time of an event from this process, in epoch seconds"""
+        return self.anchor_wall + (event["t"] - self.anchor_ns) / 1e9
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+def log_files(directory, name="events"):
+    """Event files of a directory, oldest first"""
+    def index(path):
+        middle = os.path.basename(path)[len(name):-len(".jsonl")]
+        return int(middle[1:]) if middle else 0
+    return sorted(glob.glob(os.path.join(directory, f"{name}*.jsonl")), key=index, reverse=True)
+
+
+def read_events(directory, name="events"):
+    """Yield every event of a directory in order, with its "wall" time added"""
+    for path in log_files(directory, name):
+        anchor = None
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue  # Last line cut short by a crash
+                if event.get("dir") == "LOG":
+                    anchor = (event["t"], event["wall"])
+                    continue
+                if anchor is not None:
+                    event["wall"] = anchor[1] + (event["t"] - anchor[0]) / 1e9
+                yield event
+
+
+def main():
+    """Query an event log directory"""
+    import argparse
+    import datetime
+
+    parser = argparse.ArgumentParser(description="Filter structured monitor events")
+    parser.add_argument("directory", help="Event log directory, e.g. results/events/<session ID>")
+    parser.add_argument("--dir", action="append", help="Only these directions (TX, RX, SYS, ERR, ...)")
+    parser.add_argument("--port", help="Only this port")
+    parser.add_argument("--cycle", type=int, help="Only this cycle")
+    parser.add_argument("--contains", help="Only events whose text contains this")
+    parser.add_argument("--json", action="store_true", help="Print matching events as JSON lines")
+    args = parser.parse_args()
+
+    directions = {d.upper() for d in args.dir} if args.dir else None
+    for event in read_events(args.directory):
+        if directions and event["dir"] not in directions:
+            continue
+        if args.port and event.get("port") != args.port:
+            continue
+        if args.cycle is not None and event.get("cycle") != args.cycle:
+            continue
+        if args.contains and args.contains not in event.get("text", ""):
+            continue
+        if args.json:
+            print(json.dumps(event, ensure_ascii=False))
+        else:
+            wall = event.get("wall")
+            stamp = datetime.datetime.fromtimestamp(wall).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] if wall else "?"
+            where = f" [{event['port']} {event.get('cycle')}.{event.get('step')}]" if event.get("cycle") else ""
+            print(f"[{stamp}] {event['dir']}{where}: {event.get('text', '')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import json
+import os
+import statistics
+import time
+
+import serial
+import serial.tools.list_ports
+
+# Baud rates tried by a full link test, including the high-speed rates most
+# USB adapters support. Custom rates can be passed to LinkTester.run().
+DEFAULT_BAUD_RATES = [9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600]
+
+# Receive buffer sizes to try (None keeps the driver default). Only drivers
+# that implement set_buffer_size() honour them, other drivers test None only.
+DEFAULT_BUFFER_SIZES = [None, 4096, 65536]
+
+PROFILES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "link_profiles.json")
+
+# Makes serial_for_url() find the broker:// and sim:// handlers in modules/protocol_*.py
+if "modules" not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append("modules")
+
+
+def adapter_id(port):
+    """Return a stable identifier for the USB adapter behind a port"""
+    for info in serial.tools.list_ports.comports():
+        if info.device == port:
+            if info.vid is not None and info.pid is not None:
+                serial_number = info.serial_number or ""
+                return f"{info.vid:04X}:{info.pid:04X}:{serial_number}"
+            return info.hwid or port
+    return port
+
+
+def open_link(port, baudrate, low_latency=False, buffer_size=None, timeout=1):
+    """Open a port or pyserial URL and apply low-latency and buffer settings
+
+    Settings that the platform or driver does not support are skipped, so
+    the same call works for FTDI on Linux, Windows COM ports and loop://.
+    conn.low_latency_applied tells whether low-latency mode is actually on.
+    """
+    conn = serial.serial_for_url(port, baudrate=baudrate, timeout=timeout)
+    conn.low_latency_applied = False
+    if low_latency and hasattr(conn, "set_low_latency_mode"):
+        try:
+            conn.set_low_latency_mode(True)
+            conn.low_latency_applied = True
+        except (ValueError, NotImplementedError):
+            pass
+    if buffer_size and hasattr(conn, "set_buffer_size"):
+        conn.set_buffer_size(rx_size=buffer_size, tx_size=buffer_size)
+    return conn
+
+
+def load_profiles(path=PROFILES_FILE):
+    """Load saved per-adapter link settings"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_profile(adapter, settings, path=PROFILES_FILE):
+    """Store the recommended link settings for one adapter"""
+    profiles = load_profiles(path)
+    profiles[adapter] = settings
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profiles, f, indent=2, sort_keys=True)
+
+
+class LinkTestResult:
+    """Measurements for one baudrate/low-latency/buffer combination"""
+
+    def __init__(self, baudrate, low_latency, buffer_size):
+        self.baudrate = baudrate
+        self.low_latency = low_latency
+        self.buffer_size = buffer_size
+        self.throughput = 0.0  # echoed bytes per second
+        self.latencies = []  # echo round-trip times in seconds
+        self.errors = 0  # corrupted or missing echoes
+        self.error_message = None
+
+    @property
+    def stable(self):
+        return self.error_message is None and self.errors == 0 and bool(self.latencies)
+
+    @property
+    def latency_median(self):
+        return statistics.median(self.latencies) if self.latencies else None
+
+    @property
+    def latency_p95(self):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def settings(self):
+        """Return the settings as a JSON-serialisable dict"""
+        return {
+            "baudrate": self.baudrate,
+            "low_latency": self.low_latency,
+            "buffer_size": self.buffer_size,
+        }
+
+    def describe(self):
+        """Format the result as a single monitor line"""
+        settings = f"{self.baudrate} baud, low_latency={self.low_latency}, buffer={self.buffer_size or 'default'}"
+        if self.error_message:
+            return f"{settings}: failed ({self.error_message})"
+        median = self.latency_median
+        p95 = self.latency_p95
+        return (f"{settings}: {self.throughput:.0f} B/s, "
+                f"RTT median {median * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms, "
+                f"errors {self.errors}")
+
+
+class LinkTester:
+    """Measure throughput and echo latency of a serial link
+
+    The far end must echo every byte back, e.g. a loopback plug (TX wired to
+    RX), a device in echo mode or the pyserial loop:// URL.
+    """
+
+    def __init__(self, port, log=None, payload_size=256, throughput_duration=1.0,
+                 latency_samples=50, timeout=1.0):
+        self.port = port
+        self.log = log or (lambda message: None)
+        self.payload_size = payload_size
+        self.throughput_duration = throughput_duration
+        self.latency_samples = latency_samples
+        self.timeout = timeout
+        self.should_stop = False
+
+    def check_loopback(self, baudrate):
+        """Send one short probe frame and return True if it is echoed back unchanged"""
+        probe = b"LINKTEST PROBE\n"
+        try:
+            conn = open_link(self.port, baudrate, timeout=self.timeout)
+        except (serial.SerialException, ValueError, OSError) as e:
+            self.log(f"Link test: cannot open {self.port}: {str(e)}")
+            return False
+        try:
+            conn.reset_input_buffer()
+            conn.write(probe)
+            return conn.read(len(probe)) == probe
+        except (serial.SerialException, OSError) as e:
+            self.log(f"Link test: probe failed: {str(e)}")
+            return False
+        finally:
+            conn.close()
+
+    def run(self, baud_rates=None, low_latency_modes=(False, True), buffer_sizes=None):
+        """Test every combination of settings and return the results
+
+        Nothing is streamed unless a probe frame comes back as an echo, so a
+        robot controller attached by mistake only ever sees that one line.
+        """
+        results = []
+        baud_rates = baud_rates or DEFAULT_BAUD_RATES
+        if not self.check_loopback(baud_rates[0]):
+            self.log(f"Link test: no echo from {self.port}; attach a loopback plug or an echo device")
+            return results
+        for baudrate in baud_rates:
+            for low_latency in low_latency_modes:
+                for buffer_size in buffer_sizes or DEFAULT_BUFFER_SIZES:
+                    if self.should_stop:
+                        return results
+                    result = self.test_settings(baudrate, low_latency, buffer_size)
+                    if result is None:
+                        continue
+                    results.append(result)
+                    self.log(result.describe())
+        return results
+
+    def test_settings(self, baudrate, low_latency, buffer_size):
+        """Run the throughput and latency tests for one combination
+
+        Returns None when the buffer size or low-latency mode cannot be set
+        on this driver, so identical default-setting runs are not repeated.
+        """
+        result = LinkTestResult(baudrate, low_latency, buffer_size)
+        try:
+            conn = open_link(self.port, baudrate, low_latency, buffer_size, timeout=self.timeout)
+        except (serial.SerialException, ValueError, OSError) as e:
+            result.error_message = str(e)
+            return result
+
+        try:
+            if buffer_size and not hasattr(conn, "set_buffer_size"):
+                return None
+            if low_latency and not conn.low_latency_applied:
+                return None
+            conn.reset_input_buffer()
+            conn.reset_output_buffer()
+            self.measure_throughput(conn, result)
+            self.measure_latency(conn, result)
+        except (serial.SerialException, OSError) as e:
+            result.error_message = str(e)
+        finally:
+            conn.close()
+        return result
+
+    def measure_throughput(self, conn, result):
+        """Stream payloads through the loopback and count echoed bytes/s"""
+        payload = bytes(i % 256 for i in range(self.payload_size))
+        received = 0
+        start = time.perf_counter()
+        deadline = start + self.throughput_duration
+        while time.perf_counter() < deadline and not self.should_stop:
+            conn.write(payload)
+            echo = conn.read(len(payload))
+            received += len(echo)
+            if echo != payload:
+                result.errors += 1
+                conn.reset_input_buffer()
+        elapsed = time.perf_counter() - start
+        result.throughput = received / elapsed if elapsed > 0 else 0.0
+
+    def measure_latency(self, conn, result):
+        """Send short frames one at a time and time each echo"""
+        for i in range(self.latency_samples):
+            if self.should_stop:
+                break
+            frame = f"PING{i:04d}\n".encode()
+            start = time.perf_counter()
+            conn.write(frame)
+            echo = conn.read(len(frame))
+            elapsed = time.perf_counter() - start
+            if echo == frame:
+                result.latencies.append(elapsed)
+            else:
+                result.errors += 1
+                conn.reset_input_buffer()
+
+
+def recommend(results):
+    """Pick the fastest stable settings
+
+    Highest throughput wins; ties within 5% are broken by the lower p95
+    echo latency. Returns None when no combination was stable.
+    """
+    stable = [result for result in results if result.stable]
+    if not stable:
+        return None
+    best_throughput = max(result.throughput for result in stable)
+    contenders = [result for result in stable if result.throughput >= best_throughput * 0.95]
+    return min(contenders, key=lambda result: result.latency_p95)
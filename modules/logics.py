@@ -1,20 +1,42 @@
 import tkinter as tk
+from tkinter import messagebox
 import threading
-import serial
-import time
 import datetime
-import queue
 import os
-import openpyxl
-from openpyxl.styles import PatternFill, Font
 import sys
+import re
 
-class SerialLogic:
-    def __init__(self, serial_frame, command_frame, monitor_frame):
+from modules.engine import CommandEngine, EngineListener
+from modules.scheduler import DeadlineScheduler
+from modules.broker import broker_ports
+from modules.runStorage import new_run_id, safe_port_name
+from modules.capture import CaptureWriter, RX
+from modules.resultsDb import ResultsDatabase
+from modules.classifier import ResponseClassifier, load_rules
+from modules.timeseries import load_extractors
+from modules.telemetry import parse_poll_spec
+from modules.profiling import RunProfiler
+from modules.watchdog import UiWatchdog
+from modules.eventLog import EventBus, EventLogWriter
+from modules.monitorIndex import MonitorIndex
+from modules.chartData import ChartData
+from modules.metrics import EngineMetrics, MetricsServer, load_metrics_config
+from modules.linkTest import LinkTester, adapter_id, open_link, load_profiles, save_profile, recommend
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Handlers that update widgets, timed by the UI watchdog
+UI_HANDLERS = ("scan_ports", "clear_everything", "poll_monitor", "update_elapsed_time", "update_command_status",
+               "update_command_response", "on_message", "on_cycle", "on_step", "apply_filter", "show_search_page",
+               "refresh_chart")
+
+class SerialLogic(EngineListener):
+    def __init__(self, serial_frame, command_frame, monitor_frame, chart_frame=None):
         # Store references to UI frames
         self.serial_frame = serial_frame
         self.command_frame = command_frame
         self.monitor_frame = monitor_frame
+        self.chart_frame = chart_frame
         
         # Serial connection settings
         self.serial_conn = None
@@ -23,30 +45,87 @@ class SerialLogic:
         self.baudrate = None
         self.available_ports = []
         
-        # Command execution settings
-        self.is_running = False
-        self.should_stop = False
-        self.command_queue = queue.Queue()
-        self.current_cycle = 0
-        self.total_cycles = 0
+        # Command execution, done by a headless engine that reports back to this class
         self.start_time = None
-        self.elapsed_time_thread = None
         self.command_thread = None
-
         
-        # Result tracking
-        self.results_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "RESULTS.xlsx")
-        self.setup_excel_file()
+        # Elapsed-time ticks and monitor polling share one deadline scheduler thread
+        self.scheduler = DeadlineScheduler(on_error=self.on_timer_error)
+        self.scheduler.start()
+        self.elapsed_timer = None
+        self.monitor_timer = None
+        self.monitor_interval = 0.1
+        
+        # Link test settings
+        self.link_tester = None
+        
+        # Result tracking, one results/<run_id>_<port>/ directory per run
+        self.results_dir = os.path.join(PROJECT_DIR, "results")
+        
+        # Every monitor message is an event, logged to rotating JSONL files and rendered in the monitor
+        self.events = EventBus(EventLogWriter(os.path.join(self.results_dir, "events", new_run_id()),
+                                              on_error=lambda text: self.emit(text, "ERR")))
+        self.events.add_renderer(self.render_event)
+        
+        # Searchable history of every event, filtered into the monitor a page at a time
+        self.monitor_index = MonitorIndex()
+        self.events.add_renderer(self.index_event)
+        self.search_result = None
+        self.search_page = 0
+        self.search_page_size = 500
+        self.filter_after_id = None
+        
+        # Latency and parsed values per cycle, drawn by the chart panel at most every chart_interval_ms
+        self.chart_data = ChartData()
+        self.chart_interval_ms = 500
+        self.chart_drawn = None  # (data version, series, canvas size) of the current drawing
+        try:
+            self.events.writer.start()
+        except OSError as e:
+            self.events.writer = None
+            self.emit(f"Event log error: {str(e)}", "ERR")
+        self.results_db_file = os.path.join(PROJECT_DIR, "results.db")
+        self.results_db = None
+        
+        # Raw TX/RX capture of every connection
+        self.captures_dir = os.path.join(self.results_dir, "captures")
+        
+        # Numeric values parsed from responses and response classification rules, loaded per run
+        self.extractors_file = os.path.join(PROJECT_DIR, "extractors.json")
+        self.classifier_rules_file = os.path.join(PROJECT_DIR, "classifier_rules.json")
+        self.setup_results_db()
+        self.engine = CommandEngine(self, results_dir=self.results_dir, results_db=self.results_db)
+        
+        # Main-loop lag and UI handler timing; stalls are logged with a stack sample
+        self.watchdog = UiWatchdog(self.monitor_frame.winfo_toplevel(),
+                                   log_file=os.path.join(self.results_dir, "ui_watchdog.log"))
+        for name in UI_HANDLERS:
+            setattr(self, name, self.watchdog.timed(getattr(self, name), name))
+        self.monitor_frame.appendToMonitor = self.watchdog.timed(self.monitor_frame.appendToMonitor)
+        self.watchdog.start()
+        
+        # Optional Prometheus endpoint, enabled by metrics.json
+        self.metrics_file = os.path.join(PROJECT_DIR, "metrics.json")
+        self.metrics_server = None
+        self.setup_metrics()
+        
+        # Seconds between tracemalloc snapshots when memory profiling is on
+        self.memory_profile_interval = 60.0
         
         # Connect UI elements to logic
         self.setup_ui_connections()
         self.scan_ports()
         self.update_ui_state()
+        if self.chart_frame is not None:
+            self.chart_frame.after(self.chart_interval_ms, self.refresh_chart)
         
     def clear_everything(self):
         """Clear everything and reset the application state"""
-        # Clear the monitor
+        # Clear the monitor and its searchable history (the event log keeps everything)
         self.monitor_frame.clearMonitor()
+        self.monitor_index.clear()
+        self.monitor_frame.filterVar.set("")
+        self.chart_data.clear()
         
         # Disconnect if connected
         if self.is_connected:
@@ -73,11 +152,17 @@ class SerialLogic:
         # Serial frame connections
         self.serial_frame.refreshBtn.configure(command=self.scan_ports)
         self.serial_frame.connectBtn.configure(command=self.toggle_connection)
+        self.serial_frame.linkTestBtn.configure(command=self.toggle_link_test)
+        self.serial_frame.comPortVar.trace_add("write", self.on_port_selected)
         
         # Command frame connections
         self.command_frame.runStopBtn.configure(command=self.toggle_run_stop)
+        self.command_frame.injectBtn.configure(command=self.inject_from_entry)
 
         self.monitor_frame.clearBtn.configure(command=self.clear_everything)
+        self.monitor_frame.filterVar.trace_add("write", self.on_filter_changed)
+        self.monitor_frame.newerBtn.configure(command=lambda: self.show_search_page(self.search_page - 1))
+        self.monitor_frame.olderBtn.configure(command=lambda: self.show_search_page(self.search_page + 1))
         
         # Initialize UI state
         self.disable_command_controls()
@@ -87,6 +172,12 @@ class SerialLogic:
         try:
             import serial.tools.list_ports
             self.available_ports = [port.device for port in serial.tools.list_ports.comports()]
+            
+            # Ports of a running port broker are shared through it rather than opened directly
+            brokered = broker_ports()
+            if brokered:
+                self.available_ports = [f"broker://{name}" for name in brokered] + [
+                    port for port in self.available_ports if port not in brokered]
             # Update the combobox values
             self.serial_frame.comPortCombo['values'] = self.available_ports
             
@@ -95,9 +186,9 @@ class SerialLogic:
             else:
                 self.serial_frame.comPortVar.set("")
                 
-            self.monitor_frame.appendToMonitor(f"Found {len(self.available_ports)} ports: {', '.join(self.available_ports)}", "SYS")
+            self.emit(f"Found {len(self.available_ports)} ports: {', '.join(self.available_ports)}", "SYS")
         except Exception as e:
-            self.monitor_frame.appendToMonitor(f"Error scanning ports: {str(e)}", "ERR")
+            self.emit(f"Error scanning ports: {str(e)}", "ERR")
     
     def toggle_connection(self):
         """Toggle the serial connection state"""
@@ -113,51 +204,135 @@ class SerialLogic:
             self.baudrate = int(self.serial_frame.baudRateVar.get())
             
             if not self.port:
-                self.monitor_frame.appendToMonitor("No COM port selected", "ERR")
+                self.emit("No COM port selected", "ERR")
                 return
             
-            self.serial_conn = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
+            # The baudrate and low-latency setting of a link test profile are already in the
+            # widgets (see on_port_selected), where the user may have changed them
+            profile = load_profiles().get(adapter_id(self.port), {})
+            low_latency = self.serial_frame.lowLatencyVar.get()
+            
+            self.serial_conn = open_link(
+                self.port,
+                self.baudrate,
+                low_latency=low_latency,
+                buffer_size=profile.get("buffer_size"),
                 timeout=1
             )
+            if low_latency and not self.serial_conn.low_latency_applied:
+                self.emit("Low-latency mode is not supported on this port", "SYS")
             
             self.is_connected = True
+            if self.engine.metrics:
+                self.engine.metrics.connected(self.port)
             self.serial_frame.connectVar.set("Disconnect")
-            self.monitor_frame.appendToMonitor(f"Connected to {self.port} at {self.baudrate} baud", "SYS")
+            self.emit(f"Connected to {self.port} at {self.baudrate} baud", "SYS")
+            self.open_capture()
             
             # Enable command controls
             self.enable_command_controls()
             
-            # Start the serial monitoring thread
-            threading.Thread(target=self.serial_monitor_thread, daemon=True).start()
+            # Start polling the port for unsolicited data
+            self.start_monitor()
             
+        except ValueError:
+            self.emit("Invalid baudrate", "ERR")
         except Exception as e:
-            self.monitor_frame.appendToMonitor(f"Connection error: {str(e)}", "ERR")
+            self.emit(f"Connection error: {str(e)}", "ERR")
     
     def disconnect_serial(self):
         """Disconnect from the serial port"""
         try:
             if self.serial_conn and self.serial_conn.is_open:
                 # Stop any running operations
-                if self.is_running:
+                if self.engine.is_running:
                     self.toggle_run_stop()
                 
                 self.serial_conn.close()
             
             self.is_connected = False
+            self.stop_monitor()
+            self.close_capture()
             self.serial_frame.connectVar.set("Connect")
-            self.monitor_frame.appendToMonitor(f"Disconnected from {self.port}", "SYS")
+            self.emit(f"Disconnected from {self.port}", "SYS")
             
             # Disable command controls
             self.disable_command_controls()
             
         except Exception as e:
-            self.monitor_frame.appendToMonitor(f"Disconnection error: {str(e)}", "ERR")
+            self.emit(f"Disconnection error: {str(e)}", "ERR")
+    
+    def on_port_selected(self, *args):
+        """Fill in the settings a previous link test recommended for the selected adapter"""
+        port = self.serial_frame.comPortVar.get()
+        if not port or self.is_connected:
+            return
+        try:
+            profile = load_profiles().get(adapter_id(port))
+        except Exception as e:
+            self.emit(f"Link profile error: {str(e)}", "ERR")
+            return
+        if profile:
+            self.serial_frame.baudRateVar.set(str(profile["baudrate"]))
+            self.serial_frame.lowLatencyVar.set(profile.get("low_latency", False))
+            self.emit(f"Link test settings for {port}: {profile['baudrate']} baud, "
+                      f"low latency {'on' if profile.get('low_latency') else 'off'}", "SYS")
+    
+    def toggle_link_test(self):
+        """Start or abort a link test on the selected port"""
+        if self.link_tester:
+            self.link_tester.should_stop = True
+            return
+        
+        port = self.serial_frame.comPortVar.get()
+        if not port:
+            self.emit("No COM port selected", "ERR")
+            return
+        if self.is_connected:
+            self.emit("Disconnect before running a link test", "ERR")
+            return
+        if not messagebox.askyesno("Link Test", f"The link test streams binary test data to {port}.\n\n"
+                                   "Only run it with a loopback plug or an echo device attached, never a "
+                                   "robot controller. Continue?"):
+            return
+        
+        # Test the standard rates plus a custom rate typed into the combobox
+        baud_rates = [int(rate) for rate in self.serial_frame.baudRateCombo['values']]
+        try:
+            custom_rate = int(self.serial_frame.baudRateVar.get())
+            if custom_rate not in baud_rates:
+                baud_rates.append(custom_rate)
+        except ValueError:
+            pass
+        
+        self.link_tester = LinkTester(port, log=lambda message: self.emit(message, "SYS"))
+        self.serial_frame.linkTestVar.set("Stop Test")
+        self.serial_frame.connectBtn.configure(state="disabled")
+        self.emit(f"Link test on {port} (loopback or echo device required)", "SYS")
+        threading.Thread(target=self.run_link_test, args=(port, baud_rates), daemon=True).start()
+    
+    def run_link_test(self, port, baud_rates):
+        """Run the link test and store the recommended settings for the adapter"""
+        try:
+            results = self.link_tester.run(baud_rates)
+            best = recommend(results)
+            if best is None:
+                self.emit("Link test: no stable settings found", "ERR")
+            else:
+                save_profile(adapter_id(port), best.settings())
+                self.serial_frame.baudRateVar.set(str(best.baudrate))
+                self.serial_frame.lowLatencyVar.set(best.low_latency)
+                self.emit(f"Link test recommends {best.describe()}", "SYS")
+        except Exception as e:
+            self.emit(f"Link test error: {str(e)}", "ERR")
+        finally:
+            self.link_tester = None
+            self.serial_frame.linkTestVar.set("Link Test")
+            self.serial_frame.connectBtn.configure(state="normal")
     
     def toggle_run_stop(self):
         """Toggle between Run and Stop states"""
-        if not self.is_running:
+        if not self.engine.is_running:
             self.start_command_execution()
         else:
             self.stop_command_execution()
@@ -172,174 +347,164 @@ class SerialLogic:
         # Check if there are commands in the table
         commands = self.get_commands_from_table()
         if not commands:
-            self.monitor_frame.appendToMonitor("No commands to execute", "SYS")
+            self.emit("No commands to execute", "SYS")
             return
         
         # Check if cycle count is valid
         try:
             cycles = int(self.command_frame.cycleVar.get())
             if cycles <= 0:
-                self.monitor_frame.appendToMonitor("Cycle count must be greater than 0", "SYS")
+                self.emit("Cycle count must be greater than 0", "SYS")
                 return
         except ValueError:
-            self.monitor_frame.appendToMonitor("Invalid cycle count", "ERR")
+            self.emit("Invalid cycle count", "ERR")
+            return
+        
+        # Parse the telemetry polls
+        try:
+            polls = parse_poll_spec(self.command_frame.pollVar.get())
+        except ValueError as e:
+            self.emit(f"Invalid telemetry polls: {str(e)}", "ERR")
+            return
+        
+        # Set up the numeric extractors
+        try:
+            extractors = load_extractors(self.extractors_file)
+        except (ValueError, KeyError, re.error) as e:
+            self.emit(f"Invalid extractors file: {str(e)}", "ERR")
             return
         
-        # Set up execution variables
-        self.is_running = True
-        self.should_stop = False
-        self.current_cycle = 0
-        self.total_cycles = cycles
+        # Compile the response classifier
+        try:
+            classifier = ResponseClassifier(load_rules(self.classifier_rules_file))
+        except (ValueError, KeyError, re.error) as e:
+            self.emit(f"Invalid classifier rules: {str(e)}", "ERR")
+            return
+        
+        # Profile the run if asked to; the files go into its results directory
+        mode = self.command_frame.profileVar.get()
+        memory_interval = self.memory_profile_interval if self.command_frame.memoryProfileVar.get() else None
+        if mode != "off" or memory_interval:
+            self.engine.profiler = RunProfiler(mode, memory_interval=memory_interval)
+        else:
+            self.engine.profiler = None
+        
+        # Create the run's output directory and results
+        self.engine.serial_conn = self.serial_conn
+        self.engine.port = self.port
+        if not self.engine.begin_run(cycles, polls, extractors, classifier):
+            return
         self.command_frame.cycleProgressVar.set(f"0/{cycles}")
+        self.chart_data.clear()
         
-        # Start elapsed time counter
-        self.start_time = time.time()
-        self.elapsed_time_thread = threading.Thread(target=self.update_elapsed_time, daemon=True)
-        self.elapsed_time_thread.start()
+        # Start elapsed time counter; the executor reads the port itself during the run
+        self.stop_monitor()
+        self.start_time = self.engine.clock.monotonic()
+        self.elapsed_timer = self.scheduler.call_every(1.0, self.update_elapsed_time, first=0)
         
         # Update UI state
         self.command_frame.runStopBtn.configure(text="STOP", bootstyle="danger")
         self.disable_command_editing()
         
         # Start command execution thread
-        self.command_thread = threading.Thread(target=self.execute_commands, args=(commands, cycles), daemon=True)
+        self.command_thread = threading.Thread(target=self.engine.execute, args=(commands, cycles), name="executor",
+                                               daemon=True)
         self.command_thread.start()
     
     def stop_command_execution(self):
-        """Stop the command execution"""
-        if self.serial_conn and self.serial_conn.is_open:
-            # Send the "HALT" command before stopping execution
-            self.serial_conn.write(b"HALT\n")
-            self.monitor_frame.appendToMonitor("Sending: HALT", "TX")
-
-        self.should_stop = True
-        self.is_running = False
-        self.command_frame.runStopBtn.configure(text="RUN", bootstyle="success")
-        self.enable_command_editing()
-        self.monitor_frame.appendToMonitor("Command execution stopped", "SYS")
+        """Stop the command execution; RUN comes back once the executor has finished"""
+        self.engine.stop()
+        self.command_frame.runStopBtn.configure(text="STOPPING", bootstyle="secondary", state="disabled")
+        self.emit("Command execution stopped", "SYS")
     
-    def execute_commands(self, commands, cycles):
-        """Execute the commands in the table for the specified number of cycles"""
+    def open_capture(self):
+        """Start capturing the raw traffic of the new connection"""
         try:
-            for cycle in range(1, cycles + 1):
-                if self.should_stop:
-                    break
-                
-                self.current_cycle = cycle
-                self.command_frame.cycleProgressVar.set(f"{cycle}/{cycles}")
-                
-                for i, (item_id, command) in enumerate(commands):
-                    if self.should_stop:
-                        break
-                    
-                    # Update status to yellow (waiting)
-                    self.update_command_status(item_id, "WAITING", "yellow")
-                    
-                    # Send command
-                    self.monitor_frame.appendToMonitor(f"Sending: {command}", "TX")
-                    self.serial_conn.write(f"{command}\n".encode())
-                    
-                    # Wait for response with timeout
-                    response = self.wait_for_response(30)
-
-                    if response == "TIMEOUT":
-                        # Timeout occurred
-                        self.update_command_status(item_id, "TIMEOUT", "red")
-                        self.update_command_response(item_id, "No response received (timeout)")
-                        self.should_stop = True
-                        break
-                    elif response == "HALT":
-                         # Stop execution if "HALT" command received
-                        self.update_command_status(item_id, "HALT", "red")
-                        self.update_command_response(item_id, "STOP execution")
-                        self.should_stop = True
-                        break
-
-                    # Process response
-                    response_str = response.decode('utf-8', errors='replace').strip()
-                    self.monitor_frame.appendToMonitor(f"Received: {response_str}", "RX")
-                    
-                    # Update response in table
-                    self.update_command_response(item_id, response_str)
-                    
-                    # Check for specific responses
-                    if "_ERR" in response_str:
-                        self.update_command_status(item_id, "ERROR", "red")
-                        self.log_result(command, "ERROR", response_str)
-                        self.should_stop = True
-                        break
-                    elif "_RDY" in response_str or "_REP" in response_str:
-                        self.update_command_status(item_id, "SUCCESS", "green")
-                        self.log_result(command, "SUCCESS", response_str)
-                    else:
-                        self.update_command_status(item_id, "UNKNOWN", "yellow")
-                        self.log_result(command, "UNKNOWN", response_str)
-            
-            # Execution completed or stopped
-            if not self.should_stop:
-                self.monitor_frame.appendToMonitor("All commands executed successfully", "SYS")
-            
-            # Reset UI state
-            self.is_running = False
-            self.command_frame.runStopBtn.configure(text="RUN", bootstyle="success")
-            self.enable_command_editing()
-            
+            os.makedirs(self.captures_dir, exist_ok=True)
+            name = f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{safe_port_name(self.port)}.cap"
+            self.engine.capture = CaptureWriter(os.path.join(self.captures_dir, name))
+            self.emit(f"Capturing traffic to {self.engine.capture.path}", "SYS")
         except Exception as e:
-            self.monitor_frame.appendToMonitor(f"Execution error: {str(e)}", "ERR")
-            self.is_running = False
-            self.command_frame.runStopBtn.configure(text="RUN", bootstyle="success")
-            self.enable_command_editing()
-    
-    def wait_for_response(self, timeout):
-        """Wait for a response from the serial device with timeout"""
-        start_time = time.time()
-        response = b""
-        
-        while (time.time() - start_time) < timeout:
-            if self.should_stop:
-                return "HALT"
-            
-            if self.serial_conn.in_waiting > 0:
-                new_data = self.serial_conn.read(self.serial_conn.in_waiting)
-                response += new_data
-                
-                # Check if we have a complete response
-                if b"_RDY" in response or b"_ERR" in response or b"_REP" in response:
-                    return response
-            
-            # Small delay to prevent hogging CPU
-            time.sleep(0.1)
-        
-        # Timeout occurred
-        return "TIMEOUT"
+            self.engine.capture = None
+            self.emit(f"Capture error: {str(e)}", "ERR")
     
-    def serial_monitor_thread(self):
-        """Thread to monitor incoming serial data when not executing commands"""
+    def close_capture(self):
+        """Flush and close the traffic capture"""
+        if self.engine.capture:
+            self.engine.capture.close()
+            self.engine.capture = None
+    
+    def shutdown(self):
+        """Stop a run and close the port and capture before the window closes"""
+        if self.engine.is_running:
+            self.engine.stop()
+            if self.command_thread is not None:
+                self.command_thread.join(timeout=5)
         try:
-            while self.is_connected:
-                # Only process incoming data when not executing commands
-                if not self.is_running and self.serial_conn and self.serial_conn.is_open:
-                    if self.serial_conn.in_waiting > 0:
-                        data = self.serial_conn.read(self.serial_conn.in_waiting)
-                        text = data.decode('utf-8', errors='replace')
-                        self.monitor_frame.appendToMonitor(text, "RX")
-                
-                # Small delay to prevent hogging CPU
-                time.sleep(0.1)
+            if self.serial_conn and self.serial_conn.is_open:
+                self.serial_conn.close()
+        except Exception:
+            pass  # Closing anyway
+        self.close_capture()
+        if self.results_db:
+            self.results_db.close()  # Writes the rows still queued
+        self.events.close()
+    
+    def inject_from_entry(self):
+        """Inject the command typed in the command entry into the running cycle"""
+        command = self.command_frame.commandVar.get().strip()
+        if not command:
+            return
+        if not self.engine.is_running:
+            self.emit("Commands can only be injected while running", "SYS")
+            return
+        self.engine.inject_command(command)
+        self.command_frame.commandVar.set("")
+        self.emit(f"Queued: {command}", "INJ")
+    
+    def start_monitor(self):
+        """Poll the port for unsolicited data while no run is reading it"""
+        if self.monitor_timer is None:
+            self.monitor_timer = self.scheduler.call_every(self.monitor_interval, self.poll_monitor)
+    
+    def stop_monitor(self):
+        self.scheduler.cancel(self.monitor_timer)
+        self.monitor_timer = None
+    
+    def poll_monitor(self):
+        """Show incoming serial data when not executing commands"""
+        try:
+            if not self.engine.is_running and self.serial_conn and self.serial_conn.is_open:
+                if self.serial_conn.in_waiting > 0:
+                    data = self.serial_conn.read(self.serial_conn.in_waiting)
+                    self.engine.capture_chunk(RX, data)
+                    if self.engine.capture:
+                        self.engine.capture.flush()  # Unsolicited data is rare, keep it on disk
+                    text = data.decode('utf-8', errors='replace')
+                    self.emit(text, "RX")
         except Exception as e:
             if self.is_connected:  # Only show error if we're supposed to be connected
-                self.monitor_frame.appendToMonitor(f"Monitor error: {str(e)}", "ERR")
+                self.emit(f"Monitor error: {str(e)}", "ERR")
+                self.stop_monitor()
     
     def update_elapsed_time(self):
         """Update the elapsed time display"""
-        while self.is_running:
-            if self.start_time:
-                elapsed = time.time() - self.start_time
-                hours, remainder = divmod(int(elapsed), 3600)
-                minutes, seconds = divmod(remainder, 60)
-                time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                self.command_frame.elapsedTimeVar.set(time_str)
-            time.sleep(0.1)
+        if self.start_time is not None:
+            elapsed = self.engine.clock.monotonic() - self.start_time
+            hours, remainder = divmod(int(elapsed), 3600)
+            minutes, seconds = divmod(remainder, 60)
+            time_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+            self.command_frame.elapsedTimeVar.set(time_str)
+    
+    def stop_elapsed_time(self):
+        """Stop the elapsed time ticks, leaving the final time displayed"""
+        if self.elapsed_timer is not None:
+            self.scheduler.cancel(self.elapsed_timer)
+            self.elapsed_timer = None
+            self.update_elapsed_time()
+    
+    def on_timer_error(self, timer, error):
+        self.emit(f"Timer error in {timer.callback.__name__}: {str(error)}", "ERR")
     
     def get_commands_from_table(self):
         """Get all commands from the table with their IDs"""
@@ -368,7 +533,7 @@ class SerialLogic:
                 self.command_frame.commandTable.tag_configure(item_id, background="#ffc0c0")
                 self.command_frame.commandTable.item(item_id, tags=(item_id,))
         except Exception as e:
-            self.monitor_frame.appendToMonitor(f"UI update error: {str(e)}", "ERR")
+            self.emit(f"UI update error: {str(e)}", "ERR")
     
     def update_command_response(self, item_id, response):
         """Update the response of a command in the table"""
@@ -377,68 +542,171 @@ class SerialLogic:
             values[2] = response
             self.command_frame.commandTable.item(item_id, values=values)
         except Exception as e:
-            self.monitor_frame.appendToMonitor(f"UI update error: {str(e)}", "ERR")
+            self.emit(f"UI update error: {str(e)}", "ERR")
     
-    def setup_excel_file(self):
-        """Set up the Excel results file"""
+    def setup_results_db(self):
+        """Open the results database and start its writer thread"""
         try:
-            if not os.path.exists(self.results_file):
-                # Create new workbook
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.title = "Results"
-                
-                # Add headers
-                headers = ["COMMAND", "RESPONSE", "TIME"]
-                for col, header in enumerate(headers, 1):
-                    cell = ws.cell(row=1, column=col)
-                    cell.value = header
-                    cell.font = Font(bold=True)
-                    cell.fill = PatternFill(start_color='DDDDDD', end_color='DDDDDD', fill_type='solid')
-                
-                wb.save(self.results_file)
+            self.results_db = ResultsDatabase(self.results_db_file, on_error=lambda text: self.emit(text, "ERR"))
+            self.results_db.start()
         except Exception as e:
-            self.monitor_frame.appendToMonitor(f"Excel setup error: {str(e)}", "ERR")
+            self.results_db = None
+            self.emit(f"Results database error: {str(e)}", "ERR")
     
-    def log_result(self, command, status, response):
-        """Log the command result to the Excel file"""
+    def setup_metrics(self):
+        """Serve run metrics on localhost if metrics.json asks for it"""
         try:
-            # Load workbook
-            wb = openpyxl.load_workbook(self.results_file)
-            ws = wb.active
-            
-            # Get current timestamp
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Add new row
-            next_row = ws.max_row + 1
-            ws.cell(row=next_row, column=1).value = command
-            ws.cell(row=next_row, column=2).value = response
-            ws.cell(row=next_row, column=3).value = timestamp
-            
-            # Color based on status
-            if status == "SUCCESS":
-                for col in range(1, 4):
-                    ws.cell(row=next_row, column=col).fill = PatternFill(
-                        start_color='C0FFC0', end_color='C0FFC0', fill_type='solid')
-            elif status == "ERROR":
-                for col in range(1, 4):
-                    ws.cell(row=next_row, column=col).fill = PatternFill(
-                        start_color='FFC0C0', end_color='FFC0C0', fill_type='solid')
-            elif status == "UNKNOWN" or status == "TIMEOUT":
-                for col in range(1, 4):
-                    ws.cell(row=next_row, column=col).fill = PatternFill(
-                        start_color='FFFFC0', end_color='FFFFC0', fill_type='solid')
-            
-            # Save workbook
-            wb.save(self.results_file)
+            config = load_metrics_config(self.metrics_file)
+            if config is None:
+                return
+            metrics = EngineMetrics()
+            registry = metrics.registry
+            if self.results_db:
+                registry.gauge("robot_results_queue_depth", "Rows waiting for the results database writer",
+                               function=self.results_db.queue.qsize)
+            registry.gauge("robot_ui_timer_lag_seconds", "How late the last UI timer tick ran",
+                           function=lambda: self.scheduler.lag)
+            registry.gauge("robot_ui_loop_lag_seconds", "Tk main-loop lag percentiles", ["quantile"],
+                           function=lambda: {(str(q),): lag for q, lag in self.watchdog.lag_quantiles().items()
+                                             if lag is not None})
+            registry.gauge("robot_run_active", "1 while a run is executing", ["port"],
+                           function=lambda: {(self.port or "",): int(self.engine.is_running)})
+            self.metrics_server = MetricsServer(registry, config["host"], config["port"])
+            host, port = self.metrics_server.start()
+            self.engine.metrics = metrics
+            self.emit(f"Metrics at http://{host}:{port}/metrics", "SYS")
         except Exception as e:
-            self.monitor_frame.appendToMonitor(f"Excel logging error: {str(e)}", "ERR")
+            self.metrics_server = None
+            self.emit(f"Metrics endpoint error: {str(e)}", "ERR")
+    
+    def emit(self, text, direction="SYS"):
+        """Record a monitor event, tagged with the run's cycle and step while one is executing"""
+        engine = getattr(self, "engine", None)
+        if engine is not None and engine.is_running:
+            self.events.emit(text, direction, self.port, engine.current_cycle, engine.current_step)
+        else:
+            self.events.emit(text, direction, self.port)
+    
+    def render_event(self, event):
+        self.monitor_frame.appendToMonitor(event["text"], event["dir"], self.events.wall_time(event))
+    
+    def index_event(self, event):
+        self.monitor_index.add(event, self.events.wall_time(event))
+    
+    def on_filter_changed(self, *args):
+        """Filter as you type, once typing pauses"""
+        if self.filter_after_id is not None:
+            self.monitor_frame.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.monitor_frame.after(150, self.apply_filter)
+    
+    def apply_filter(self):
+        """Show the newest page of matches, or the live tail when the filter is empty"""
+        self.filter_after_id = None
+        text = self.monitor_frame.filterVar.get()
+        if not text.strip():
+            self.search_result = None
+            self.monitor_frame.showLines(self.monitor_index.tail(self.monitor_frame.maxLines), live=True)
+            self.monitor_frame.filterStatusVar.set("")
+            self.monitor_frame.newerBtn.configure(state="disabled")
+            self.monitor_frame.olderBtn.configure(state="disabled")
+            return
+        self.search_result = self.monitor_index.search(text)
+        self.show_search_page(0)
+    
+    def show_search_page(self, page):
+        """Show one page of the current filter's matches, page 0 being the newest"""
+        result = self.search_result
+        size = self.search_page_size
+        if result is None or page < 0 or (page > 0 and not result.has_page(page, size)):
+            return
+        self.search_page = page
+        lines = [self.monitor_index.line(event_id) for event_id in result.page(page, size)]
+        self.monitor_frame.showLines(lines, live=False)
+        
+        found = f"{len(result.matches)}" if result.exhausted else f"{len(result.matches)}+"
+        self.monitor_frame.filterStatusVar.set(f"{found} matches, page {page + 1}")
+        self.monitor_frame.newerBtn.configure(state="normal" if page > 0 else "disabled")
+        self.monitor_frame.olderBtn.configure(state="normal" if result.has_page(page + 1, size) else "disabled")
+    
+    def refresh_chart(self):
+        """Redraw the chart panel if its data, series or size changed, then check again later"""
+        frame = self.chart_frame
+        try:
+            frame.setSeries(self.chart_data.names())
+            name = frame.seriesVar.get()
+            canvas = frame.chartCanvas
+            state = (self.chart_data.version, name, canvas.winfo_width(), canvas.winfo_height())
+            if state != self.chart_drawn:
+                self.chart_drawn = state
+                self.draw_chart(name)
+        except Exception as e:
+            self.emit(f"Chart error: {str(e)}", "ERR")
+        frame.after(self.chart_interval_ms, self.refresh_chart)
+    
+    def draw_chart(self, name):
+        """Draw one series decimated to the canvas width"""
+        frame = self.chart_frame
+        width = frame.plotWidth()
+        with self.chart_data.lock:
+            series = self.chart_data.series.get(name)
+            x_range = series.x_range() if series is not None else None
+            if x_range is None:
+                frame.countVar.set("")
+                frame.drawEmpty()
+                return
+            count = len(series)
+            x0, x1 = x_range
+            # Latency keeps every spike as a min/max envelope; values are a line through block means
+            if name.startswith("Latency:"):
+                columns = series.min_max(x0, x1, width)
+            else:
+                points = series.lttb(x0, x1, width)
+        frame.countVar.set(f"{count} points")
+        if name.startswith("Latency:"):
+            frame.drawEnvelope(columns, x0, x1, " ms")
+        else:
+            frame.drawLine(points, x0, x1)
+    
+    def on_result(self, cycle, step, command, status, response, timestamp, latency):
+        if latency is not None:
+            self.chart_data.add(f"Latency: {command}", cycle, latency * 1000)
+    
+    def on_value(self, cycle, command, field, value):
+        self.chart_data.add(f"{command}: {field}", cycle, value)
+    
+    def on_message(self, text, direction):
+        self.emit(text, direction)
+    
+    def on_cycle(self, cycle, cycles):
+        self.command_frame.cycleProgressVar.set(f"{cycle}/{cycles}")
+    
+    def on_step(self, key, status, color, response=None):
+        self.update_command_status(key, status, color)
+        if response is not None:
+            self.update_command_response(key, response)
+    
+    def on_run_finished(self, outcome):
+        self.stop_elapsed_time()
+        if self.is_connected:
+            self.start_monitor()
+        
+        # Main-loop responsiveness over the session so far
+        summary = self.watchdog.describe()
+        self.watchdog.write_log(summary)
+        self.emit(summary, "SYS")
+        
+        # Reset UI state
+        self.command_frame.runStopBtn.configure(text="RUN", bootstyle="success",
+                                                state="normal" if self.is_connected else "disabled")
+        self.enable_command_editing()
     
     def enable_command_controls(self):
         """Enable command-related UI controls"""
         self.command_frame.commandEntry.configure(state="normal")
         self.command_frame.cycleEntry.configure(state="normal")
+        self.command_frame.pollEntry.configure(state="normal")
+        self.command_frame.profileCombo.configure(state="readonly")
+        self.command_frame.memoryProfileCheck.configure(state="normal")
         self.command_frame.addBtn.configure(state="normal")
         self.command_frame.deleteBtn.configure(state="normal")
         self.command_frame.updateBtn.configure(state="normal")
@@ -448,23 +716,35 @@ class SerialLogic:
         """Disable command-related UI controls"""
         self.command_frame.commandEntry.configure(state="disabled")
         self.command_frame.cycleEntry.configure(state="disabled")
+        self.command_frame.pollEntry.configure(state="disabled")
+        self.command_frame.profileCombo.configure(state="disabled")
+        self.command_frame.memoryProfileCheck.configure(state="disabled")
         self.command_frame.addBtn.configure(state="disabled")
         self.command_frame.deleteBtn.configure(state="disabled")
         self.command_frame.updateBtn.configure(state="disabled")
         self.command_frame.runStopBtn.configure(state="disabled")
+        self.command_frame.injectBtn.configure(state="disabled")
     
     def enable_command_editing(self):
         """Enable command editing controls"""
+        self.command_frame.injectBtn.configure(state="disabled")
         self.command_frame.commandEntry.configure(state="normal")
         self.command_frame.cycleEntry.configure(state="normal")
+        self.command_frame.pollEntry.configure(state="normal")
+        self.command_frame.profileCombo.configure(state="readonly")
+        self.command_frame.memoryProfileCheck.configure(state="normal")
         self.command_frame.addBtn.configure(state="normal")
         self.command_frame.deleteBtn.configure(state="normal")
         self.command_frame.updateBtn.configure(state="normal")
     
     def disable_command_editing(self):
         """Disable command editing controls"""
-        self.command_frame.commandEntry.configure(state="disabled")
+        # The command entry stays enabled so commands can be injected into the run
+        self.command_frame.injectBtn.configure(state="normal")
         self.command_frame.cycleEntry.configure(state="disabled")
+        self.command_frame.pollEntry.configure(state="disabled")
+        self.command_frame.profileCombo.configure(state="disabled")
+        self.command_frame.memoryProfileCheck.configure(state="disabled")
         self.command_frame.addBtn.configure(state="disabled")
         self.command_frame.deleteBtn.configure(state="disabled")
         self.command_frame.updateBtn.configure(state="disabled")
@@ -0,0 +1,278 @@
+import bisect
+import json
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Live run metrics in the Prometheus text format, served on localhost:
+#
+#     metrics.json: {"port": 9464}              (optional "host", default 127.0.0.1)
+#     curl http://127.0.0.1:9464/metrics
+#
+# The engine updates the counters through its "metrics" attribute (like
+# "capture"); gauges such as queue depths are read when the page is scraped.
+
+DEFAULT_METRICS_PORT = 9464
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base of a metric family: name, help text and label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines += self.samples()
+        return lines
+
+    def samples(self):
+        return []
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self.key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+
+
+class Gauge(Metric):
+    """A value that is set, or read from function() at scrape time
+
+    function returns a number, or for a labelled gauge a dict of
+    label-value tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), function=None):
+        super().__init__(name, help_text, labelnames)
+        self.function = function
+        self.values = {}
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                return []  # The source went away (database closed, app shutting down)
+            values = value.items() if isinstance(value, dict) else [((), value)]
+        else:
+            with self.lock:
+                values = list(self.values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(values)]
+
+
+class Histogram(Metric):
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # key -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[bisect.bisect_left(self.buckets, value)] += 1
+            entry[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = sorted((key, list(entry)) for key, entry in self.values.items())
+        lines = []
+        for key, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), entry[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(entry[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metric families one endpoint serves"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), function=None):
+        return self.register(Gauge(name, help_text, labelnames, function))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        """The whole registry in the Prometheus text format"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+class EngineMetrics:
+    """Per-port counters a CommandEngine updates while it runs
+
+    Several engines (GUI, agents, sharded and coordinated runs) can share
+    one instance; every sample carries the engine's port.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        self.commands = self.registry.counter("robot_commands_sent_total", "Commands written to the port",
+                                              ["port"])
+        self.responses = self.registry.counter("robot_responses_total", "Responses by classified status",
+                                               ["port", "status"])
+        self.latency = self.registry.histogram("robot_round_trip_seconds",
+                                               "Time from sending a command to its complete response", ["port"])
+        self.bytes = self.registry.counter("robot_bytes_total", "Bytes sent (tx) and received (rx)",
+                                           ["port", "direction"])
+        self.reconnects = self.registry.counter("robot_reconnects_total",
+                                                "Connections to a port after the first one", ["port"])
+        self.cycle = self.registry.gauge("robot_run_cycle", "Cycle the current run is in", ["port"])
+        self.anomalies = self.registry.counter("robot_latency_anomalies_total",
+                                               "Slow steps and drifting commands compared to the latency baselines",
+                                               ["port", "kind"])
+        self.connected_ports = set()
+        self.lock = threading.Lock()
+
+    def command_sent(self, port):
+        self.commands.inc(port=port)
+
+    def response(self, port, status, latency):
+        self.responses.inc(port=port, status=status)
+        if latency is not None:
+            self.latency.observe(latency, port=port)
+
+    def anomaly(self, port, kind):
+        self.anomalies.inc(port=port, kind=kind)
+
+    def transferred(self, port, direction, count):
+        self.bytes.inc(count, port=port, direction=direction)
+
+    def connected(self, port):
+        with self.lock:
+            if port in self.connected_ports:
+                self.reconnects.inc(port=port)
+            else:
+                self.connected_ports.add(port)
+                self.reconnects.inc(0, port=port)
+
+
+class MetricsServer:
+    """Serves a registry at http://host:port/metrics from a background thread"""
+
+    def __init__(self, registry, host="127.0.0.1", port=DEFAULT_METRICS_PORT):
+        self.registry = registry
+        self.address = (host, port)
+        self.server = None
+
+    def start(self):
+        """Start serving; returns the bound (host, port)"""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the console
+
+        self.server = ThreadingHTTPServer(self.address, Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.address = self.server.server_address[:2]
+        return self.address
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def load_metrics_config(path):
+    """Return the endpoint settings from a JSON file, or None when metrics are off"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if not config.get("enabled", True):
+        return None
+    return {"host": config.get("host", "127.0.0.1"), "port": int(config.get("port", DEFAULT_METRICS_PORT))}
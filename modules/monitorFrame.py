@@ -31,31 +31,80 @@ class SerialMonitorFrame(ttk.LabelFrame):
         self.textYScroll.pack(side=RIGHT, fill=Y)
         self.monitorText.pack(side=LEFT, fill=BOTH, expand=YES)
         
+        # Lines kept in the text area; older history is reached through the filter
+        self.maxLines = 5000
+        self.live = True  # False while a filtered page is shown
+        
         # Button frame
         self.btnFrame = ttk.Frame(self)
         self.btnFrame.pack(fill=X, pady=(5, 0))
         
+        # Filter over the whole monitor history, e.g. "_ERR" or "dir:RX cycle:10-20"
+        self.filterLabel = ttk.Label(self.btnFrame, text="Filter:")
+        self.filterLabel.pack(side=LEFT, padx=(0, 5))
+        
+        self.filterVar = tk.StringVar()
+        self.filterEntry = ttk.Entry(self.btnFrame, textvariable=self.filterVar, width=40)
+        self.filterEntry.pack(side=LEFT, padx=(0, 5))
+        
+        self.newerBtn = ttk.Button(self.btnFrame, text="Newer", state="disabled")
+        self.newerBtn.pack(side=LEFT, padx=(0, 5))
+        
+        self.olderBtn = ttk.Button(self.btnFrame, text="Older", state="disabled")
+        self.olderBtn.pack(side=LEFT, padx=(0, 5))
+        
+        self.filterStatusVar = tk.StringVar()
+        self.filterStatus = ttk.Label(self.btnFrame, textvariable=self.filterStatusVar)
+        self.filterStatus.pack(side=LEFT, padx=5)
+        
         # Clear button
         self.clearBtn = ttk.Button(self.btnFrame, text="Clear", 
                                    image=self.clear_icon, compound=TOP,
                                    command=self.clearMonitor)
         self.clearBtn.pack(side=RIGHT)
     
-    def appendToMonitor(self, message, direction="TX"):
+    def appendToMonitor(self, message, direction="TX", timestamp=None):
         """Append a message to the monitor with timestamp
         
         Args:
             message (str): Message to append
             direction (str): Direction of message (TX or RX)
+            timestamp (float): Time of the event in epoch seconds (default: now)
         """
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        formatted_msg = f"[{timestamp}] {direction}: {message}\n"
+        if not self.live:
+            return  # A filtered page is shown; the message is still in the history
         
         self.monitorText.configure(state="normal")
-        self.monitorText.insert(tk.END, formatted_msg)
+        self.monitorText.insert(tk.END, self.formatLine(message, direction, timestamp))
+        
+        # Keep the text area bounded so inserts stay fast over long runs
+        lines = int(self.monitorText.index("end-1c").split(".")[0]) - 1
+        if lines > self.maxLines:
+            self.monitorText.delete("1.0", f"{lines - self.maxLines + 1}.0")
+        
         self.monitorText.see(tk.END)  # Auto-scroll to the end
         self.monitorText.configure(state="disabled")
     
+    def formatLine(self, message, direction, timestamp=None):
+        """Format one monitor line"""
+        when = datetime.datetime.now() if timestamp is None else datetime.datetime.fromtimestamp(timestamp)
+        return f"[{when.strftime('%H:%M:%S.%f')[:-3]}] {direction}: {message}\n"
+    
+    def showLines(self, lines, live):
+        """Replace the text area with (timestamp, direction, message) lines
+        
+        Args:
+            lines (list): Lines to show, oldest first
+            live (bool): Keep appending new messages after these lines
+        """
+        self.live = live
+        self.monitorText.configure(state="normal")
+        self.monitorText.delete("1.0", tk.END)
+        self.monitorText.insert(tk.END, "".join(self.formatLine(message, direction, timestamp)
+                                                for timestamp, direction, message in lines))
+        self.monitorText.see(tk.END)
+        self.monitorText.configure(state="disabled")
+    
     def clearMonitor(self):
         """Clear the monitor text area"""
         self.monitorText.configure(state="normal")
@@ -0,0 +1,224 @@
+import re
+import threading
+from array import array
+
+# Filter syntax of the monitor search box, terms separated by spaces:
+#
+#     _ERR                      free text (case-insensitive substring)
+#     dir:RX  dir:TX,ERR        directions
+#     status:_ERR               a status token (_CODE or an upper-case word such as TIMEOUT)
+#     cycle:12  cycle:10-20     cycles of a run
+#
+# All terms must match. Free text of three or more characters is looked up
+# through a trigram index; the other terms through per-value posting lists.
+
+TOKEN_PATTERN = re.compile(r"(?<![A-Za-z0-9_])(_[A-Za-z0-9]+|[A-Z][A-Z0-9]{2,})(?![A-Za-z0-9_])")
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class Filter:
+    """A parsed filter string"""
+
+    def __init__(self, text=""):
+        self.text = ""
+        self.directions = None
+        self.tokens = []
+        self.cycles = None  # (first, last)
+        words = []
+        for term in text.split():
+            key, _, value = term.partition(":")
+            if value and key == "dir":
+                self.directions = {d.upper() for d in value.split(",") if d}
+            elif value and key == "status":
+                self.tokens.append(value)
+            elif value and key == "cycle":
+                first, _, last = value.partition("-")
+                try:
+                    self.cycles = (int(first), int(last or first))
+                except ValueError:
+                    words.append(term)
+            else:
+                words.append(term)
+        self.text = " ".join(words).lower()
+
+    @property
+    def empty(self):
+        return not (self.text or self.directions or self.tokens or self.cycles)
+
+
+class MonitorIndex:
+    """Incrementally maintained index over monitor events
+
+    Events are kept in columns (time, direction code, cycle, text) and
+    every add() appends the event's ID to the posting lists of its
+    direction, cycle, status tokens and text trigrams, so a query never
+    rescans the history: it walks the shortest posting list that applies,
+    newest first, and checks the remaining conditions on each candidate
+    until a page is full. When max_events is exceeded the oldest half is
+    dropped and the index rebuilt.
+    """
+
+    def __init__(self, max_events=2000000):
+        self.max_events = max_events
+        self.lock = threading.Lock()
+        self.generation = 0  # Changes when event IDs are reassigned
+        self._reset()
+
+    def clear(self):
+        with self.lock:
+            self._reset()
+            self.generation += 1
+
+    def _reset(self):
+        self.times = array("d")
+        self.dir_codes = array("B")
+        self.cycles = array("I")
+        self.texts = []
+        self.direction_names = []
+        self.direction_ids = {}
+        self.by_direction = {}
+        self.by_cycle = {}
+        self.by_token = {}
+        self.by_trigram = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, event, wall=None):
+        """Index an event dict from the EventBus"""
+        with self.lock:
+            if len(self.texts) >= self.max_events:
+                self._compact()
+            self._add(wall if wall is not None else event.get("wall", 0.0), event["dir"],
+                      event.get("cycle") or 0, event.get("text", ""))
+
+    def _add(self, when, direction, cycle, text):
+        event_id = len(self.texts)
+        code = self.direction_ids.get(direction)
+        if code is None:
+            code = self.direction_ids[direction] = len(self.direction_names)
+            self.direction_names.append(direction)
+            self.by_direction[code] = array("I")
+        self.times.append(when)
+        self.dir_codes.append(code)
+        self.cycles.append(cycle)
+        self.texts.append(text)
+        self.by_direction[code].append(event_id)
+        if cycle:
+            self.by_cycle.setdefault(cycle, array("I")).append(event_id)
+        for token in set(TOKEN_PATTERN.findall(text)):
+            self.by_token.setdefault(token, array("I")).append(event_id)
+        by_trigram = self.by_trigram
+        for gram in trigrams(text):
+            postings = by_trigram.get(gram)
+            if postings is None:
+                postings = by_trigram[gram] = array("I")
+            postings.append(event_id)
+
+    def _compact(self):
+        """Drop the oldest half and rebuild the posting lists"""
+        keep = len(self.texts) // 2
+        rows = list(zip(self.times[-keep:], (self.direction_names[c] for c in self.dir_codes[-keep:]),
+                        self.cycles[-keep:], self.texts[-keep:]))
+        self._reset()
+        self.generation += 1
+        for row in rows:
+            self._add(*row)
+
+    def line(self, event_id):
+        """(time, direction, text) of an event"""
+        with self.lock:
+            return self.times[event_id], self.direction_names[self.dir_codes[event_id]], self.texts[event_id]
+
+    def tail(self, count):
+        """(time, direction, text) of the newest count events, oldest first"""
+        with self.lock:
+            start = max(0, len(self.texts) - count)
+            return [(self.times[i], self.direction_names[self.dir_codes[i]], self.texts[i])
+                    for i in range(start, len(self.texts))]
+
+    def search(self, text):
+        return SearchResult(self, Filter(text))
+
+
+class SearchResult:
+    """Matches of one filter, found lazily newest first and paged"""
+
+    def __init__(self, index, query):
+        self.index = index
+        self.query = query
+        with index.lock:
+            self._restart()
+
+    def _restart(self):
+        """Start the scan over from the newest event; called with the index locked"""
+        self.matches = []  # Event IDs found so far, newest first
+        self.exhausted = False
+        self.upto = len(self.index.texts)  # Events added later are not part of this result
+        self.generation = self.index.generation
+        self.candidates = self._candidates()
+        self.position = len(self.candidates) if self.candidates is not None else self.upto
+
+    def _candidates(self):
+        """The shortest posting list that every match must be in, or None for all events"""
+        index, query = self.index, self.query
+        lists = []
+        if query.directions is not None:
+            codes = [index.direction_ids[d] for d in query.directions if d in index.direction_ids]
+            if len(codes) == 1:
+                lists.append(index.by_direction[codes[0]])
+            elif not codes:
+                return array("I")
+        for token in query.tokens:
+            lists.append(index.by_token.get(token, array("I")))
+        if query.cycles and query.cycles[0] == query.cycles[1]:
+            lists.append(index.by_cycle.get(query.cycles[0], array("I")))
+        for gram in trigrams(query.text):
+            lists.append(index.by_trigram.get(gram, array("I")))
+        return min(lists, key=len) if lists else None
+
+    def _matches(self, event_id):
+        index, query = self.index, self.query
+        if query.directions is not None and index.direction_names[index.dir_codes[event_id]] not in query.directions:
+            return False
+        if query.cycles and not query.cycles[0] <= index.cycles[event_id] <= query.cycles[1]:
+            return False
+        text = index.texts[event_id]
+        if query.text and query.text not in text.lower():
+            return False
+        for token in query.tokens:
+            if token not in TOKEN_PATTERN.findall(text):
+                return False
+        return True
+
+    def _find(self, wanted):
+        """Scan older candidates until wanted matches are known or none are left"""
+        with self.index.lock:
+            if self.generation != self.index.generation:
+                self._restart()  # History was cleared or compacted, so event IDs changed
+            candidates = self.candidates
+            while len(self.matches) < wanted and self.position > 0:
+                self.position -= 1
+                event_id = candidates[self.position] if candidates is not None else self.position
+                if event_id < self.upto and self._matches(event_id):
+                    self.matches.append(event_id)
+            if self.position <= 0:
+                self.exhausted = True
+
+    def page(self, number, size=500):
+        """Event IDs of page number (0 = newest), oldest first for display"""
+        self._find((number + 1) * size)
+        return list(reversed(self.matches[number * size:(number + 1) * size]))
+
+    def has_page(self, number, size=500):
+        self._find(number * size + 1)
+        return len(self.matches) > number * size
+
+    def count(self):
+        """Total number of matches (scans the rest of the candidates)"""
+        self._find(float("inf"))
+        return len(self.matches)
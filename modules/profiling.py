@@ -0,0 +1,214 @@
+import collections
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_MODES = ("off", "sample", "cprofile")
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """Low-overhead profiler: a thread reads every thread's stack at a fixed interval
+
+    Samples are folded into "thread;outer;...;inner count" lines (the
+    input format of flame graph tools). The overhead depends on the
+    interval and the stack depth, not on how many calls the threads make.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def save_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def summary(self, limit=40):
+        """Top functions by own (innermost) and total samples, per thread"""
+        by_thread = collections.defaultdict(lambda: (collections.Counter(), collections.Counter()))
+        totals = collections.Counter()
+        for stack, count in self.stacks.items():
+            thread, *frames = stack.split(";")
+            totals[thread] += count
+            own, total = by_thread[thread]
+            if frames:
+                own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+
+        lines = [f"{self.samples} samples every {self.interval * 1000:g} ms"]
+        for thread, samples in totals.most_common():
+            own, total = by_thread[thread]
+            lines.append("")
+            lines.append(f"Thread {thread}: {samples} samples")
+            lines.append(f"{'own %':>7} {'total %':>8}  function")
+            for name, count in own.most_common(limit):
+                lines.append(f"{100 * count / samples:7.1f} {100 * total[name] / samples:8.1f}  {name}")
+        return "\n".join(lines) + "\n"
+
+
+class MemoryTracker:
+    """Periodic tracemalloc snapshots, each diffed against the previous and the first"""
+
+    def __init__(self, interval=60.0, limit=15, frames=1):
+        self.interval = interval
+        self.limit = limit
+        self.frames = frames
+        self.first = None
+        self.previous = None
+        self.started_tracing = False
+        self.started = 0.0
+        self.report = io.StringIO()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.started_tracing = True
+        self.started = time.monotonic()
+        self.first = self.previous = self._snapshot()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="memory-tracker", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.take()
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.take()
+
+    def _snapshot(self):
+        # Leave out tracemalloc's and the profilers' own bookkeeping
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+
+    def take(self):
+        """Snapshot now and append both diffs to the report"""
+        snapshot = self._snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        write = self.report.write
+        write(f"=== {time.monotonic() - self.started:.0f} s: {current / 1024:.0f} KiB traced, "
+              f"peak {peak / 1024:.0f} KiB\n")
+        for title, base in (("since previous snapshot", self.previous), ("since run start", self.first)):
+            write(f"-- Growth {title}\n")
+            for stat in snapshot.compare_to(base, "lineno")[:self.limit]:
+                write(f"{stat}\n")
+        write("\n")
+        self.previous = snapshot
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.report.getvalue())
+
+
+class RunProfiler:
+    """Profiling of one run, written next to its results
+
+    mode "sample" samples every thread (executor, results writer, UI
+    timers, port I/O); "cprofile" traces every call of the executor
+    thread, which is exact but slows the run down. memory_interval turns
+    on tracemalloc diffs every so many seconds. start() and stop() must be
+    called on the executor thread; CommandEngine does so when its
+    "profiler" attribute is set.
+    """
+
+    def __init__(self, mode="sample", interval=0.005, memory_interval=None):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"unknown profile mode: {mode!r}")
+        self.mode = mode
+        self.interval = interval
+        self.memory_interval = memory_interval
+        self.profile = None
+        self.sampler = None
+        self.memory = None
+
+    def start(self):
+        if self.memory_interval:
+            self.memory = MemoryTracker(self.memory_interval)
+            self.memory.start()
+        if self.mode == "sample":
+            self.sampler = SamplingProfiler(self.interval)
+            self.sampler.start()
+        elif self.mode == "cprofile":
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.memory is not None:
+            self.memory.stop()
+
+    def save(self, run_dir):
+        """Write the profile files into the run directory; returns their names"""
+        saved = []
+        if self.profile is not None:
+            self.profile.dump_stats(run_dir.file("profile.pstats"))
+            text = io.StringIO()
+            pstats.Stats(self.profile, stream=text).sort_stats("cumulative").print_stats(60)
+            with open(run_dir.file("profile.txt"), "w", encoding="utf-8") as f:
+                f.write(text.getvalue())
+            saved += ["profile.pstats", "profile.txt"]
+        if self.sampler is not None:
+            self.sampler.save_folded(run_dir.file("profile_samples.folded"))
+            with open(run_dir.file("profile.txt"), "w", encoding="utf-8") as f:
+                f.write(self.sampler.summary())
+            saved += ["profile_samples.folded", "profile.txt"]
+        if self.memory is not None:
+            self.memory.save(run_dir.file("memory.txt"))
+            saved.append("memory.txt")
+        return saved
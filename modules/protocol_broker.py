@@ -0,0 +1,135 @@
+# pyserial URL handler for ports shared through the port broker:
+#
+#     broker://COM3
+#     broker:///dev/ttyUSB0?priority=2&exclusive=1
+#     broker://robot?port=loop://&socket=/tmp/robot_port_broker.sock
+#
+# Registered by modules.linkTest, so open_link() accepts these URLs like any local port.
+import threading
+import time
+import urllib.parse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError
+
+from modules.broker import BrokerClient, DEFAULT_ADDRESS, DEFAULT_PRIORITY, EMERGENCY_PRIORITY, RX, ERROR, REVOKED
+
+
+class Serial(SerialBase):
+    """A brokered port: reads see every RX byte, writes go through the broker's arbitration"""
+
+    def __init__(self, *args, **kwargs):
+        self.client = None
+        self.device = None
+        self.address = DEFAULT_ADDRESS
+        self.priority = DEFAULT_PRIORITY
+        self.lease = False  # Acquire exclusive write access on open
+        self.revoked = False
+        self.buffer = bytearray()
+        self.condition = threading.Condition()
+        self._cancelled = False
+        super().__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        self.from_url(self.port)
+        try:
+            self.client = BrokerClient(self.address, on_frame=self._on_frame)
+            self.client.open(self.device, self._baudrate)
+            if self.lease:
+                self.client.acquire(self.device, self.priority)
+        except OSError as e:
+            raise SerialException(f"Cannot reach the port broker at {self.address}: {e}")
+        self.is_open = True
+
+    def from_url(self, url):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != "broker":
+            raise SerialException(f'expected a string in the form "broker://<port>[?options]": {url!r}')
+        self.device = parts.netloc + parts.path
+        for option, values in urllib.parse.parse_qs(parts.query, True).items():
+            if option == "port":
+                self.device = values[0]
+            elif option == "socket":
+                self.address = values[0]
+            elif option == "tcp":
+                self.address = ("127.0.0.1", int(values[0]))
+            elif option == "priority":
+                self.priority = int(values[0])
+            elif option == "exclusive":
+                self.lease = values[0] not in ("0", "false", "")
+            else:
+                raise SerialException(f"unknown option: {option!r}")
+        if not self.device:
+            raise SerialException("broker:// URL has no port")
+
+    def _reconfigure_port(self):
+        pass  # The broker owns the line settings of the port
+
+    def _on_frame(self, kind, port, payload):
+        with self.condition:
+            if kind == RX:
+                self.buffer += payload
+            elif kind == REVOKED:
+                self.revoked = True
+            elif kind == ERROR and not port:
+                self.is_open = False  # Broker went away
+            self.condition.notify_all()
+
+    def close(self):
+        if self.client is not None:
+            try:
+                if not self.client.closed:
+                    self.client.close_port(self.device)
+            except (OSError, SerialException):
+                pass
+            self.client.close()
+            self.client = None
+        self.is_open = False
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return len(self.buffer)
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self.condition:
+            while len(self.buffer) < size and not self._cancelled and self.is_open:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            self._cancelled = False
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return data
+
+    def cancel_read(self):
+        with self.condition:
+            self._cancelled = True
+            self.condition.notify_all()
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = bytes(data)
+        # HALT must get through even while another client holds the port
+        priority = EMERGENCY_PRIORITY if data.strip() == b"HALT" else self.priority
+        self.client.send(self.device, data, priority)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self.condition:
+            self.buffer.clear()
+
+    def reset_output_buffer(self):
+        pass
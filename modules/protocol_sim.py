@@ -0,0 +1,99 @@
+# pyserial URL handler for a simulated robot in real time:
+#
+#     sim://robot
+#     sim://robot?delay=0.2&jitter=0.05&error_rate=0.01&seed=7
+#     sim://robot?responses=MOVE 1=_RDY@2.5,GRIP=_REP@0.8
+#
+# Registered by modules.linkTest, so agents, the GUI and tests can run without hardware.
+import threading
+import time
+import urllib.parse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError
+
+from modules.simulator import SimulatedRobot, parse_responses
+
+
+class Serial(SerialBase):
+    """SimulatedRobot behind the pyserial interface, with blocking reads"""
+
+    def __init__(self, *args, **kwargs):
+        self.robot = None
+        self.cancelled = threading.Event()
+        super().__init__(*args, **kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        self.robot = SimulatedRobot(**self.from_url(self.port))
+        self.is_open = True
+
+    def from_url(self, url):
+        """Return the SimulatedRobot arguments given in the URL"""
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != "sim":
+            raise SerialException(f'expected a string in the form "sim://<name>[?options]": {url!r}')
+        options = {}
+        try:
+            for option, values in urllib.parse.parse_qs(parts.query, True).items():
+                if option == "responses":
+                    options["responses"] = parse_responses(values[0])
+                elif option in ("delay", "jitter", "error_rate", "timeout_rate"):
+                    options["default_delay" if option == "delay" else option] = float(values[0])
+                elif option == "seed":
+                    options["seed"] = int(values[0])
+                else:
+                    raise ValueError(f"unknown option: {option!r}")
+        except ValueError as e:
+            raise SerialException(f"invalid sim:// URL {url!r}: {e}")
+        return options
+
+    def _reconfigure_port(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+        self.cancelled.set()
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self.robot.in_waiting
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        while self.robot.in_waiting < size and self.is_open:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            # Sleep until the next answer is due, the timeout, or cancel_read()
+            delay = deadline - now if deadline is not None else None
+            if self.robot.pending:
+                due = max(0.0, self.robot.pending[0][0] - now)
+                delay = due if delay is None else min(delay, due)
+            if self.cancelled.wait(delay if delay is None else max(delay, 0.0005)):
+                break
+        self.cancelled.clear()
+        return self.robot.read(size)
+
+    def cancel_read(self):
+        self.cancelled.set()
+
+    def write(self, data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self.robot.write(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        self.robot.reset_input_buffer()
+
+    def reset_output_buffer(self):
+        pass
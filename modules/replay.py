@@ -0,0 +1,273 @@
+import json
+import tempfile
+import time
+
+from serial import SerialException
+
+from modules.capture import CaptureReader, TX, RX
+from modules.engine import CommandEngine, EngineListener
+from modules.classifier import ResponseClassifier, load_rules
+
+
+class ReplaySerial:
+    """Serial-like connection that answers writes from a capture file
+
+    Each write is matched to the next recorded TX with the same bytes and
+    the RX chunks recorded after it are released: all at once when
+    realtime is False, otherwise at their recorded offsets from the TX
+    divided by speed. Recorded exchanges the engine does not repeat
+    (injected commands, polls) are skipped and counted. start and end
+    limit the replay to the records of one run.
+    """
+
+    def __init__(self, reader, realtime=False, speed=1.0, clock=time.perf_counter, start=None, end=None):
+        self.reader = reader
+        self.realtime = realtime
+        self.speed = speed
+        self.clock = clock
+        self.records = reader.records(start)
+        self.end = end
+        self.pending = None  # Record read ahead of the current exchange
+        self.released = []  # (release time, bytes) still to be read
+        self.buffer = bytearray()
+        self.is_open = True
+        self.port = f"replay://{reader.path}"
+        self.exchanges = 0
+        self.skipped = 0
+
+    def _next_record(self):
+        if self.pending is not None:
+            record, self.pending = self.pending, None
+            return record
+        record = next(self.records, None)
+        if record is not None and self.end is not None and record.offset >= self.end:
+            return None
+        return record
+
+    def write(self, data):
+        data = bytes(data)
+        if data == b"HALT\n":
+            return len(data)  # Stop requests need no recorded answer
+        while True:
+            record = self._next_record()
+            if record is None:
+                raise SerialException(f"Capture has no recorded exchange for {data!r}")
+            if record.direction == TX and record.payload == data:
+                break
+            if record.direction == TX:
+                self.skipped += 1
+
+        # Release the RX recorded between this TX and the next one
+        now = self.clock()
+        sent_ns = record.timestamp_ns
+        while True:
+            reply = self._next_record()
+            if reply is None:
+                break
+            if reply.direction != RX:
+                self.pending = reply
+                break
+            delay = (reply.timestamp_ns - sent_ns) / 1e9 / self.speed if self.realtime else 0
+            self.released.append((now + delay, bytes(reply.payload)))
+        self.exchanges += 1
+        return len(data)
+
+    def _collect(self):
+        if self.released:
+            now = self.clock()
+            while self.released and self.released[0][0] <= now:
+                self.buffer += self.released.pop(0)[1]
+
+    @property
+    def in_waiting(self):
+        self._collect()
+        return len(self.buffer)
+
+    def read(self, size=1):
+        self._collect()
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        self.buffer.clear()
+        self.released.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+class CapturedRun:
+    """The scripted steps of one run found in a capture"""
+
+    def __init__(self, start):
+        self.start = start  # Offset of the run's first record
+        self.end = None  # Offset of the next run's first record, None for the end of the capture
+        self.steps = {}
+        self.cycles = 0
+
+    def commands(self):
+        return [(step, self.steps[step]) for step in sorted(self.steps)]
+
+
+def capture_runs(reader):
+    """Split a capture into the runs it holds
+
+    A GUI capture covers a whole connection, so it can hold several runs.
+    A run ends at a HALT; a TX whose (cycle, step) goes backwards, or comes
+    again after traffic outside any run, starts the next one. The scripted
+    command of a step is the last TX recorded in it in cycle 1; anything
+    before it in the same step was injected or polled.
+    """
+    runs = []
+    current = None
+    last = None  # (cycle, step) of the last TX in a run
+    outside = False  # Traffic outside any run since then
+    for record in reader.records():
+        if not record.cycle or not record.step:
+            outside = True
+            continue
+        if record.direction != TX:
+            continue
+        position = (record.cycle, record.step)
+        command = bytes(record.payload).decode("utf-8", errors="replace").strip()
+        if current is None or position < last or outside and position == last:
+            if command == "HALT":
+                continue
+            if runs:
+                runs[-1].end = record.offset
+            current = CapturedRun(record.offset)
+            runs.append(current)
+        last, outside = position, False
+        if command == "HALT":
+            current = None
+            continue
+        current.cycles = max(current.cycles, record.cycle)
+        if record.cycle == 1:
+            current.steps[record.step] = command
+    return [run for run in runs if run.steps]
+
+
+def script_from_capture(reader, run=None):
+    """Return the CapturedRun to replay
+
+    run is the 1-based number of the run; it is required when the capture
+    holds more than one.
+    """
+    runs = capture_runs(reader)
+    if not runs:
+        raise ValueError(f"{reader.path} contains no scripted steps")
+    if run is None:
+        if len(runs) > 1:
+            raise ValueError(f"{reader.path} holds {len(runs)} runs; choose one with --run 1..{len(runs)}")
+        run = 1
+    if not 1 <= run <= len(runs):
+        raise ValueError(f"{reader.path} holds {len(runs)} runs, there is no run {run}")
+    return runs[run - 1]
+
+
+class ReplayListener(EngineListener):
+    """Collects the classification of every scripted step"""
+
+    def __init__(self, engine_getter, verbose=False):
+        self.engine_getter = engine_getter
+        self.verbose = verbose
+        self.steps = []
+
+    def on_message(self, text, direction):
+        if self.verbose:
+            print(f"{direction}: {text}")
+
+    def on_step(self, key, status, color, response=None):
+        if status != "WAITING":
+            engine = self.engine_getter()
+            self.steps.append([engine.current_cycle, key, status, response])
+
+
+def replay(capture_path, results_dir, realtime=False, speed=1.0, rules=None, cycles=None, verbose=False, run=None):
+    """Run the recorded script of one run through a CommandEngine fed by the capture
+
+    Returns (engine, listener, connection, seconds).
+    """
+    engine = None
+    listener = ReplayListener(lambda: engine, verbose)
+    with CaptureReader(capture_path) as reader:
+        captured = script_from_capture(reader, run)
+        commands, recorded_cycles = captured.commands(), captured.cycles
+        connection = ReplaySerial(reader, realtime=realtime, speed=speed, start=captured.start, end=captured.end)
+        engine = CommandEngine(listener, results_dir=results_dir)
+        engine.serial_conn = connection
+        engine.port = connection.port
+        engine.response_timeout = 1 if not realtime else 30
+        if not engine.begin_run(cycles or recorded_cycles, classifier=ResponseClassifier(rules)):
+            raise OSError(f"Cannot create a run directory in {results_dir}")
+        start = time.perf_counter()
+        engine.execute(commands, cycles or recorded_cycles)
+        seconds = time.perf_counter() - start
+    return engine, listener, connection, seconds
+
+
+def compare(expected, actual):
+    """Return human-readable differences between two lists of step results"""
+    differences = []
+    for index in range(max(len(expected), len(actual))):
+        old = expected[index] if index < len(expected) else None
+        new = actual[index] if index < len(actual) else None
+        if old != new:
+            differences.append(f"step {index + 1}: expected {old}, got {new}")
+    return differences
+
+
+def main():
+    """Replay a capture through the engine for regression checks or benchmarking"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a raw serial capture through the command engine")
+    parser.add_argument("capture", help="Path to a .cap file")
+    parser.add_argument("--realtime", action="store_true", help="Release responses at their recorded timing")
+    parser.add_argument("--speed", type=float, default=1.0, help="Timing multiplier for --realtime")
+    parser.add_argument("--cycles", type=int, help="Replay only this many cycles")
+    parser.add_argument("--run", type=int, help="Run to replay when the capture holds several (from 1)")
+    parser.add_argument("--rules", help="Classifier rules file (default: built-in rules)")
+    parser.add_argument("--results-dir", help="Write run outputs here (default: a temporary directory)")
+    parser.add_argument("--save", help="Save the step classifications as a JSON baseline")
+    parser.add_argument("--compare", help="Compare the step classifications against a JSON baseline")
+    parser.add_argument("--verbose", action="store_true", help="Print monitor messages")
+    args = parser.parse_args()
+
+    rules = load_rules(args.rules) if args.rules else None
+    results_dir = args.results_dir or tempfile.mkdtemp(prefix="replay_")
+    try:
+        engine, listener, connection, seconds = replay(args.capture, results_dir, args.realtime, args.speed,
+                                                       rules, args.cycles, args.verbose, args.run)
+    except ValueError as e:
+        parser.error(str(e))
+
+    steps = len(listener.steps)
+    print(f"Replayed {steps} steps in {seconds:.3f} s ({steps / seconds if seconds else 0:.0f} steps/s), "
+          f"outcome {engine.run_stats.outcome}, {connection.skipped} recorded exchanges skipped")
+    print(f"Run summary: {engine.run_stats.describe()}")
+    print(f"Outputs in {engine.run_dir.path}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(listener.steps, f, indent=1)
+        print(f"Saved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            differences = compare(json.load(f), listener.steps)
+        for line in differences[:50]:
+            print(line)
+        print(f"{len(differences)} differences from {args.compare}")
+        if differences:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+import html
+import math
+import time
+
+# Defaults of RunStatistics; runs take theirs from the classifier's rules
+PASS_STATUSES = ("SUCCESS",)
+FAIL_STATUSES = ("ERROR", "TIMEOUT", "HALT")
+ENGINE_FAIL_STATUSES = ("TIMEOUT", "HALT")  # Reported by the engine itself, whatever the rules
+
+
+class Welford:
+    """Online mean and variance (Welford's algorithm)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Combine with another accumulator (Chan's parallel formula)"""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "min": None if math.isinf(self.min) else self.min,
+                "max": None if math.isinf(self.max) else self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        welford = cls()
+        welford.count = data["count"]
+        welford.mean = data["mean"]
+        welford.m2 = data["m2"]
+        welford.min = math.inf if data["min"] is None else data["min"]
+        welford.max = -math.inf if data["max"] is None else data["max"]
+        return welford
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+
+class LatencySketch:
+    """Log-bucketed quantile sketch with bounded relative error
+
+    Values land in geometric buckets of width (1 + accuracy), so any
+    quantile is returned within accuracy (1% by default) of the true
+    value, in constant memory per decade of latency. Sketches merge by
+    adding bucket counts.
+    """
+
+    def __init__(self, accuracy=0.01, min_value=1e-6):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets = {}
+        self.count = 0
+
+    def add(self, value):
+        index = math.ceil(math.log(max(value, self.min_value)) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+
+    def to_dict(self):
+        return {"accuracy": (self.gamma - 1) / (self.gamma + 1), "min_value": self.min_value,
+                "buckets": [[index, count] for index, count in self.buckets.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["accuracy"], data["min_value"])
+        for index, count in data["buckets"]:
+            sketch.buckets[index] = count
+            sketch.count += count
+        return sketch
+
+    def quantile(self, q):
+        """Return the q-quantile (0..1), or None if the sketch is empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint of the bucket keeps the relative error symmetric
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class CommandStats:
+    """Online aggregates for one command"""
+
+    def __init__(self, command):
+        self.command = command
+        self.statuses = {}
+        self.latency = Welford()
+        self.sketch = LatencySketch()
+
+    def add(self, status, latency=None):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if latency is not None:
+            self.latency.add(latency)
+            self.sketch.add(latency)
+
+    def merge(self, other):
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.latency.merge(other.latency)
+        self.sketch.merge(other.sketch)
+
+    def to_dict(self):
+        return {"statuses": self.statuses, "latency": self.latency.to_dict(), "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, command, data):
+        stats = cls(command)
+        stats.statuses = dict(data["statuses"])
+        stats.latency = Welford.from_dict(data["latency"])
+        stats.sketch = LatencySketch.from_dict(data["sketch"])
+        return stats
+
+    @property
+    def total(self):
+        return sum(self.statuses.values())
+
+    def count(self, statuses):
+        """Number of steps that ended in one of statuses"""
+        return sum(self.statuses.get(status, 0) for status in statuses)
+
+
+SUMMARY_HEADERS = ["COMMAND", "TOTAL", "PASS", "FAIL", "UNKNOWN", "MEAN (ms)", "STDEV (ms)",
+                   "MIN (ms)", "P50 (ms)", "P90 (ms)", "P99 (ms)", "MAX (ms)"]
+
+
+def _ms(value):
+    return None if value is None or math.isinf(value) else round(value * 1000, 3)
+
+
+class RunStatistics:
+    """Per-command counts and latency statistics, updated as the run executes
+
+    Every update is O(1), and the report is built from the aggregates
+    alone, so its cost depends on the number of distinct commands rather
+    than on the number of steps executed. Steps count as passed or failed
+    by pass_statuses and fail_statuses, the rest as unknown.
+    """
+
+    def __init__(self, run_id=None, port=None, clock=time.time, pass_statuses=PASS_STATUSES,
+                 fail_statuses=FAIL_STATUSES):
+        self.run_id = run_id
+        self.port = port
+        self.clock = clock
+        self.pass_statuses = frozenset(pass_statuses)
+        self.fail_statuses = frozenset(fail_statuses)
+        self.started = clock()
+        self.finished = None
+        self.outcome = None
+        self.commands = {}
+
+    def record(self, command, status, latency=None):
+        stats = self.commands.get(command)
+        if stats is None:
+            stats = self.commands[command] = CommandStats(command)
+        stats.add(status, latency)
+
+    def merge(self, other):
+        """Fold another run's (or shard's) aggregates into this one"""
+        self.pass_statuses |= other.pass_statuses
+        self.fail_statuses |= other.fail_statuses
+        for command, stats in other.commands.items():
+            if command not in self.commands:
+                self.commands[command] = CommandStats(command)
+            self.commands[command].merge(stats)
+
+    def to_dict(self):
+        """JSON-friendly form, e.g. to send a shard's aggregates to a coordinator"""
+        return {"run_id": self.run_id, "port": self.port, "started": self.started, "finished": self.finished,
+                "outcome": self.outcome, "pass_statuses": sorted(self.pass_statuses),
+                "fail_statuses": sorted(self.fail_statuses),
+                "commands": {command: stats.to_dict() for command, stats in self.commands.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        statistics = cls(data["run_id"], data["port"], pass_statuses=data.get("pass_statuses", PASS_STATUSES),
+                         fail_statuses=data.get("fail_statuses", FAIL_STATUSES))
+        statistics.started = data["started"]
+        statistics.finished = data["finished"]
+        statistics.outcome = data["outcome"]
+        for command, stats in data["commands"].items():
+            statistics.commands[command] = CommandStats.from_dict(command, stats)
+        return statistics
+
+    def finish(self, outcome):
+        self.finished = self.clock()
+        self.outcome = outcome
+
+    @property
+    def total(self):
+        return sum(stats.total for stats in self.commands.values())
+
+    @property
+    def passed(self):
+        return sum(stats.count(self.pass_statuses) for stats in self.commands.values())
+
+    @property
+    def failed(self):
+        return sum(stats.count(self.fail_statuses) for stats in self.commands.values())
+
+    def summary_rows(self):
+        """Return one row of SUMMARY_HEADERS values per command"""
+        rows = []
+        for command, stats in self.commands.items():
+            latency = stats.latency
+            passed, failed = stats.count(self.pass_statuses), stats.count(self.fail_statuses)
+            rows.append([
+                command, stats.total, passed, failed, stats.total - passed - failed,
+                _ms(latency.mean) if latency.count else None,
+                _ms(latency.stdev) if latency.count else None,
+                _ms(latency.min),
+                _ms(stats.sketch.quantile(0.5)),
+                _ms(stats.sketch.quantile(0.9)),
+                _ms(stats.sketch.quantile(0.99)),
+                _ms(latency.max),
+            ])
+        return rows
+
+    def describe(self):
+        """One-line summary for the monitor"""
+        return (f"{self.total} steps: {self.passed} passed, {self.failed} failed, "
+                f"{self.total - self.passed - self.failed} unknown")
+
+    def write_html(self, path):
+        """Write a standalone HTML report"""
+        def fmt(value):
+            return "" if value is None else html.escape(str(value))
+
+        duration = (self.finished or self.clock()) - self.started
+        rows = []
+        for row in self.summary_rows():
+            css = "fail" if row[3] else ("pass" if row[2] == row[1] else "unknown")
+            rows.append(f'<tr class="{css}">' + "".join(f"<td>{fmt(value)}</td>" for value in row) + "</tr>")
+        headers = "".join(f"<th>{html.escape(header)}</th>" for header in SUMMARY_HEADERS)
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started))
+        document = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Run report {fmt(self.run_id)}</title>
+<style>
+body {{ font-family: Arial, sans-serif; margin: 20px; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #aaaaaa; padding: 4px 8px; text-align: right; }}
+th {{ background: #dddddd; }}
+td:first-child {{ text-align: left; }}
+tr.pass {{ background: #c0ffc0; }}
+tr.fail {{ background: #ffc0c0; }}
+tr.unknown {{ background: #ffffc0; }}
+</style>
+</head>
+<body>
+<h1>Run report</h1>
+<p>Run: {fmt(self.run_id)}<br>Port: {fmt(self.port)}<br>Started: {started}<br>
+Duration: {duration:.1f} s<br>Outcome: {fmt(self.outcome)}<br>{html.escape(self.describe())}</p>
+<table>
+<tr>{headers}</tr>
+{chr(10).join(rows)}
+</table>
+</body>
+</html>
+"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(document)
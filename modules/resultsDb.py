@@ -0,0 +1,363 @@
+import csv
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from modules.excelExport import ExcelExporter, STATUS_COLORS
+
+COLUMNS = ["run_id", "port", "cycle", "step", "command", "status", "response", "timestamp", "latency"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    port TEXT,
+    cycles INTEGER,
+    started REAL,
+    finished REAL,
+    outcome TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    port TEXT,
+    cycle INTEGER,
+    step INTEGER,
+    command TEXT,
+    status TEXT,
+    response TEXT,
+    timestamp REAL,
+    latency REAL
+);
+CREATE TABLE IF NOT EXISTS baselines (
+    port TEXT NOT NULL,
+    command TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated REAL,
+    PRIMARY KEY (port, command)
+);
+CREATE INDEX IF NOT EXISTS idx_results_run ON results (run_id, cycle, step);
+CREATE INDEX IF NOT EXISTS idx_results_port ON results (port, timestamp);
+CREATE INDEX IF NOT EXISTS idx_results_command ON results (command, status, timestamp);
+CREATE INDEX IF NOT EXISTS idx_results_status ON results (status, timestamp);
+"""
+
+
+def connect(path):
+    """Open the results database in WAL mode"""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ResultsDatabase:
+    """SQLite results backend with a batching writer thread
+
+    The executor only puts rows on a queue. The writer thread groups them
+    into transactions of up to batch_size rows, or whatever arrived within
+    flush_interval, so a slow disk never stalls a run. Queries open their
+    own connection, which WAL mode lets run alongside the writer.
+
+    A batch that fails because the database is locked or busy is kept and
+    retried every retry_interval while later rows queue up behind it, up
+    to max_attempts times (close_attempts once closing). Any other error
+    would fail again, so the batch's items are then written one by one and
+    the failing ones dropped. on_error(text) is told when retrying starts,
+    when it recovers, and about every item given up on.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=0.5, on_error=None, retry_interval=1.0,
+                 max_attempts=30, close_attempts=3):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_error = on_error
+        self.retry_interval = retry_interval
+        self.max_attempts = max_attempts
+        self.close_attempts = close_attempts
+        self.queue = queue.Queue()
+        self.writer_thread = None
+        self.closing = threading.Event()
+        self.error = None
+        self.dropped_rows = 0
+
+        conn = connect(path)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def start(self):
+        """Start the writer thread"""
+        if self.writer_thread is None or not self.writer_thread.is_alive():
+            self.closing.clear()
+            self.writer_thread = threading.Thread(target=self._writer, name="results-writer", daemon=True)
+            self.writer_thread.start()
+
+    def close(self):
+        """Write everything still queued and stop the writer thread"""
+        if self.writer_thread and self.writer_thread.is_alive():
+            self.closing.set()
+            self.queue.put(None)
+            self.writer_thread.join()
+        self.writer_thread = None
+
+    def begin_run(self, run_id, port, cycles, started=None):
+        self.queue.put(("run", (run_id, port, cycles, time.time() if started is None else started)))
+
+    def end_run(self, run_id, outcome, finished=None):
+        self.queue.put(("end", (time.time() if finished is None else finished, outcome, run_id)))
+
+    def log(self, run_id, port, cycle, step, command, status, response, timestamp=None, latency=None):
+        """Queue one result row"""
+        if timestamp is None:
+            timestamp = time.time()
+        self.queue.put(("row", (run_id, port, cycle, step, command, status, response, timestamp, latency)))
+
+    def save_baselines(self, port, baselines):
+        """Queue {command: baseline dict} of a port, replacing the stored ones"""
+        updated = time.time()
+        self.queue.put(("baselines", [(port or "", command, json.dumps(data), updated)
+                                      for command, data in baselines.items()]))
+
+    def _writer(self):
+        conn = connect(self.path)
+        try:
+            running = True
+            while running:
+                item = self.queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        running = False
+                        break
+                    batch.append(item)
+                self._write_until_done(conn, batch)
+        finally:
+            conn.close()
+
+    def _write_until_done(self, conn, batch):
+        """Write a batch, retrying while the database is locked or busy"""
+        attempts = 0
+        while True:
+            error = self._write_batch(conn, batch)
+            if error is None:
+                if attempts:
+                    self._report(f"Results database recovered after {attempts} failed attempts")
+                return
+            if not isinstance(error, sqlite3.OperationalError):
+                self._write_each(conn, batch)
+                return
+            attempts += 1
+            if attempts == 1:
+                self._report(f"Results database error: {str(error)}; retrying")
+            if attempts >= (self.close_attempts if self.closing.is_set() else self.max_attempts):
+                self._drop(batch, error)
+                return
+            self.closing.wait(self.retry_interval)
+
+    def _write_each(self, conn, batch):
+        """Write the items of a batch that failed permanently one by one, dropping those that fail"""
+        for item in batch:
+            error = self._write_batch(conn, [item])
+            if error is not None:
+                self._drop([item], error)
+
+    def _drop(self, batch, error):
+        rows = sum(1 for kind, _ in batch if kind == "row")
+        self.dropped_rows += rows
+        kinds = ", ".join(sorted({kind for kind, _ in batch}))
+        self._report(f"Results database error: {str(error)}; {len(batch)} items ({kinds}) not saved")
+
+    def _report(self, text):
+        if self.on_error:
+            try:
+                self.on_error(text)
+            except Exception:
+                pass  # Reporting must not stop the writer
+
+    def _write_batch(self, conn, batch):
+        """Write a batch in one transaction; returns the error, or None"""
+        try:
+            with conn:
+                rows = [values for kind, values in batch if kind == "row"]
+                for kind, values in batch:
+                    if kind == "run":
+                        conn.execute("INSERT OR REPLACE INTO runs (run_id, port, cycles, started) "
+                                     "VALUES (?, ?, ?, ?)", values)
+                if rows:
+                    conn.executemany(f"INSERT INTO results ({', '.join(COLUMNS)}) "
+                                     f"VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+                for kind, values in batch:
+                    if kind == "end":
+                        conn.execute("UPDATE runs SET finished = ?, outcome = ? WHERE run_id = ?", values)
+                    elif kind == "baselines":
+                        conn.executemany("INSERT OR REPLACE INTO baselines (port, command, data, updated) "
+                                         "VALUES (?, ?, ?, ?)", values)
+        except Exception as e:  # sqlite3.Error, or OverflowError and the like for a malformed row
+            self.error = e
+            return e
+        return None
+
+    def query(self, run_id=None, port=None, command=None, status=None, since=None, until=None, limit=None):
+        """Return result rows as dicts, oldest first
+
+        All filters are optional; since/until are epoch seconds.
+        """
+        sql, params = self._select(run_id, port, command, status, since, until, limit)
+        conn = connect(self.path)
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def iter_rows(self, **filters):
+        """Yield result rows as tuples in COLUMNS order without loading them all"""
+        sql, params = self._select(**filters)
+        conn = connect(self.path)
+        try:
+            yield from conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def _select(self, run_id=None, port=None, command=None, status=None, since=None, until=None, limit=None):
+        conditions = []
+        params = []
+        for column, value in (("run_id", run_id), ("port", port), ("command", command), ("status", status)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM results"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    def runs(self, port=None):
+        """Return the recorded runs, newest first"""
+        conn = connect(self.path)
+        try:
+            conn.row_factory = sqlite3.Row
+            if port is None:
+                rows = conn.execute("SELECT * FROM runs ORDER BY started DESC")
+            else:
+                rows = conn.execute("SELECT * FROM runs WHERE port = ? ORDER BY started DESC", (port,))
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def load_baselines(self, port):
+        """Return {command: baseline dict} of a port"""
+        conn = connect(self.path)
+        try:
+            rows = conn.execute("SELECT command, data FROM baselines WHERE port = ?", (port or "",))
+            return {command: json.loads(data) for command, data in rows}
+        finally:
+            conn.close()
+
+    def baselines(self, port=None, command=None):
+        """Return (port, command, JSON data) rows of the stored baselines"""
+        sql, params = self._baseline_filter("SELECT port, command, data FROM baselines", port, command)
+        conn = connect(self.path)
+        try:
+            return conn.execute(sql + " ORDER BY port, command", params).fetchall()
+        finally:
+            conn.close()
+
+    def delete_baselines(self, port=None, command=None):
+        """Delete stored baselines and return how many were deleted"""
+        sql, params = self._baseline_filter("DELETE FROM baselines", port, command)
+        conn = connect(self.path)
+        try:
+            with conn:
+                return conn.execute(sql, params).rowcount
+        finally:
+            conn.close()
+
+    def _baseline_filter(self, sql, port, command):
+        conditions = []
+        params = []
+        for column, value in (("port", port), ("command", command)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return sql, params
+
+    def export_csv(self, path, **filters):
+        """Export a slice of the results to CSV and return the row count"""
+        count = 0
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([column.upper() for column in COLUMNS])
+            for row in self.iter_rows(**filters):
+                writer.writerow(row)
+                count += 1
+        return count
+
+    def export_xlsx(self, path, **filters):
+        """Export a slice of the results to Excel and return the row count
+
+        Large slices are split across sheets and files at Excel's row limit.
+        """
+        exporter = ExcelExporter(path, headers=[column.upper() for column in COLUMNS])
+        status_index = COLUMNS.index("status")
+        for row in self.iter_rows(**filters):
+            exporter.append(row, STATUS_COLORS.get(row[status_index]))
+        exporter.close()
+        return exporter.rows
+
+def main():
+    """Export a slice of the results database from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query and export robot test results")
+    parser.add_argument("database", help="Path to the results database")
+    parser.add_argument("output", nargs="?", help="Export to this .csv or .xlsx file")
+    parser.add_argument("--run", dest="run_id", help="Run ID")
+    parser.add_argument("--port", help="Serial port")
+    parser.add_argument("--command", help="Command text")
+    parser.add_argument("--status", help="Status, e.g. ERROR")
+    parser.add_argument("--since", type=float, help="Epoch seconds")
+    parser.add_argument("--until", type=float, help="Epoch seconds")
+    parser.add_argument("--runs", action="store_true", help="List the recorded runs")
+    args = parser.parse_args()
+
+    db = ResultsDatabase(args.database)
+    if args.runs:
+        for run in db.runs(args.port):
+            print(f"{run['run_id']}  {run['port']}  cycles={run['cycles']}  {run['outcome'] or 'running'}")
+        return
+
+    filters = {key: getattr(args, key) for key in ("run_id", "port", "command", "status", "since", "until")}
+    if args.output is None:
+        for row in db.iter_rows(**filters):
+            print("\t".join("" if value is None else str(value) for value in row))
+    elif args.output.lower().endswith(".xlsx"):
+        print(f"Exported {db.export_xlsx(args.output, **filters)} rows to {args.output}")
+    else:
+        print(f"Exported {db.export_csv(args.output, **filters)} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import contextlib
+import datetime
+import os
+import re
+import uuid
+
+
+def new_run_id():
+    """Return a run ID that is unique across app instances on the station"""
+    return f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def safe_port_name(port):
+    """Turn "COM3", "/dev/ttyUSB0" or "sim://robot?delay=1" into "COM3" / "ttyUSB0" / "robot" """
+    name = (port or "").split("?", 1)[0].rstrip("/")
+    return re.sub(r"[^A-Za-z0-9_-]", "", os.path.basename(name)) or "noport"
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    """Yield a temporary path next to path and rename it over path on success
+
+    Readers never see a half-written file, and a crash leaves only a
+    ".part" file behind instead of a corrupt result.
+    """
+    temp = f"{path}.part"
+    try:
+        yield temp
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp)
+        raise
+    os.replace(temp, path)
+
+
+class RunDirectory:
+    """Output directory of a single run: <base>/<run_id>_<port>/
+
+    Every run gets its own directory, so several app instances on one
+    station never write to the same files.
+    """
+
+    def __init__(self, base_dir, run_id, port):
+        self.run_id = run_id
+        self.port = port
+        self.path = os.path.join(base_dir, f"{run_id}_{safe_port_name(port)}")
+        os.makedirs(self.path, exist_ok=False)
+
+    def file(self, name):
+        """Return the final path of a file in the run directory"""
+        return os.path.join(self.path, name)
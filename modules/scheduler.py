@@ -0,0 +1,149 @@
+import heapq
+import itertools
+import math
+import threading
+
+from modules.clock import SystemClock
+
+
+class Timer:
+    """Handle of a scheduled callback; cancel() is O(1)"""
+
+    __slots__ = ("when", "interval", "callback", "args", "cancelled")
+
+    def __init__(self, when, interval, callback, args):
+        self.when = when
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class DeadlineScheduler:
+    """One thread that runs the GUI's background timers (elapsed time, monitor polling)
+
+    Deadlines live in a binary heap keyed on clock.monotonic(), so adding
+    one costs O(log n) and cancelling one just marks it (the heap is
+    compacted when cancelled entries outnumber live ones). The thread
+    sleeps until the earliest deadline, so with nothing due it does not
+    wake up at all. Callbacks run on the scheduler thread and must not
+    block; an exception in one is passed to on_error and does not stop
+    the others. With a VirtualClock, drive it with run_due() instead of
+    start().
+    """
+
+    def __init__(self, clock=None, on_error=None):
+        self.clock = clock or SystemClock()
+        self.on_error = on_error
+        self.heap = []
+        self.seq = itertools.count()  # Keeps equal deadlines in FIFO order
+        self.cancelled = 0
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.lag = 0.0  # How late the last callback started, in seconds
+
+    def call_at(self, when, callback, *args):
+        """Run callback(*args) at monotonic time when"""
+        return self._push(Timer(when, None, callback, args))
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) after delay seconds"""
+        return self._push(Timer(self.clock.monotonic() + delay, None, callback, args))
+
+    def call_every(self, interval, callback, *args, first=None):
+        """Run callback(*args) every interval seconds until cancelled
+
+        Ticks keep to the original grid: a tick that is late, even by
+        several intervals, runs once and the next one is at the following
+        grid point.
+        """
+        delay = interval if first is None else first
+        return self._push(Timer(self.clock.monotonic() + delay, interval, callback, args))
+
+    def cancel(self, timer):
+        if timer is not None and not timer.cancelled:
+            timer.cancel()
+            with self.condition:
+                self.cancelled += 1
+                if self.cancelled > len(self.heap) // 2:
+                    self.heap = [entry for entry in self.heap if not entry[2].cancelled]
+                    heapq.heapify(self.heap)
+                    self.cancelled = 0
+
+    def _push(self, timer):
+        with self.condition:
+            heapq.heappush(self.heap, (timer.when, next(self.seq), timer))
+            if self.heap[0][2] is timer:
+                self.condition.notify()  # New earliest deadline
+        self.clock.wake_at(timer.when)
+        return timer
+
+    def __len__(self):
+        return max(0, len(self.heap) - self.cancelled)
+
+    def next_deadline(self):
+        """Monotonic time of the earliest pending deadline, or None"""
+        with self.condition:
+            while self.heap and self.heap[0][2].cancelled:
+                heapq.heappop(self.heap)
+                self.cancelled = max(0, self.cancelled - 1)
+            return self.heap[0][0] if self.heap else None
+
+    def run_due(self):
+        """Run every callback that is due now; returns how many ran"""
+        count = 0
+        now = self.clock.monotonic()
+        while True:
+            with self.condition:
+                if not self.heap or self.heap[0][0] > now:
+                    return count
+                when, seq, timer = heapq.heappop(self.heap)
+                if timer.cancelled:
+                    self.cancelled = max(0, self.cancelled - 1)
+                    continue
+                if timer.interval is None:
+                    timer.cancelled = True  # Fired; a later cancel() is a no-op
+            self.lag = self.clock.monotonic() - when
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(timer, e)
+            count += 1
+            if timer.interval is not None and not timer.cancelled:
+                # Skip the grid points already passed, so a late timer fires once and keeps its phase
+                timer.when += timer.interval * (math.floor((now - timer.when) / timer.interval) + 1)
+                self._push(timer)
+
+    def start(self):
+        """Start the scheduler thread"""
+        if self.thread is None or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def _run(self):
+        while self.running:
+            self.run_due()
+            with self.condition:
+                if not self.running:
+                    return
+                deadline = self.heap[0][0] if self.heap else None
+                if deadline is None:
+                    self.condition.wait()
+                else:
+                    delay = deadline - self.clock.monotonic()
+                    if delay > 0:
+                        self.condition.wait(delay)
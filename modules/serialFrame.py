@@ -33,12 +33,20 @@ class SerialConnectionFrame(ttk.LabelFrame):
         self.baudLabel.pack(side=LEFT, padx=(0, 5))
         
         self.baudRateVar = tk.StringVar()
+        # Editable so custom rates can be typed in
         self.baudRateCombo = ttk.Combobox(self.container, textvariable=self.baudRateVar, 
-                                         state="readonly", width=10)
-        self.baudRateCombo['values'] = ['9600', '19200', '38400', '57600', '115200']
+                                         width=10)
+        self.baudRateCombo['values'] = ['9600', '19200', '38400', '57600', '115200',
+                                        '230400', '460800', '921600']
         self.baudRateCombo.current(0)  # Set default to 9600
         self.baudRateCombo.pack(side=LEFT, padx=(0, 10))
         
+        # Low latency mode (FTDI adapters on Linux)
+        self.lowLatencyVar = tk.BooleanVar(value=False)
+        self.lowLatencyCheck = ttk.Checkbutton(self.container, text="Low latency",
+                                               variable=self.lowLatencyVar)
+        self.lowLatencyCheck.pack(side=LEFT, padx=(0, 10))
+        
         # Buttons container
         self.btnContainer = ttk.Frame(self.container)
         self.btnContainer.pack(side=RIGHT)
@@ -53,6 +61,12 @@ class SerialConnectionFrame(ttk.LabelFrame):
                                     image=self.connect_icon, compound=TOP)
         self.connectBtn.pack(side=LEFT, padx=5)
         
+        # Link test button
+        self.linkTestVar = tk.StringVar(value="Link Test")
+        self.linkTestBtn = ttk.Button(self.btnContainer, textvariable=self.linkTestVar,
+                                      image=self.refresh_icon, compound=TOP)
+        self.linkTestBtn.pack(side=LEFT, padx=5)
+        
     def _load_icon(self, path, size=(14, 14)):
         """Load an icon from path and resize it"""
         try:
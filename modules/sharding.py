@@ -0,0 +1,288 @@
+import collections
+import os
+import threading
+import time
+
+from modules.engine import CommandEngine, EngineListener
+from modules.classifier import ResponseClassifier
+from modules.linkTest import open_link
+from modules.report import RunStatistics
+from modules.runStorage import RunDirectory, atomic_path, new_run_id, safe_port_name
+
+
+class ShardScheduler:
+    """Hands out the cycle numbers of one logical run to several units
+
+    Units pull chunks of consecutive cycles. Chunks shrink as the run
+    nears its end (remaining / (2 * active units)), and once nothing is
+    queued an idle unit takes the second half of the largest chunk still
+    held by another, so a slow unit cannot hold up the end of the run.
+    A unit that fails is retired: its unstarted cycles, including one it
+    pulled but never began, go back to the queue for the others.
+    """
+
+    def __init__(self, total_cycles, units, min_chunk=1):
+        self.total_cycles = total_cycles
+        self.min_chunk = min_chunk
+        self.queue = collections.deque([[1, total_cycles + 1]] if total_cycles > 0 else [])  # [next, end)
+        self.held = {}  # unit -> [next, end) it is working through
+        self.pulled = {}  # unit -> cycle handed out but not yet started
+        self.completed = collections.Counter()  # unit -> cycles started
+        self.active = set(units)
+        self.lock = threading.Lock()
+
+    def next_cycle(self, unit):
+        """Return the next cycle for unit, or None when the run is done"""
+        with self.lock:
+            if unit not in self.active:
+                return None
+            block = self.held.get(unit)
+            if block is None or block[0] >= block[1]:
+                block = self.held[unit] = self._take()
+                if block is None:
+                    del self.held[unit]
+                    return None
+            cycle = block[0]
+            block[0] += 1
+            self.pulled[unit] = cycle
+            return cycle
+
+    def _take(self):
+        remaining = self.remaining_locked()
+        if self.queue:
+            start, end = self.queue[0]
+            size = max(self.min_chunk, remaining // (2 * max(1, len(self.active))))
+            if start + size >= end:
+                self.queue.popleft()
+                return [start, end]
+            self.queue[0][0] = start + size
+            return [start, start + size]
+
+        # Nothing queued: take half of the largest block another unit still holds
+        victim = max(self.held.values(), key=lambda block: block[1] - block[0], default=None)
+        if victim is None or victim[1] - victim[0] < 2:
+            return None
+        middle = victim[0] + (victim[1] - victim[0]) // 2
+        block = [middle, victim[1]]
+        victim[1] = middle
+        return block
+
+    def started(self, unit, cycle):
+        """Called when unit actually begins a cycle it pulled"""
+        with self.lock:
+            if self.pulled.get(unit) == cycle:
+                del self.pulled[unit]
+                self.completed[unit] += 1
+
+    def cycles(self, unit):
+        """Iterable of cycle numbers for CommandEngine.execute()"""
+        while True:
+            cycle = self.next_cycle(unit)
+            if cycle is None:
+                return
+            yield cycle
+
+    def retire(self, unit):
+        """Take a failed unit out of the run and requeue its unstarted cycles"""
+        with self.lock:
+            self.active.discard(unit)
+            block = self.held.pop(unit, None)
+            if block is not None and block[0] < block[1]:
+                self.queue.append(block)
+            cycle = self.pulled.pop(unit, None)
+            if cycle is not None:
+                self.queue.append([cycle, cycle + 1])
+
+    def remaining_locked(self):
+        return (sum(end - start for start, end in self.queue)
+                + sum(end - start for start, end in self.held.values()) + len(self.pulled))
+
+    def remaining(self):
+        """Cycles not yet started by any unit"""
+        with self.lock:
+            return self.remaining_locked()
+
+
+class UnitListener(EngineListener):
+    """Forwards one unit's progress to the sharded run's listener"""
+
+    def __init__(self, run, unit, port):
+        self.run = run
+        self.unit = unit
+        self.port = port
+
+    def on_message(self, text, direction):
+        if direction == "ERR":
+            self.run.errors[self.unit] = text
+        self.run.listener.on_message(f"[{self.port}] {text}", direction)
+
+    def on_cycle(self, cycle, cycles):
+        self.run.scheduler.started(self.unit, cycle)
+        self.run.cycle_started()
+
+    def on_step(self, key, status, color, response=None):
+        self.run.listener.on_step(key, status, color, response)
+
+    def on_result(self, cycle, step, command, status, response, timestamp, latency):
+        self.run.listener.on_result(cycle, step, command, status, response, timestamp, latency)
+
+
+class ShardedRun:
+    """Runs N cycles of one script across M identical robots as one logical run
+
+    Every unit gets its own engine and run directory, all under the same
+    run ID, and writes its rows to the shared results database with its
+    own port and the global cycle number. When all units are done the
+    per-unit statistics are merged into one report. A unit whose run
+    stops (error rule, timeout, lost port) is retired and the others take
+    over its remaining cycles; the run is "incomplete" only if no unit is
+    left to finish them.
+    """
+
+    def __init__(self, ports, commands, cycles, results_dir, results_db=None, listener=None,
+                 rules=None, min_chunk=1, baudrate=115200):
+        self.ports = list(ports)
+        self.commands = list(enumerate(commands, 1))
+        self.cycles = cycles
+        self.results_dir = results_dir
+        self.results_db = results_db
+        self.listener = listener or EngineListener()
+        self.rules = rules
+        self.baudrate = baudrate
+        self.scheduler = ShardScheduler(cycles, range(len(self.ports)), min_chunk)
+        self.run_id = new_run_id()
+        self.engines = {}
+        self.outcomes = {}
+        self.errors = {}  # Last error of each unit, shown when it is retired
+        self.statistics = RunStatistics(self.run_id, "+".join(self.ports))
+        self.run_dir = None
+        self.started_cycles = 0
+        self.lock = threading.Lock()
+
+    def cycle_started(self):
+        with self.lock:
+            self.started_cycles += 1
+            count = self.started_cycles
+        self.listener.on_cycle(count, self.cycles)
+
+    def run(self):
+        """Run to completion and return the outcome"""
+        self.listener.on_message(f"Sharded run {self.run_id}: {self.cycles} cycles on {len(self.ports)} units",
+                                 "SYS")
+        if self.results_db:
+            self.results_db.begin_run(self.run_id, self.statistics.port, self.cycles)
+        threads = []
+        for unit, port in enumerate(self.ports):
+            thread = threading.Thread(target=self._run_unit, args=(unit, port), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        for engine in self.engines.values():
+            if engine.run_stats is not None:
+                self.statistics.merge(engine.run_stats)
+        outcome = "completed" if self.scheduler.remaining() == 0 else "incomplete"
+        self.statistics.finish(outcome)
+        if self.results_db:
+            self.results_db.end_run(self.run_id, outcome)
+        self.write_report()
+        self.listener.on_run_finished(outcome)
+        return outcome
+
+    def _run_unit(self, unit, port):
+        engine = CommandEngine(UnitListener(self, unit, port), results_dir=self.results_dir,
+                               results_db=self.results_db)
+        engine.port = port
+        try:
+            engine.serial_conn = open_link(port, self.baudrate, timeout=1)
+        except Exception as e:
+            self.errors[unit] = f"Cannot open: {str(e)}"
+            self.listener.on_message(f"[{port}] Cannot open: {str(e)}", "ERR")
+            self.outcomes[unit] = "error"
+            self.scheduler.retire(unit)
+            return
+        self.engines[unit] = engine
+        try:
+            # Units may share a port name (sim:// URLs), so the unit index is part of the directory name
+            if not engine.begin_run(self.cycles, classifier=ResponseClassifier(self.rules), run_id=self.run_id,
+                                    label=f"{safe_port_name(port)}_{unit}"):
+                self.outcomes[unit] = "error"
+                return
+            self.outcomes[unit] = engine.execute(self.commands, self.scheduler.cycles(unit))
+        finally:
+            if self.outcomes.get(unit) != "completed":
+                self.scheduler.retire(unit)
+                reason = f": {self.errors[unit]}" if unit in self.errors else ""
+                self.listener.on_message(
+                    f"[{port}] Unit retired ({self.outcomes.get(unit)}{reason}), "
+                    f"{self.scheduler.remaining()} cycles left for the others", "ERR")
+            engine.serial_conn.close()
+
+    def stop(self):
+        for engine in list(self.engines.values()):
+            engine.stop()
+
+    def unit_rows(self):
+        """(port, outcome, cycles run, last error) per unit"""
+        return [(port, self.outcomes.get(unit), self.scheduler.completed[unit], self.errors.get(unit))
+                for unit, port in enumerate(self.ports)]
+
+    def write_report(self):
+        try:
+            self.run_dir = RunDirectory(self.results_dir, self.run_id, "sharded")
+            with atomic_path(self.run_dir.file("report.html")) as temp:
+                self.statistics.write_html(temp)
+            self.listener.on_message(f"Merged report saved to {self.run_dir.file('report.html')}", "SYS")
+        except Exception as e:
+            self.listener.on_message(f"Report error: {str(e)}", "ERR")
+
+
+def main():
+    """Shard one script's cycles across several identical robots"""
+    import argparse
+    import tempfile
+
+    from modules.classifier import load_rules
+    from modules.engine import PrintListener
+    from modules.resultsDb import ResultsDatabase
+
+    parser = argparse.ArgumentParser(description="Split a run's cycles across identical robots")
+    parser.add_argument("--port", action="append", required=True, help="A unit's port (repeat for each unit)")
+    parser.add_argument("--commands", required=True, help='Comma-separated commands, e.g. "MOVE 1,GRIP,MOVE 0"')
+    parser.add_argument("--cycles", type=int, required=True)
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--rules", help="Classifier rules file")
+    parser.add_argument("--db", help="Results database (default: none)")
+    parser.add_argument("--results-dir", help="Where runs are stored (default: a temporary directory)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    db = None
+    if args.db:
+        db = ResultsDatabase(args.db)
+        db.start()
+    listener = PrintListener() if args.verbose else EngineListener()
+    commands = [command.strip() for command in args.commands.split(",") if command.strip()]
+    run = ShardedRun(args.port, commands, args.cycles, args.results_dir or tempfile.mkdtemp(prefix="shard_"),
+                     db, listener, rules=load_rules(args.rules) if args.rules else None, baudrate=args.baud)
+    start = time.perf_counter()
+    try:
+        outcome = run.run()
+    except KeyboardInterrupt:
+        run.stop()
+        raise
+    finally:
+        if db:
+            db.close()
+    elapsed = time.perf_counter() - start
+
+    for port, unit_outcome, count, error in run.unit_rows():
+        reason = f" ({error})" if unit_outcome != "completed" and error else ""
+        print(f"{port}: {count} cycles, {unit_outcome}{reason}")
+    print(f"Run {run.run_id} {outcome} in {elapsed:.1f} s: {run.statistics.describe()}")
+    print(f"Outputs in {os.path.dirname(run.run_dir.path) if run.run_dir else args.results_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import random
+import time
+
+from modules.clock import SystemClock, VirtualClock
+from modules.engine import CommandEngine, EngineListener
+from modules.profiling import PROFILE_MODES, RunProfiler
+
+
+class SimulatedRobot:
+    """Serial-like robot that answers each command after a delay
+
+    responses maps a command to (response, delay seconds); other commands
+    get default_response after default_delay. error_rate and timeout_rate
+    make a fraction of the answers "_ERR" or missing, drawn from a seeded
+    generator so a failing run can be reproduced. Answers become readable
+    when the clock reaches their due time, and the due time is passed to
+    clock.wake_at() so a VirtualClock jumps straight to it.
+    """
+
+    def __init__(self, clock=None, responses=None, default_response="_RDY", default_delay=0.05,
+                 jitter=0.0, error_rate=0.0, timeout_rate=0.0, seed=0):
+        self.clock = clock or SystemClock()
+        self.responses = responses or {}
+        self.default_response = default_response
+        self.default_delay = default_delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.random = random.Random(seed)
+        self.pending = []  # (due time, bytes), in due order
+        self.buffer = bytearray()
+        self.is_open = True
+        self.port = "sim://robot"
+        self.received = 0
+
+    def write(self, data):
+        command = bytes(data).decode("utf-8", errors="replace").strip()
+        self.received += 1
+        if command == "HALT":
+            self.pending.clear()
+            return len(data)
+        response, delay = self.responses.get(command, (self.default_response, self.default_delay))
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        roll = self.random.random()
+        if roll < self.timeout_rate:
+            return len(data)  # Robot never answers
+        if roll < self.timeout_rate + self.error_rate:
+            response = "_ERR"
+        due = self.clock.monotonic() + delay
+        self.pending.append((due, f"{response}\n".encode()))
+        self.pending.sort(key=lambda item: item[0])
+        self.clock.wake_at(due)
+        return len(data)
+
+    def _collect(self):
+        now = self.clock.monotonic()
+        while self.pending and self.pending[0][0] <= now:
+            self.buffer += self.pending.pop(0)[1]
+
+    @property
+    def in_waiting(self):
+        self._collect()
+        return len(self.buffer)
+
+    def read(self, size=1):
+        self._collect()
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        self.buffer.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def parse_responses(text):
+    """Parse "CMD=RESPONSE@SECONDS, ..." into a responses dict"""
+    responses = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        command, _, answer = item.partition("=")
+        response, _, delay = answer.partition("@")
+        responses[command.strip()] = (response.strip() or "_RDY", float(delay) if delay else 0.05)
+    return responses
+
+
+def main():
+    """Run a script against a simulated robot, in virtual time by default"""
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Run a command script against a simulated robot")
+    parser.add_argument("commands", help='Comma-separated commands, e.g. "MOVE 1,GRIP,MOVE 0"')
+    parser.add_argument("--cycles", type=int, default=1000)
+    parser.add_argument("--responses", default="", help='Per-command answers, e.g. "MOVE 1=_RDY@2.5,GRIP=_REP@0.8"')
+    parser.add_argument("--delay", type=float, default=0.05, help="Delay of other answers in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra delay up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=30, help="Response timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--real-time", action="store_true", help="Use the system clock instead of virtual time")
+    parser.add_argument("--results-dir", help="Write run outputs here (default: a temporary directory)")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default="off", help="Profile the run")
+    parser.add_argument("--memory", type=float, metavar="SECONDS",
+                        help="Diff tracemalloc snapshots taken this often (wall-clock seconds)")
+    args = parser.parse_args()
+
+    clock = SystemClock() if args.real_time else VirtualClock()
+    robot = SimulatedRobot(clock, parse_responses(args.responses), default_delay=args.delay, jitter=args.jitter,
+                           error_rate=args.error_rate, timeout_rate=args.timeout_rate, seed=args.seed)
+    engine = CommandEngine(EngineListener(), results_dir=args.results_dir or tempfile.mkdtemp(prefix="sim_"),
+                           clock=clock)
+    engine.serial_conn = robot
+    engine.port = robot.port
+    engine.response_timeout = args.timeout
+    if args.profile != "off" or args.memory:
+        engine.profiler = RunProfiler(args.profile, memory_interval=args.memory)
+    commands = [(i + 1, command.strip()) for i, command in enumerate(args.commands.split(",")) if command.strip()]
+
+    engine.begin_run(args.cycles)
+    start_simulated = clock.monotonic()
+    start = time.perf_counter()
+    outcome = engine.execute(commands, args.cycles)
+    elapsed = time.perf_counter() - start
+    simulated = clock.monotonic() - start_simulated
+
+    print(f"Outcome {outcome}: {engine.run_stats.describe()}")
+    print(f"Simulated {simulated / 3600:.2f} h in {elapsed:.2f} s ({simulated / elapsed if elapsed else 0:.0f}x)")
+    print(f"Outputs in {engine.run_dir.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import array
+import csv
+import math
+import os
+import re
+import time
+
+# First number in a response, e.g. "TEMP_REP 41.5" -> 41.5
+NUMBER_PATTERN = re.compile(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?")
+
+
+def parse_poll_spec(text):
+    """Parse "COMMAND:SECONDS, COMMAND:SECONDS" into (command, interval) pairs"""
+    queries = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        command, sep, interval = part.rpartition(":")
+        if not sep or not command.strip():
+            raise ValueError(f"Invalid poll entry '{part}', expected COMMAND:SECONDS")
+        interval = float(interval)
+        if not math.isfinite(interval) or interval <= 0:
+            raise ValueError(f"Poll interval for '{command.strip()}' must be a number greater than 0")
+        queries.append((command.strip(), interval))
+    return queries
+
+
+class PollQuery:
+    """A command sent periodically to sample a telemetry value"""
+
+    def __init__(self, index, command, interval, now):
+        self.index = index
+        self.command = command
+        self.interval = interval
+        self.next_due = now  # First sample as soon as the run starts
+        self.sent = 0
+        self.coalesced = 0  # Polls skipped because the previous one was late
+
+
+class TelemetryBuffer:
+    """Fixed-capacity ring buffer of (time, query, value) samples
+
+    Samples are stored in typed arrays (8 + 2 + 8 bytes each) rather than
+    Python objects, so a long soak run with a high poll rate stays small.
+    When full, the whole buffer is appended to spill files next to
+    spill_path and memory starts over, so no sample is lost. Without
+    spill_path (or once spilling failed) the oldest samples are
+    overwritten and counted in dropped.
+    """
+
+    def __init__(self, capacity=100000, spill_path=None):
+        self.capacity = capacity
+        self.times = array.array('d', bytes(8 * capacity))
+        self.queries = array.array('H', bytes(2 * capacity))
+        self.values = array.array('d', bytes(8 * capacity))
+        self.count = 0  # Total samples ever appended
+        self.spill_path = spill_path
+        self.spilled = 0  # Oldest samples, moved to the spill files
+        self.dropped = 0  # Overwritten samples
+        self.spill_error = None
+
+    def __len__(self):
+        return min(self.count - self.spilled, self.capacity)
+
+    def append(self, timestamp, query_index, value):
+        if self.count - self.spilled >= self.capacity:
+            if self.spill_path is None or not self._spill():
+                self.dropped += 1
+        slot = (self.count - self.spilled) % self.capacity
+        self.times[slot] = timestamp
+        self.queries[slot] = query_index
+        self.values[slot] = value
+        self.count += 1
+
+    def _spill_files(self):
+        return [(f"{self.spill_path}.{name}.{column.typecode}", column)
+                for name, column in (("time", self.times), ("query", self.queries), ("value", self.values))]
+
+    def _spill(self):
+        """Append the full buffer to the spill files; False if that fails"""
+        try:
+            for path, column in self._spill_files():
+                with open(path, "ab") as f:
+                    column.tofile(f)
+        except OSError as e:
+            self.spill_error = e
+            self.spill_path = None  # Overwrite from now on
+            return False
+        self.spilled = self.count
+        return True
+
+    def clear(self):
+        self.count = self.spilled = self.dropped = 0
+        if self.spill_path:
+            for path, _ in self._spill_files():
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _spilled_samples(self, chunk=65536):
+        if not self.spilled:
+            return
+        files = [(open(path, "rb"), column.typecode) for path, column in self._spill_files()]
+        try:
+            remaining = self.spilled
+            while remaining:
+                size = min(remaining, chunk)
+                columns = []
+                for f, typecode in files:
+                    column = array.array(typecode)
+                    column.fromfile(f, size)
+                    columns.append(column)
+                yield from zip(*columns)
+                remaining -= size
+        finally:
+            for f, _ in files:
+                f.close()
+
+    def samples(self, query_index=None):
+        """Yield (time, query, value) in chronological order, spilled ones first"""
+        for sample in self._spilled_samples():
+            if query_index is None or sample[1] == query_index:
+                yield sample
+        size = len(self)
+        start = self.count - size
+        for n in range(start, self.count):
+            slot = (n - self.spilled) % self.capacity
+            if query_index is None or self.queries[slot] == query_index:
+                yield self.times[slot], self.queries[slot], self.values[slot]
+
+
+class TelemetryPoller:
+    """Interleaves periodic query commands with the scripted steps
+
+    The executor calls due_queries() at every step boundary. A query that
+    fell behind (e.g. during a long robot move) is sent once and then
+    rescheduled from the current time, instead of replaying every missed
+    interval back to back.
+    """
+
+    def __init__(self, queries=(), capacity=100000, clock=time.monotonic, spill_path=None):
+        self.clock = clock
+        self.start_time = clock()
+        self.queries = [PollQuery(i, command, interval, self.start_time)
+                        for i, (command, interval) in enumerate(queries)]
+        self.buffer = TelemetryBuffer(capacity, spill_path)
+
+    def due_queries(self):
+        """Return the queries due now and schedule their next poll"""
+        now = self.clock()
+        due = []
+        for query in self.queries:
+            if query.next_due > now:
+                continue
+            due.append(query)
+            query.sent += 1
+            query.next_due += query.interval
+            if query.next_due <= now:
+                # Missed one or more intervals: coalesce into this poll
+                missed = int((now - query.next_due) // query.interval) + 1
+                query.coalesced += missed
+                query.next_due += missed * query.interval
+        return due
+
+    def record(self, query, response_str):
+        """Store the first number in a poll response (NaN if there is none)"""
+        match = NUMBER_PATTERN.search(response_str)
+        value = float(match.group()) if match else math.nan
+        self.buffer.append(self.clock() - self.start_time, query.index, value)
+        return value
+
+    def save_csv(self, path):
+        """Write the buffered samples to a CSV file"""
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["SECONDS", "COMMAND", "VALUE"])
+            for timestamp, query_index, value in self.buffer.samples():
+                writer.writerow([f"{timestamp:.3f}", self.queries[query_index].command, value])
@@ -0,0 +1,222 @@
+import array
+import json
+import os
+import re
+import time
+import zlib
+
+from modules.runStorage import atomic_path
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, array.array is used without it
+    np = None
+
+# Matches "KEY=VALUE" / "KEY:VALUE" pairs such as "ENC=10234 TEMP:41.5"
+KEY_VALUE_PATTERN = r"([A-Za-z_]\w*)\s*[=:]\s*([-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"
+
+TYPECODES = {"int": "q", "float": "d"}
+
+
+class Extractor:
+    """Pulls one typed numeric field out of responses
+
+    Args:
+        name (str): Field name, or None to take it from the first group
+        pattern (str): Regex whose last group is the numeric value
+        type (str): "int" or "float"
+        command (str): Regex the command must match, or None for all commands
+    """
+
+    def __init__(self, name, pattern, type="float", command=None):
+        if type not in TYPECODES:
+            raise ValueError(f"Unknown extractor type '{type}', expected int or float")
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.type = type
+        self.typecode = TYPECODES[type]
+        self.command = re.compile(command) if command else None
+
+    def extract(self, command, response_str):
+        """Yield (field, value) pairs found in a response"""
+        if self.command and not self.command.search(command):
+            return
+        convert = int if self.type == "int" else float
+        for match in self.pattern.finditer(response_str):
+            try:
+                field = self.name or match.group(1)
+                value = convert(match.group(match.lastindex))
+            except Exception:
+                continue  # A pattern without the expected groups or a value that does not convert
+            yield field, value
+
+
+def default_extractors():
+    """Extract every KEY=VALUE pair as a float field"""
+    return [Extractor(None, KEY_VALUE_PATTERN)]
+
+
+def load_extractors(path):
+    """Load extractors from a JSON list, falling back to the defaults"""
+    if not os.path.exists(path):
+        return default_extractors()
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return [Extractor(entry.get("name"), entry["pattern"], entry.get("type", "float"),
+                      entry.get("command")) for entry in entries]
+
+
+def _safe_name(text):
+    """Make a file name from a command, keeping sanitised names unique"""
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", text)
+    if safe != text or not safe:
+        safe = f"{safe}-{zlib.crc32(text.encode()):08x}"
+    return safe
+
+
+class Column:
+    """Timestamps and values of one (command, field, type) triple
+
+    Values are kept in typed arrays and appended to disk in chunks, so
+    memory stays bounded no matter how long the run is.
+    """
+
+    def __init__(self, directory, command, field, typecode, chunk_size):
+        self.command = command
+        self.field = field
+        self.typecode = typecode
+        self.chunk_size = chunk_size
+        base = os.path.join(directory, _safe_name(command), _safe_name(field))
+        self.times_path = f"{base}.time.{typecode}.d"  # Per type, as one field may be extracted as int and float
+        self.values_path = f"{base}.value.{typecode}"
+        self.times = array.array('d')
+        self.values = array.array(typecode)
+        self.spilled = 0  # Samples already on disk
+
+    def __len__(self):
+        return self.spilled + len(self.values)
+
+    def append(self, timestamp, value):
+        self.times.append(timestamp)
+        self.values.append(value)
+        if len(self.values) >= self.chunk_size:
+            self.spill()
+
+    def spill(self):
+        """Append the in-memory chunk to the column files"""
+        if not self.values:
+            return
+        os.makedirs(os.path.dirname(self.times_path), exist_ok=True)
+        with open(self.times_path, "ab") as f:
+            self.times.tofile(f)
+        with open(self.values_path, "ab") as f:
+            self.values.tofile(f)
+        self.spilled += len(self.values)
+        self.times = array.array('d')
+        self.values = array.array(self.typecode)
+
+    def load(self):
+        """Return (times, values) for the whole column
+
+        NumPy arrays when NumPy is installed, array.array otherwise.
+        """
+        if np is not None:
+            times = np.concatenate([self._read_numpy(self.times_path, 'd'), np.frombuffer(self.times, 'd')])
+            values = np.concatenate([self._read_numpy(self.values_path, self.typecode),
+                                     np.frombuffer(self.values, self.typecode)])
+            return times, values
+        times = self._read_array(self.times_path, 'd')
+        values = self._read_array(self.values_path, self.typecode)
+        times.extend(self.times)
+        values.extend(self.values)
+        return times, values
+
+    def _read_numpy(self, path, typecode):
+        if not self.spilled:
+            return np.empty(0, typecode)
+        return np.fromfile(path, dtype=typecode, count=self.spilled)
+
+    def _read_array(self, path, typecode):
+        data = array.array(typecode)
+        if self.spilled:
+            with open(path, "rb") as f:
+                data.fromfile(f, self.spilled)
+        return data
+
+
+class TimeSeriesStore:
+    """Columnar store of numeric values parsed from responses, per command"""
+
+    def __init__(self, directory, extractors=None, chunk_size=65536, clock=time.time):
+        self.directory = directory
+        self.extractors = extractors if extractors is not None else default_extractors()
+        self.chunk_size = chunk_size
+        self.clock = clock
+        self.columns = {}
+
+    def record(self, command, response_str, timestamp=None):
+        """Run the extractors over a response, append the values found and return them as (field, value)"""
+        if timestamp is None:
+            timestamp = self.clock()
+        found = []
+        for extractor in self.extractors:
+            for field, value in extractor.extract(command, response_str):
+                try:
+                    self.column(command, field, extractor.typecode).append(timestamp, value)
+                except OverflowError:
+                    continue  # Does not fit the column type, e.g. an int beyond 64 bits
+                found.append((field, value))
+        return found
+
+    def column(self, command, field, typecode="d"):
+        key = (command, field, typecode)
+        column = self.columns.get(key)
+        if column is None:
+            column = Column(self.directory, command, field, typecode, self.chunk_size)
+            self.columns[key] = column
+        return column
+
+    def load(self, command, field, typecode=None):
+        """Return (times, values) for one command field
+
+        typecode is only needed when the field was extracted with more than
+        one type.
+        """
+        if typecode is not None:
+            return self.columns[(command, field, typecode)].load()
+        matches = [column for key, column in self.columns.items() if key[:2] == (command, field)]
+        if not matches:
+            raise KeyError((command, field))
+        if len(matches) > 1:
+            raise ValueError(f"{command} {field} was extracted with several types, pass a typecode")
+        return matches[0].load()
+
+    def stats(self, command, field, typecode=None):
+        """Return count, mean, min and max of one command field"""
+        times, values = self.load(command, field, typecode)
+        if not len(values):
+            return {"count": 0, "mean": None, "min": None, "max": None}
+        if np is not None:
+            return {"count": int(values.size), "mean": float(values.mean()),
+                    "min": float(values.min()), "max": float(values.max())}
+        return {"count": len(values), "mean": sum(values) / len(values),
+                "min": min(values), "max": max(values)}
+
+    def close(self):
+        """Spill every column and write a manifest describing the files"""
+        if not self.columns:
+            return
+        manifest = []
+        for column in self.columns.values():
+            column.spill()
+            manifest.append({
+                "command": column.command,
+                "field": column.field,
+                "typecode": column.typecode,
+                "count": len(column),
+                "times": os.path.relpath(column.times_path, self.directory),
+                "values": os.path.relpath(column.values_path, self.directory),
+            })
+        with atomic_path(os.path.join(self.directory, "manifest.json")) as temp:
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
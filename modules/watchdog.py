@@ -0,0 +1,145 @@
+import datetime
+import functools
+import os
+import sys
+import threading
+import time
+import traceback
+
+from modules.report import LatencySketch, Welford
+
+
+class UiWatchdog:
+    """Measures how responsive the Tk main loop is
+
+    A heartbeat is scheduled with root.after() every interval; how late it
+    runs is the main-loop lag, kept in a quantile sketch. A monitor thread
+    watches the heartbeat: when the main loop has not run one for longer
+    than budget, it samples the main thread's stack (once per stall, again
+    every further budget) and appends it to the stall log. Handlers wrapped
+    with timed() are timed the same way, so a slow UI update is logged by
+    name even when it runs on another thread.
+    """
+
+    def __init__(self, root, interval=0.1, budget=0.25, log_file=None):
+        self.root = root
+        self.interval = interval
+        self.budget = budget
+        self.log_file = log_file
+        self.lag = LatencySketch()
+        self.lag_stats = Welford()
+        self.handlers = {}  # name -> (LatencySketch, Welford) of handler durations
+        self.stalls = 0
+        self.slow_handlers = 0
+        self.expected = None  # When the pending heartbeat is due
+        self.last_beat = time.monotonic()
+        self.main_thread = threading.get_ident()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.after_id = None
+        self.thread = None
+
+    def start(self):
+        """Start the heartbeats; must be called on the Tk thread"""
+        self.main_thread = threading.get_ident()
+        self.stop_event.clear()
+        self.last_beat = time.monotonic()
+        self._schedule()
+        self.thread = threading.Thread(target=self._watch, name="ui-watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.after_id is not None:
+            try:
+                self.root.after_cancel(self.after_id)
+            except Exception:
+                pass  # The window is already gone
+            self.after_id = None
+
+    def _schedule(self):
+        self.expected = time.monotonic() + self.interval
+        self.after_id = self.root.after(int(self.interval * 1000), self._beat)
+
+    def _beat(self):
+        now = time.monotonic()
+        lag = max(0.0, now - self.expected)
+        with self.lock:
+            self.lag.add(lag)
+            self.lag_stats.add(lag)
+        self.last_beat = now
+        if not self.stop_event.is_set():
+            self._schedule()
+
+    def _watch(self):
+        """Sample the main thread's stack while the main loop is stalled"""
+        reported = 0.0  # Stall length already reported for the current stall
+        while not self.stop_event.wait(self.budget / 2):
+            stalled = time.monotonic() - self.last_beat - self.interval
+            if stalled < self.budget:
+                reported = 0.0
+                continue
+            if stalled - reported < self.budget:
+                continue
+            if not reported:
+                with self.lock:
+                    self.stalls += 1
+            reported = stalled
+            frame = sys._current_frames().get(self.main_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "  (no stack)\n"
+            self.write_log(f"Main loop stalled for {stalled * 1000:.0f} ms, main thread at:\n{stack}")
+
+    def timed(self, handler, name=None):
+        """Wrap a UI update handler so its duration is recorded and long calls are logged"""
+        name = name or handler.__name__
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                with self.lock:
+                    if name not in self.handlers:
+                        self.handlers[name] = (LatencySketch(), Welford())
+                    sketch, stats = self.handlers[name]
+                    sketch.add(duration)
+                    stats.add(duration)
+                    if duration > self.budget:
+                        self.slow_handlers += 1
+                if duration > self.budget:
+                    thread = threading.current_thread().name
+                    self.write_log(f"Handler {name} took {duration * 1000:.0f} ms on thread {thread}")
+        return wrapper
+
+    def write_log(self, text):
+        if not self.log_file:
+            return
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        try:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(f"[{timestamp}] {text}\n")
+        except OSError:
+            pass  # The watchdog must never take the UI down
+
+    def lag_quantiles(self, quantiles=(0.5, 0.95, 0.99)):
+        """Main-loop lag in seconds at the given quantiles, or None before the first heartbeat"""
+        with self.lock:
+            return {q: self.lag.quantile(q) for q in quantiles}
+
+    def describe(self, handlers=3):
+        """One line: lag percentiles, stall count and the slowest handlers"""
+        with self.lock:
+            if not self.lag_stats.count:
+                return "UI: no heartbeats yet"
+            p50, p95, p99 = (self.lag.quantile(q) * 1000 for q in (0.5, 0.95, 0.99))
+            text = (f"UI lag p50 {p50:.0f} ms, p95 {p95:.0f} ms, p99 {p99:.0f} ms, "
+                    f"max {self.lag_stats.max * 1000:.0f} ms; {self.stalls} stalls")
+            slowest = sorted(self.handlers.items(), key=lambda item: -item[1][1].max)[:handlers]
+        if slowest:
+            text += "; slowest handlers: " + ", ".join(
+                f"{name} p99 {sketch.quantile(0.99) * 1000:.1f} ms (max {stats.max * 1000:.0f} ms)"
+                for name, (sketch, stats) in slowest)
+        return text
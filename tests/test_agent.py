@@ -0,0 +1,18 @@
+import pytest
+
+from modules.agent import allowed_port
+
+
+@pytest.mark.parametrize("port", ["COM3", r"\\.\COM12", "/dev/ttyUSB0", "sim://robot?delay=0.1"])
+def test_local_devices_and_simulated_robots_are_allowed(port):
+    assert allowed_port(port)
+
+
+@pytest.mark.parametrize("port", ["spy://loop://?file=/tmp/out", "socket://example.com:23", "loop://",
+                                  "/dev/../etc/passwd", "results.db", None])
+def test_urls_reaching_files_or_the_network_are_refused(port):
+    assert not allowed_port(port)
+
+
+def test_schemes_can_be_enabled():
+    assert allowed_port("loop://", ("sim", "loop"))
@@ -0,0 +1,89 @@
+from modules.classifier import ResponseClassifier, Rule, _literal_prefix, default_rules
+
+
+def classify(response, *extra):
+    return ResponseClassifier(default_rules() + list(extra)).classify(response)
+
+
+def test_default_tokens():
+    assert classify(b"MOVE_RDY").status == "SUCCESS"
+    assert classify(b"MOVE_ERR").status == "ERROR"
+    assert classify(b"nothing").status == "UNKNOWN"
+
+
+def test_lower_priority_value_wins_regardless_of_position():
+    assert classify(b"_RDY then _ERR").status == "ERROR"
+
+
+def test_regex_match_overlapping_a_literal():
+    # STATUS.* covers the whole response, _ERR starts inside it
+    result = classify(b"STATUS moving _ERR", Rule("INFO", "STATUS.*", priority=50, regex=True))
+    assert result.status == "ERROR"
+
+
+def test_literal_starting_before_a_more_important_one():
+    # X_ERR and _ERR overlap; _ERR has the lower priority value
+    assert classify(b"X_ERR", Rule("WARN", "X_ERR", priority=5)).status == "ERROR"
+    assert classify(b"X_ERR", Rule("WARN", "X_ERR", priority=-1)).status == "WARN"
+
+
+def test_literal_that_is_a_prefix_of_another():
+    rules = [Rule("LONG", "_ERRX", priority=5), Rule("SHORT", "_ERR", priority=1)]
+    assert ResponseClassifier(rules).classify(b"_ERRX").status == "SHORT"
+
+
+def test_equal_priority_takes_the_earlier_match():
+    rules = [Rule("A", "B+", priority=1, regex=True), Rule("C", "_C", priority=1)]
+    classifier = ResponseClassifier(rules)
+    assert classifier.classify(b"_C BB").status == "C"
+    assert classifier.classify(b"BB _C").status == "A"
+
+
+def test_regex_captures():
+    rule = Rule("POS", r"POS=(?P<x>\d+) (\d+)", regex=True)
+    result = ResponseClassifier([rule]).classify(b"ok POS=12 34")
+    assert result.status == "POS"
+    assert result.captures == {"x": "12", 2: "34"}
+
+
+def test_is_complete_uses_terminal_rules_only():
+    rules = default_rules() + [Rule("PROGRESS", "BUSY", terminal=False),
+                               Rule("DONE", r"DONE \d+", regex=True)]
+    classifier = ResponseClassifier(rules)
+    assert not classifier.is_complete(b"BUSY")
+    assert classifier.is_complete(b"BUSY MOVE_RDY")
+    assert classifier.is_complete(b"DONE 3")
+
+
+def test_pass_statuses_come_from_green_rules():
+    rules = [Rule("DONE", "_OK", color="green"), Rule("BUSY", "_BSY"), Rule("ERROR", "_ERR", color="red")]
+    assert ResponseClassifier(rules).pass_statuses == {"DONE"}
+    assert ResponseClassifier().pass_statuses == {"SUCCESS"}
+
+
+def test_literal_prefix_of_regexes():
+    assert _literal_prefix(rb"POS=(\d+)") == b"POS="
+    assert _literal_prefix(rb"AB+C") == b"A"
+    assert _literal_prefix(rb"\.ERR \d") == b".ERR "
+    assert _literal_prefix(rb"A|B") == b""
+    assert _literal_prefix(rb"(?i)err") == b""
+
+
+def test_combined_regexes_keep_priority_and_their_own_groups():
+    rules = [Rule("LOW", r"[A-Z]+=(?P<value>\d+)", priority=9, regex=True),
+             Rule("HIGH", r"[A-Z]+=(?P<value>\d+)!", priority=1, regex=True),
+             Rule("TWICE", r"(\w)\1 ok", priority=5, regex=True)]  # A backreference is searched on its own
+    classifier = ResponseClassifier(rules)
+    assert classifier.matcher.regex_scan is not None and len(classifier.matcher.separate) == 1
+    result = classifier.classify(b"POS=12 TEMP=41!")
+    assert (result.status, result.captures) == ("HIGH", {"value": "41"})
+    assert classifier.classify(b"POS=12").captures == {"value": "12"}
+    assert classifier.classify(b"POS=12 zz ok").status == "TWICE"
+    assert classifier.is_complete(b"zz ok") and not classifier.is_complete(b"zy ok")
+
+
+def test_regex_found_by_its_prefix_beats_a_literal():
+    rules = default_rules() + [Rule("FAULT", r"AXIS\d FAULT=(\d+)", priority=-1, regex=True)]
+    result = ResponseClassifier(rules).classify(b"_RDY AXIS2 FAULT=7")
+    assert (result.status, result.captures) == ("FAULT", {1: "7"})
+    assert ResponseClassifier(rules).classify(b"_RDY AXIS FAULT=7").status == "SUCCESS"
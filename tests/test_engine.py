@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+from modules.classifier import ResponseClassifier, Rule
+from modules.clock import VirtualClock
+from modules.engine import CommandEngine, EngineListener
+from modules.simulator import SimulatedRobot
+
+
+class RecordingListener(EngineListener):
+    def __init__(self):
+        self.messages = []
+        self.results = []
+
+    def on_message(self, text, direction):
+        self.messages.append((direction, text))
+
+    def on_result(self, cycle, step, command, status, response, timestamp, latency):
+        self.results.append((cycle, step, command, status, response))
+
+
+def make_engine(tmp_path, **robot_options):
+    clock = VirtualClock(start=0)
+    listener = RecordingListener()
+    engine = CommandEngine(listener, results_dir=os.fspath(tmp_path), clock=clock)
+    engine.serial_conn = SimulatedRobot(clock=clock, **robot_options)
+    engine.port = "sim"
+    return engine, listener
+
+
+def test_late_reply_is_discarded_before_the_next_command(tmp_path):
+    engine, listener = make_engine(tmp_path, responses={"MOVE": ("MOVE_RDY", 0.05)})
+    engine.serial_conn.buffer += b"TEMP_REP 41\n"  # Reply to a poll that timed out
+    engine.expect_late_reply()
+    assert engine.begin_run(1)
+    assert engine.execute([(1, "MOVE")], 1) == "completed"
+    assert listener.results == [(1, 1, "MOVE", "SUCCESS", "MOVE_RDY")]
+    assert ("ERR", "Discarded late reply: TEMP_REP 41") in listener.messages
+
+
+def test_injected_command_timeout_does_not_shift_replies(tmp_path):
+    # INFO answers after the timeout; its reply lands before the next injected command is sent
+    engine, listener = make_engine(tmp_path, responses={"INFO": ("INFO_REP v1", 1.5), "PING": ("PING_RDY", 0.05),
+                                                        "MOVE": ("MOVE_RDY", 0.5)})
+    engine.response_timeout = 1.0
+    assert engine.begin_run(1)
+    engine.inject_command("INFO")
+    engine.inject_command("PING")
+    engine.run_injected_commands()
+    engine.clock.advance(1.0)
+    assert engine.execute([(1, "MOVE")], 1) == "completed"
+    statuses = [(command, status, response) for _, _, command, status, response in listener.results]
+    assert statuses[0] == ("[INJ] INFO", "TIMEOUT", "No response received (timeout)")
+    assert ("MOVE", "SUCCESS", "MOVE_RDY") in statuses
+
+
+def test_stop_from_another_thread_sends_halt_within_milliseconds(tmp_path):
+    import modules.linkTest  # Registers sim://
+
+    engine = CommandEngine(RecordingListener(), results_dir=os.fspath(tmp_path))
+    engine.serial_conn = modules.linkTest.open_link("sim://robot?responses=MOVE=_RDY@30", 115200, timeout=1)
+    engine.port = "sim"
+    engine.response_timeout = 60
+    robot = engine.serial_conn.robot
+    written = []
+    robot_write = robot.write
+    robot.write = lambda data: written.append(bytes(data)) or robot_write(data)
+
+    assert engine.begin_run(1)
+    outcome = []
+    executor = threading.Thread(target=lambda: outcome.append(engine.execute([(1, "MOVE")], 1)))
+    executor.start()
+    deadline = time.monotonic() + 5
+    while written != [b"MOVE\n"] and time.monotonic() < deadline:
+        time.sleep(0.001)
+    time.sleep(0.05)  # Let the executor block in read()
+
+    start = time.perf_counter()
+    engine.stop()
+    halted = time.perf_counter() - start
+    executor.join(timeout=2)
+
+    assert written == [b"MOVE\n", b"HALT\n"]
+    assert halted < 0.1 and engine.last_stop_latency < 0.1
+    assert not executor.is_alive() and outcome == ["stopped"]
+    assert engine.serial_conn.timeout == 1  # The port's own timeout is restored
+
+
+def test_run_ends_when_closing_its_outputs_fails(tmp_path):
+    engine, listener = make_engine(tmp_path)
+    finished = []
+    listener.on_run_finished = finished.append
+
+    def broken_report():
+        raise OSError("disk full")
+
+    engine.write_report = broken_report
+    assert engine.begin_run(1)
+    assert engine.execute([(1, "PING")], 1) == "completed"
+    assert not engine.is_running and finished == ["completed"]
+    assert ("ERR", "Finish error: disk full") in listener.messages
+
+
+def test_run_statistics_count_the_classifier_statuses(tmp_path):
+    engine, _ = make_engine(tmp_path, responses={"MOVE": ("MOVE_DONE", 0.05), "GRIP": ("GRIP_JAM", 0.05)},
+                            default_response="_OK")
+    rules = [Rule("DONE", "_DONE", color="green"), Rule("JAMMED", "_JAM", color="red"), Rule("OK", "_OK")]
+    assert engine.begin_run(1, classifier=ResponseClassifier(rules))
+    engine.execute([(1, "MOVE"), (2, "PING"), (3, "GRIP")], 1)
+    stats = engine.run_stats
+    assert (stats.total, stats.passed, stats.failed) == (3, 1, 1)
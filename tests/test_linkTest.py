@@ -0,0 +1,43 @@
+from modules.linkTest import LinkTestResult, LinkTester, open_link, recommend
+
+
+def result(baudrate, throughput, p95, errors=0):
+    measured = LinkTestResult(baudrate, False, None)
+    measured.throughput = throughput
+    measured.latencies = [p95]
+    measured.errors = errors
+    return measured
+
+
+def test_recommend_prefers_throughput_then_latency():
+    slow = result(9600, 900, 0.010)
+    fast = result(115200, 10000, 0.004)
+    fast_but_jittery = result(230400, 10300, 0.008)
+    broken = result(921600, 50000, 0.001, errors=3)
+    assert recommend([slow, fast, fast_but_jittery, broken]) is fast
+    assert recommend([broken]) is None
+
+
+def test_open_link_reports_whether_low_latency_was_applied():
+    conn = open_link("loop://", 115200, low_latency=True, buffer_size=4096)
+    try:
+        assert conn.low_latency_applied is False  # loop:// has no low-latency mode
+        assert conn.baudrate == 115200
+    finally:
+        conn.close()
+
+
+def test_link_test_over_a_loopback():
+    tester = LinkTester("loop://", throughput_duration=0.05, latency_samples=5, timeout=0.2)
+    results = tester.run([9600, 115200], buffer_sizes=[None])
+    # Low latency cannot be applied on loop://, so only those combinations are left out
+    assert [(r.baudrate, r.low_latency) for r in results] == [(9600, False), (115200, False)]
+    assert all(r.stable for r in results)
+    assert recommend(results) in results
+
+
+def test_link_test_streams_nothing_without_an_echo():
+    messages = []
+    tester = LinkTester("sim://robot?delay=0.01", log=messages.append, timeout=0.2)
+    assert tester.run([115200]) == []
+    assert "no echo" in messages[-1]
@@ -0,0 +1,25 @@
+from modules.monitorIndex import MonitorIndex
+
+
+def add_events(index, count, start=0):
+    for i in range(start, start + count):
+        index.add({"dir": "RX", "cycle": i + 1, "text": f"reply {i} _ERR" if i % 2 else f"reply {i} _RDY"}, wall=i)
+
+
+def test_filters_page_newest_first():
+    index = MonitorIndex()
+    add_events(index, 100)
+    result = index.search("status:_ERR cycle:1-50")
+    assert [index.line(event_id)[2] for event_id in result.page(0, size=3)] == \
+        ["reply 45 _ERR", "reply 47 _ERR", "reply 49 _ERR"]
+    assert result.count() == 25
+
+
+def test_paging_continues_after_compaction():
+    index = MonitorIndex(max_events=1000)
+    add_events(index, 900)
+    result = index.search("_ERR")
+    assert len(result.page(0, size=100)) == 100
+    add_events(index, 200, start=900)  # Exceeds max_events, so the oldest half is dropped
+    assert result.has_page(1, size=100)
+    assert len(result.page(1, size=100)) == 100
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from modules.capture import CaptureReader, CaptureWriter, RX, TX
+from modules.replay import capture_runs, replay
+
+
+def write_capture(path, records):
+    writer = CaptureWriter(path)
+    for direction, data, cycle, step in records:
+        writer.record(direction, data, cycle, step)
+    writer.close()
+
+
+@pytest.fixture
+def two_runs(tmp_path):
+    path = os.fspath(tmp_path / "connection.cap")
+    write_capture(path, [
+        (TX, b"MOVE\n", 1, 1), (RX, b"MOVE_RDY\n", 1, 1),
+        (TX, b"MOVE\n", 2, 1), (RX, b"MOVE_RDY\n", 2, 1),
+        (RX, b"IDLE\n", 0, 0),  # Between the runs
+        (TX, b"GRIP\n", 1, 1), (RX, b"GRIP_RDY\n", 1, 1),
+        (TX, b"HOME\n", 1, 2), (RX, b"HOME_ERR\n", 1, 2),
+    ])
+    return path
+
+
+def test_capture_is_split_into_runs(two_runs):
+    with CaptureReader(two_runs) as reader:
+        runs = capture_runs(reader)
+    assert [(run.commands(), run.cycles) for run in runs] == [([(1, "MOVE")], 2),
+                                                              ([(1, "GRIP"), (2, "HOME")], 1)]
+
+
+def test_multi_run_capture_needs_a_run_number(two_runs, tmp_path):
+    with pytest.raises(ValueError, match="holds 2 runs"):
+        replay(two_runs, os.fspath(tmp_path / "out"))
+
+    engine, listener, connection, _ = replay(two_runs, os.fspath(tmp_path / "out"), run=2)
+    assert [step[1:3] for step in listener.steps] == [[1, "SUCCESS"], [2, "ERROR"]]
+    assert connection.skipped == 0
@@ -0,0 +1,14 @@
+from modules.report import RunStatistics
+
+
+def test_pass_and_fail_statuses_survive_merging_and_serialisation():
+    shard = RunStatistics("run", "sim", pass_statuses={"DONE"}, fail_statuses={"JAMMED", "TIMEOUT"})
+    for status in ("DONE", "DONE", "JAMMED", "BUSY"):
+        shard.record("MOVE", status, 0.01)
+    copy = RunStatistics.from_dict(shard.to_dict())
+    assert (copy.passed, copy.failed) == (2, 1)
+
+    total = RunStatistics("run", "campaign")
+    total.merge(copy)
+    assert (total.total, total.passed, total.failed) == (4, 2, 1)
+    assert total.summary_rows()[0][:5] == ["MOVE", 4, 2, 1, 1]
@@ -0,0 +1,30 @@
+import os
+import sqlite3
+
+from modules.resultsDb import ResultsDatabase
+
+
+def test_malformed_row_is_dropped_without_blocking_the_others(tmp_path):
+    errors = []
+    db = ResultsDatabase(os.fspath(tmp_path / "results.db"), on_error=errors.append)
+    db.start()
+    db.log("run", "sim", 1, 1, "MOVE", "SUCCESS", "_RDY")
+    db.log(None, "sim", 1, 2, "GRIP", "SUCCESS", "_RDY")  # run_id is NOT NULL
+    db.log("run", "sim", 1, 3, "HOME", "SUCCESS", "_RDY")
+    db.close()
+
+    assert [row["command"] for row in db.query("run")] == ["MOVE", "HOME"]
+    assert db.dropped_rows == 1
+    assert len(errors) == 1 and "1 items (row) not saved" in errors[0]
+
+
+def test_locked_database_is_retried_a_limited_number_of_times(tmp_path):
+    errors = []
+    db = ResultsDatabase(os.fspath(tmp_path / "results.db"), on_error=errors.append, retry_interval=0,
+                         max_attempts=3)
+    attempts = []
+    db._write_batch = lambda conn, batch: attempts.append(batch) or sqlite3.OperationalError("database is locked")
+    db._write_until_done(None, [("row", ())])
+    assert len(attempts) == 3 and db.dropped_rows == 1
+    assert errors == ["Results database error: database is locked; retrying",
+                      "Results database error: database is locked; 1 items (row) not saved"]
@@ -0,0 +1,75 @@
+from modules.clock import VirtualClock
+from modules.scheduler import DeadlineScheduler
+
+
+def make_scheduler():
+    errors = []
+    scheduler = DeadlineScheduler(clock=VirtualClock(start=0), on_error=lambda timer, e: errors.append(e))
+    return scheduler, errors
+
+
+def test_deadlines_run_in_order_and_equal_ones_in_fifo_order():
+    scheduler, _ = make_scheduler()
+    ran = []
+    scheduler.call_later(2.0, ran.append, "late")
+    scheduler.call_later(1.0, ran.append, "first")
+    scheduler.call_later(1.0, ran.append, "second")
+    assert scheduler.next_deadline() == 1.0
+
+    scheduler.clock.advance(1.0)
+    assert scheduler.run_due() == 2
+    assert ran == ["first", "second"]
+    scheduler.clock.advance(1.0)
+    scheduler.run_due()
+    assert ran == ["first", "second", "late"]
+    assert scheduler.next_deadline() is None
+
+
+def test_periodic_timer_keeps_to_its_grid():
+    scheduler, _ = make_scheduler()
+    ticks = []
+    timer = scheduler.call_every(1.0, lambda: ticks.append(scheduler.clock.monotonic()), first=0.5)
+    scheduler.clock.advance(0.5)
+    scheduler.clock.advance(0.25)  # The first tick runs late
+    scheduler.run_due()
+    assert scheduler.lag == 0.25
+    scheduler.clock.advance(1.0)
+    scheduler.run_due()
+    assert ticks == [0.75, 1.5]
+
+    scheduler.cancel(timer)
+    scheduler.clock.advance(5.0)
+    assert scheduler.run_due() == 0
+    assert len(scheduler) == 0
+
+
+def test_cancelled_timer_never_runs():
+    scheduler, _ = make_scheduler()
+    ran = []
+    timer = scheduler.call_later(1.0, ran.append, "cancelled")
+    scheduler.call_later(1.0, ran.append, "kept")
+    scheduler.cancel(timer)
+    assert len(scheduler) == 1
+    scheduler.clock.advance(1.0)
+    scheduler.run_due()
+    assert ran == ["kept"]
+
+
+def test_failing_callback_is_reported_and_others_still_run():
+    scheduler, errors = make_scheduler()
+    ran = []
+    scheduler.call_later(1.0, lambda: 1 / 0)
+    scheduler.call_later(1.0, ran.append, "after")
+    scheduler.clock.advance(1.0)
+    assert scheduler.run_due() == 2
+    assert ran == ["after"]
+    assert [type(e) for e in errors] == [ZeroDivisionError]
+
+
+def test_timer_several_intervals_late_fires_once_and_keeps_its_phase():
+    scheduler, _ = make_scheduler()
+    ticks = []
+    scheduler.call_every(1.0, lambda: ticks.append(scheduler.clock.monotonic()), first=0.5)
+    scheduler.clock.now = 3.2  # The scheduler thread was held up for several intervals
+    assert scheduler.run_due() == 1
+    assert scheduler.next_deadline() == 3.5
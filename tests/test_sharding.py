@@ -0,0 +1,54 @@
+import collections
+
+from modules.sharding import ShardScheduler
+
+
+def run_round_robin(scheduler, units, fail=None):
+    """Pull and start cycles unit by unit; fail=(unit, after) retires unit after that many cycles"""
+    started = collections.defaultdict(list)
+    active = list(units)
+    while active:
+        for unit in list(active):
+            if fail and unit == fail[0] and len(started[unit]) == fail[1]:
+                scheduler.next_cycle(unit)  # Pulled but never begun
+                scheduler.retire(unit)
+                active.remove(unit)
+                continue
+            cycle = scheduler.next_cycle(unit)
+            if cycle is None:
+                active.remove(unit)
+                continue
+            scheduler.started(unit, cycle)
+            started[unit].append(cycle)
+    return started
+
+
+def all_cycles(started):
+    return sorted(cycle for cycles in started.values() for cycle in cycles)
+
+
+def test_every_cycle_runs_exactly_once():
+    scheduler = ShardScheduler(100, ["a", "b", "c"])
+    started = run_round_robin(scheduler, ["a", "b", "c"])
+    assert all_cycles(started) == list(range(1, 101))
+    assert scheduler.remaining() == 0
+    assert sum(scheduler.completed.values()) == 100
+
+
+def test_retired_unit_cycles_go_to_the_others():
+    scheduler = ShardScheduler(50, ["a", "b"])
+    started = run_round_robin(scheduler, ["a", "b"], fail=("a", 3))
+    assert started["a"] == [1, 2, 3]
+    assert all_cycles(started) == list(range(1, 51))
+    assert scheduler.next_cycle("a") is None
+
+
+def test_idle_unit_steals_half_of_the_largest_block():
+    scheduler = ShardScheduler(8, ["a", "b"])
+    assert scheduler.next_cycle("a") == 1  # a holds [1, 3): 8 // (2 * 2) cycles
+    assert scheduler.next_cycle("b") == 3  # b holds [3, 5)
+    scheduler.queue.clear()
+    scheduler.held["a"] = [2, 9]  # a is slow and still has 2..8
+    assert scheduler.next_cycle("b") == 4
+    assert scheduler.next_cycle("b") == 5  # b's block is done and it steals [5, 9) from a
+    assert scheduler.held["a"] == [2, 5]
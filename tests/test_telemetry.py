@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from modules.telemetry import TelemetryBuffer, parse_poll_spec
+
+
+def test_parse_poll_spec():
+    assert parse_poll_spec("TEMP?:1, POS?:0.5") == [("TEMP?", 1.0), ("POS?", 0.5)]
+    assert parse_poll_spec("") == []
+
+
+@pytest.mark.parametrize("spec", ["TEMP?:0", "TEMP?:-1", "TEMP?:nan", "TEMP?:inf", "TEMP?:x", "TEMP?"])
+def test_parse_poll_spec_rejects_bad_intervals(spec):
+    with pytest.raises(ValueError):
+        parse_poll_spec(spec)
+
+
+def test_full_buffer_spills_to_disk(tmp_path):
+    buffer = TelemetryBuffer(capacity=4, spill_path=os.fspath(tmp_path / "telemetry.spill"))
+    for n in range(10):
+        buffer.append(float(n), n % 2, n * 10.0)
+    assert [sample[0] for sample in buffer.samples()] == [float(n) for n in range(10)]
+    assert [sample[2] for sample in buffer.samples(query_index=1)] == [10.0, 30.0, 50.0, 70.0, 90.0]
+    assert buffer.dropped == 0 and len(buffer) == 2
+
+    buffer.clear()
+    assert os.listdir(tmp_path) == []
+
+
+def test_full_buffer_without_spill_file_counts_dropped_samples():
+    buffer = TelemetryBuffer(capacity=4)
+    for n in range(10):
+        buffer.append(float(n), 0, 0.0)
+    assert [sample[0] for sample in buffer.samples()] == [6.0, 7.0, 8.0, 9.0]
+    assert buffer.dropped == 6
@@ -0,0 +1,20 @@
+from modules.timeseries import Extractor, TimeSeriesStore
+
+
+def test_same_field_extracted_as_two_types_keeps_separate_columns(tmp_path):
+    extractors = [Extractor("POS", r"POS=(\d+)", "int"), Extractor("POS", r"POS=(\d+)", "float")]
+    store = TimeSeriesStore(str(tmp_path), extractors)
+    assert store.record("MOVE", "POS=12") == [("POS", 12), ("POS", 12.0)]
+
+    assert list(store.load("MOVE", "POS", "q")[1]) == [12]
+    assert list(store.load("MOVE", "POS", "d")[1]) == [12.0]
+    store.close()
+
+
+def test_bad_extractors_do_not_abort_the_step(tmp_path):
+    extractors = [Extractor(None, r"NOGROUP"), Extractor("BIG", r"BIG=(\d+)", "int"),
+                  Extractor("TEMP", r"TEMP=([\d.]+)")]
+    store = TimeSeriesStore(str(tmp_path), extractors)
+    assert store.record("STATUS", "NOGROUP BIG=99999999999999999999999 TEMP=41.5") == [("TEMP", 41.5)]
+    assert store.stats("STATUS", "TEMP")["count"] == 1
+    store.close()